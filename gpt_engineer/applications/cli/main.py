@@ -26,6 +26,7 @@ Notes
 """
 
 import difflib
+import functools
 import json
 import logging
 import os
@@ -34,19 +35,24 @@ import subprocess
 import sys
 
 from pathlib import Path
+from typing import Optional
 
 import openai
 import typer
 
 from dotenv import load_dotenv
-from langchain.globals import set_llm_cache
-from langchain_community.cache import SQLiteCache
 from termcolor import colored
 
 from gpt_engineer.applications.cli.cli_agent import CliAgent
 from gpt_engineer.applications.cli.collect import collect_and_send_human_review
 from gpt_engineer.applications.cli.file_selector import FileSelector
 from gpt_engineer.core.ai import AI, ClipboardAI
+from gpt_engineer.core.default.constants import (
+    IMPROVE_CANDIDATES,
+    IMPROVE_DIFF_ALIGNMENT,
+    IMPROVE_FILE_BUDGET,
+    IMPROVE_PATCH_FUZZ,
+)
 from gpt_engineer.core.default.disk_execution_env import DiskExecutionEnv
 from gpt_engineer.core.default.disk_memory import DiskMemory
 from gpt_engineer.core.default.file_store import FileStore
@@ -58,9 +64,13 @@ from gpt_engineer.core.default.steps import (
     improve_fn as improve_fn,
 )
 from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.fuzzy_patch import fuzzy_patch_stats
 from gpt_engineer.core.git import stage_uncommitted_to_git
+from gpt_engineer.core.llm_cache import LLMCache, set_llm_response_cache
 from gpt_engineer.core.preprompts_holder import PrepromptsHolder
 from gpt_engineer.core.prompt import Prompt
+from gpt_engineer.core.tiktoken_cache import check_tiktoken_cache
+from gpt_engineer.core.token_usage import preload_tokenizers
 from gpt_engineer.tools.custom_steps import clarified_gen, lite_gen, self_heal
 
 app = typer.Typer(
@@ -229,6 +239,20 @@ def compare(f1: FilesDict, f2: FilesDict):
             print(diff)
 
 
+def print_completed_file(path: str, content: str) -> None:
+    """
+    Print a notice for a file of the generated code as soon as its block is complete.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+    content : str
+        The content of the file.
+    """
+    print(colored(f"\n[{path} complete: {len(content.splitlines())} lines]", "green"))
+
+
 def prompt_yesno() -> bool:
     TERM_CHOICES = colored("y", "green") + "/" + colored("n", "red") + " "
     while True:
@@ -320,6 +344,11 @@ def main(
         help="""Endpoint for your Azure OpenAI Service (https://xx.openai.azure.com).
             In that case, the given model is the deployment name chosen in the Azure AI Studio.""",
     ),
+    context_window: Optional[int] = typer.Option(
+        None,
+        "--context-window",
+        help="The context window of the model in tokens, for models whose window is not known, such as Azure deployments. Defaults to GPTE_CONTEXT_WINDOW; prompts to models with an unknown window are sent as they are.",
+    ),
     use_custom_preprompts: bool = typer.Option(
         False,
         "--use-custom-preprompts",
@@ -378,6 +407,26 @@ def main(
         "--diff_timeout",
         help="Diff regexp timeout. Default: 3. Increase if regexp search timeouts.",
     ),
+    improve_candidates: int = typer.Option(
+        IMPROVE_CANDIDATES,
+        "--improve-candidates",
+        help="Request this many candidate answers concurrently in improve mode and keep the one whose diffs validate best.",
+    ),
+    file_budget: str = typer.Option(
+        IMPROVE_FILE_BUDGET,
+        "--file-budget",
+        help="What to do with uploaded files that do not fit the context window in improve mode: elide, drop or off.",
+    ),
+    diff_alignment: str = typer.Option(
+        IMPROVE_DIFF_ALIGNMENT,
+        "--diff-alignment",
+        help="How hunks are matched against the files in improve mode: greedy (line by line) or align (each hunk aligned as a whole).",
+    ),
+    patch_fuzz: int = typer.Option(
+        IMPROVE_PATCH_FUZZ,
+        "--patch-fuzz",
+        help="Context lines at each end of a failing hunk that may mismatch when it is placed locally, like patch --fuzz, before the model is asked to fix it. Negative disables the fallback.",
+    ),
 ):
     """
     The main entry point for the CLI tool that generates or improves a project.
@@ -404,6 +453,8 @@ def main(
         Flag indicating whether to enable self-healing mode.
     azure_endpoint : str
         The endpoint for Azure OpenAI services.
+    context_window : Optional[int]
+        The context window of the model in tokens, if it is not known from its name.
     use_custom_preprompts : bool
         Flag indicating whether to use custom preprompts.
     prompt_file : str
@@ -422,6 +473,16 @@ def main(
         Run setup but to not call LLM or write any code. For testing purposes.
     sysinfo: bool
         Flag indicating whether to output system information for debugging.
+    diff_timeout: int
+        Timeout in seconds for matching a diff block.
+    improve_candidates: int
+        The number of candidate answers requested concurrently in improve mode.
+    file_budget: str
+        What to do with uploaded files that do not fit the context window in improve mode.
+    diff_alignment: str
+        How hunks are matched against the files in improve mode.
+    patch_fuzz: int
+        The fuzz of the local fallback for hunks that fail validation in improve mode.
 
     Returns
     -------
@@ -447,7 +508,7 @@ def main(
     # Set up logging
     logging.basicConfig(level=logging.DEBUG if verbose else logging.INFO)
     if use_cache:
-        set_llm_cache(SQLiteCache(database_path=".langchain.db"))
+        set_llm_response_cache(LLMCache())
     if improve_mode:
         assert not (
             clarify_mode or lite_mode
@@ -455,6 +516,11 @@ def main(
 
     load_env_if_needed()
 
+    # Load the tokenizer from the local cache while the project and prompt are being set
+    # up; without a cache it is loaded on first use, so startup never touches the network
+    if not check_tiktoken_cache():
+        preload_tokenizers(["clipboard_llm" if llm_via_clipboard else model])
+
     if llm_via_clipboard:
         ai = ClipboardAI()
     else:
@@ -462,6 +528,7 @@ def main(
             model_name=model,
             temperature=temperature,
             azure_endpoint=azure_endpoint,
+            context_window=context_window,
         )
 
     path = Path(project_path)
@@ -485,7 +552,10 @@ def main(
     elif lite_mode:
         code_gen_fn = lite_gen
     else:
-        code_gen_fn = gen_code
+        # Stream the answer, reporting each file as soon as the model has finished it
+        code_gen_fn = functools.update_wrapper(
+            functools.partial(gen_code, on_file=print_completed_file), gen_code
+        )
 
     # configure execution function
     if self_heal_mode:
@@ -506,7 +576,16 @@ def main(
         execution_env,
         ai=ai,
         code_gen_fn=code_gen_fn,
-        improve_fn=improve_fn,
+        improve_fn=functools.update_wrapper(
+            functools.partial(
+                improve_fn,
+                candidates=improve_candidates,
+                file_budget=file_budget,
+                diff_alignment=diff_alignment,
+                patch_fuzz=patch_fuzz,
+            ),
+            improve_fn,
+        ),
         process_code_fn=execution_fn,
         preprompts_holder=preprompts_holder,
     )
@@ -555,6 +634,8 @@ def main(
         print("Total api cost: $ 0.0 since we are using local LLM.")
     else:
         print("Total tokens used: ", ai.token_usage_log.total_tokens())
+    if fuzzy_patch_stats().hunks_failed:
+        print(fuzzy_patch_stats().report())
 
 
 if __name__ == "__main__":
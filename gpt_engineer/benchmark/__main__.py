@@ -27,13 +27,11 @@ from typing import Annotated, Optional
 
 import typer
 
-from langchain.globals import set_llm_cache
-from langchain_community.cache import SQLiteCache
-
 from gpt_engineer.applications.cli.main import load_env_if_needed
 from gpt_engineer.benchmark.bench_config import BenchConfig
 from gpt_engineer.benchmark.benchmarks.load import get_benchmark
 from gpt_engineer.benchmark.run import export_yaml_results, print_results, run
+from gpt_engineer.core.llm_cache import LLMCache, set_llm_response_cache
 
 app = typer.Typer(
     context_settings={"help_option_names": ["-h", "--help"]}
@@ -114,7 +112,7 @@ def main(
     None
     """
     if use_cache:
-        set_llm_cache(SQLiteCache(database_path=".langchain.db"))
+        set_llm_response_cache(LLMCache())
     load_env_if_needed()
     config = BenchConfig.from_toml(bench_config)
     print("using config file: " + bench_config)
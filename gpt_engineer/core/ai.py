@@ -2,11 +2,15 @@
 AI Module with OpenRouter Integration
 
 This module provides an AI class that interfaces with language models to perform various tasks such as
-starting a conversation, advancing the conversation, and handling message serialization. It also includes
-backoff strategies for handling rate limit errors from the OpenAI API.
+starting a conversation, advancing the conversation, and handling message serialization. Inference is
+routed to a provider (see `gpt_engineer.core.providers`), which owns the backoff strategy for handling
+rate limit errors. Every inference is timed (queue wait, time to first token, latency and
+throughput) and logged with the step's token usage, together with the model that actually
+answered.
 
 Classes:
     AI: A class that interfaces with language models for conversation management and message serialization.
+    AsyncAI: An asyncio-native variant of AI for driving many concurrent conversations.
 
 Functions:
     serialize_messages(messages: List[Message]) -> str
@@ -15,18 +19,17 @@ Functions:
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
-import os
+import time
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, List, Optional, Union
+from typing import Any, Callable, List, Optional, Tuple, Union
 
-import backoff
-import openai
 import pyperclip
 
-from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
 from langchain.chat_models.base import BaseChatModel
 from langchain.schema import (
     AIMessage,
@@ -35,20 +38,79 @@ from langchain.schema import (
     messages_from_dict,
     messages_to_dict,
 )
-from langchain_anthropic import ChatAnthropic
-from langchain_openai import AzureChatOpenAI, ChatOpenAI
 
-from gpt_engineer.tools.openrouter_wrapper import call_openrouter, call_openrouter_reasoning, call_openrouter_coding
-
-from gpt_engineer.core.token_usage import TokenUsageLog
+from gpt_engineer.core.context_window import ContextWindowManager
+from gpt_engineer.core.llm_cache import LLMCache, get_llm_response_cache
+from gpt_engineer.core.providers import (
+    OpenRouterProvider,
+    create_provider,
+    select_provider,
+)
+from gpt_engineer.core.token_usage import InferenceTiming, TokenUsageLog
 
 # Type hint for a chat message
 Message = Union[AIMessage, HumanMessage, SystemMessage]
 
+# The result of one conversation of a batch: the updated conversation, or the error it raised
+BatchResult = Union[List[Message], Exception]
+
+# The number of conversations of a batch that are sent to the model at once
+DEFAULT_BATCH_CONCURRENCY = 4
+
+# The outcome of `AI._complete`: the prepared conversation, the request actually sent, the
+# response and the timing of the inference
+Completion = Tuple[List[Message], List[Message], AIMessage, InferenceTiming]
+
 # Set up logging
 logger = logging.getLogger(__name__)
 
 
+class _InferenceClock:
+    """Measures one inference, from dispatch to the complete answer, for `InferenceTiming`."""
+
+    def __init__(self, queued_at: Optional[float] = None):
+        self.dispatched_at = time.perf_counter()
+        self.queue_wait = (
+            self.dispatched_at - queued_at if queued_at is not None else 0.0
+        )
+        self.first_chunk_at: Optional[float] = None
+
+    def on_chunk(self, on_chunk: Callable[[str], None]) -> Callable[[str], None]:
+        """Wrap a chunk callback so that the arrival of the first chunk is recorded."""
+
+        def timed(chunk: str) -> None:
+            if self.first_chunk_at is None:
+                self.first_chunk_at = time.perf_counter()
+            on_chunk(chunk)
+
+        return timed
+
+    def stop(self, route: dict, cache_hit: bool) -> InferenceTiming:
+        """Return the timing of the inference, which has just completed."""
+        return InferenceTiming(
+            queue_wait=self.queue_wait,
+            time_to_first_token=(
+                self.first_chunk_at - self.dispatched_at
+                if self.first_chunk_at is not None
+                else None
+            ),
+            latency=time.perf_counter() - self.dispatched_at,
+            provider=route["provider"],
+            model=route["model"],
+            fallback_used=route["fallback_used"],
+            retries=route["retries"],
+            cache_hit=cache_hit,
+        )
+
+
+def _samples(conversations: List[List[Message]]) -> List[int]:
+    """Number every conversation of a batch by the identical conversations before it."""
+    return [
+        sum(earlier == messages for earlier in conversations[:index])
+        for index, messages in enumerate(conversations)
+    ]
+
+
 class AI:
     """
     A class that interfaces with language models for conversation management and message serialization.
@@ -66,17 +128,25 @@ class AI:
         The name of the language model to use.
     streaming : bool
         A flag indicating whether to use streaming for the language model.
+    provider : Provider
+        The backend that inference is dispatched to.
+    cache : Optional[LLMCache]
+        The response cache consulted before calling the model, if any.
     llm : BaseChatModel
         The language model instance for conversation management.
     token_usage_log : TokenUsageLog
         A log for tracking token usage during conversations.
+    context_window : ContextWindowManager
+        Fits each request into the model's context window before it is sent.
 
     Methods
     -------
-    start(system: str, user: str, step_name: str) -> List[Message]
+    start(system: str, user: str, step_name: str, on_chunk: Optional[Callable]) -> List[Message]
         Start the conversation with a system message and a user message.
-    next(messages: List[Message], prompt: Optional[str], step_name: str) -> List[Message]
+    next(messages: List[Message], prompt: Optional[str], step_name: str, on_chunk: Optional[Callable]) -> List[Message]
         Advances the conversation by sending message history to LLM and updating with the response.
+    next_many(conversations: List[List[Message]], prompt: Optional[str], step_name: str, max_concurrency: int) -> List[BatchResult]
+        Advances many independent conversations concurrently.
     backoff_inference(messages: List[Message]) -> Any
         Perform inference using the language model with an exponential backoff strategy.
     serialize_messages(messages: List[Message]) -> str
@@ -95,7 +165,10 @@ class AI:
         streaming=True,
         vision=False,
         use_openrouter=False,
-        task_type='coding'
+        task_type="coding",
+        provider: Optional[str] = None,
+        cache: Optional[LLMCache] = None,
+        context_window: Optional[int] = None,
     ):
         """
         Initialize the AI class.
@@ -106,25 +179,56 @@ class AI:
             The name of the model to use, by default "gpt-4".
         temperature : float, optional
             The temperature to use for the model, by default 0.1.
+        provider : Optional[str], optional
+            The name of a registered provider to route inference to. By default the
+            provider is selected from the model name and endpoint.
+        cache : Optional[LLMCache], optional
+            A response cache to consult before calling the model. By default the
+            process-wide cache installed with `set_llm_response_cache` is used, if any.
+        context_window : Optional[int], optional
+            The context window of the model in tokens. By default it is looked up from the
+            model name, and requests to models with an unknown window are not fitted.
         """
         self.temperature = temperature
         self.azure_endpoint = azure_endpoint
         self.model_name = model_name
         self.streaming = streaming
-        self.use_openrouter = use_openrouter or "deepseek" in model_name.lower() or "qwen" in model_name.lower()
         self.task_type = task_type
-        
+
         self.vision = (
             ("vision-preview" in model_name)
             or ("gpt-4-turbo" in model_name and "preview" not in model_name)
             or ("claude" in model_name)
         )
+        self.provider = create_provider(
+            provider or select_provider(model_name, azure_endpoint, use_openrouter),
+            model_name=model_name,
+            temperature=temperature,
+            streaming=streaming,
+            vision=self.vision,
+            azure_endpoint=azure_endpoint,
+            task_type=task_type,
+        )
+        self.use_openrouter = self.provider.name == OpenRouterProvider.name
+        self.cache = cache
         self.llm = self._create_chat_model()
         self.token_usage_log = TokenUsageLog(model_name)
+        self.context_window = ContextWindowManager(
+            model_name,
+            max_completion_tokens=self.provider.max_tokens,
+            context_window=context_window,
+        )
 
         logger.debug(f"Using model {self.model_name}")
 
-    def start(self, system: str, user: Any, *, step_name: str) -> List[Message]:
+    def start(
+        self,
+        system: str,
+        user: Any,
+        *,
+        step_name: str,
+        on_chunk: Optional[Callable[[str], None]] = None,
+    ) -> List[Message]:
         """
         Start the conversation with a system message and a user message.
 
@@ -136,6 +240,8 @@ class AI:
             The content of the user message.
         step_name : str
             The name of the step.
+        on_chunk : Optional[Callable[[str], None]], optional
+            If given, the answer is streamed and every text chunk is passed to it.
 
         Returns
         -------
@@ -147,7 +253,7 @@ class AI:
             SystemMessage(content=system),
             HumanMessage(content=user),
         ]
-        return self.next(messages, step_name=step_name)
+        return self.next(messages, step_name=step_name, on_chunk=on_chunk)
 
     def _extract_content(self, content):
         """
@@ -216,6 +322,7 @@ class AI:
         prompt: Optional[str] = None,
         *,
         step_name: str,
+        on_chunk: Optional[Callable[[str], None]] = None,
     ) -> List[Message]:
         """
         Advances the conversation by sending message history
@@ -229,6 +336,9 @@ class AI:
             The prompt to use, by default None.
         step_name : str
             The name of the step.
+        on_chunk : Optional[Callable[[str], None]], optional
+            If given, the answer is streamed and every text chunk is passed to it
+            as it arrives. A cached answer is passed as a single chunk.
 
         Returns
         -------
@@ -236,6 +346,152 @@ class AI:
             The updated list of messages in the conversation.
         """
 
+        messages, request, response, timing = self._complete(messages, prompt, on_chunk)
+        return self._record_response(messages, response, step_name, request, timing)
+
+    def next_many(
+        self,
+        conversations: List[List[Message]],
+        prompt: Optional[str] = None,
+        *,
+        step_name: str,
+        max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    ) -> List[BatchResult]:
+        """
+        Advances many independent conversations concurrently.
+
+        At most `max_concurrency` conversations are in flight at once. Token usage is logged
+        per conversation, in the order of `conversations`, once the whole batch is done. A
+        conversation that fails does not affect the others: its exception is returned in its
+        place instead of being raised.
+
+        Parameters
+        ----------
+        conversations : List[List[Message]]
+            The conversations to advance.
+        prompt : Optional[str], optional
+            A prompt to append to every conversation, by default None.
+        step_name : str
+            The name of the step.
+        max_concurrency : int, optional
+            The maximum number of concurrent requests, by default 4.
+
+        Returns
+        -------
+        List[BatchResult]
+            For every conversation, in order, the updated conversation or the exception it
+            raised.
+        """
+        if not conversations:
+            return []
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(max_concurrency, len(conversations)))
+        ) as executor:
+            queued_at = time.perf_counter()
+            futures = [
+                executor.submit(
+                    self._complete, messages, prompt, None, queued_at, sample
+                )
+                for messages, sample in zip(conversations, _samples(conversations))
+            ]
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                except Exception as e:
+                    outcomes.append(e)
+        return self._record_batch(outcomes, step_name)
+
+    def _complete(
+        self,
+        messages: List[Message],
+        prompt: Optional[str] = None,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        queued_at: Optional[float] = None,
+        sample: int = 0,
+    ) -> Completion:
+        """
+        Get the response to a conversation from the cache or the model, without logging it.
+
+        Parameters
+        ----------
+        queued_at : Optional[float], optional
+            The `time.perf_counter` time the request was queued at, if it waited for a
+            slot of a batch.
+        sample : int, optional
+            Which of several identical conversations of a batch this is, see
+            `_cache_lookup`.
+
+        Returns
+        -------
+        Completion
+            The prepared conversation, the request actually sent, the response and the
+            timing of the inference.
+        """
+        clock = _InferenceClock(queued_at)
+        messages = self._prepare_messages(messages, prompt)
+        request = self.context_window.fit(messages)
+        cache, key, response = self._cache_lookup(request, sample)
+        cache_hit = response is not None
+        if response is None:
+            if on_chunk is None:
+                response = self.backoff_inference(request)
+            else:
+                response = self.provider.stream(
+                    self.llm, request, clock.on_chunk(on_chunk)
+                )
+            self._cache_store(cache, key, response)
+        elif on_chunk is not None:
+            clock.on_chunk(on_chunk)(response.content)
+        return (
+            messages,
+            request,
+            response,
+            clock.stop(self.provider.route(response), cache_hit),
+        )
+
+    def _record_batch(
+        self,
+        outcomes: List[Union[Completion, Exception]],
+        step_name: str,
+    ) -> List[BatchResult]:
+        """Log the responses of a batch in order and return the per-conversation results."""
+        results: List[BatchResult] = []
+        for index, outcome in enumerate(outcomes):
+            if isinstance(outcome, Exception):
+                logger.warning(
+                    "Conversation %d of %d in step %s failed: %s",
+                    index + 1,
+                    len(outcomes),
+                    step_name,
+                    outcome,
+                )
+                results.append(outcome)
+                continue
+            messages, request, response, timing = outcome
+            results.append(
+                self._record_response(messages, response, step_name, request, timing)
+            )
+        return results
+
+    def _prepare_messages(
+        self, messages: List[Message], prompt: Optional[str] = None
+    ) -> List[Message]:
+        """
+        Append the optional prompt and collapse the history into the form sent to the LLM.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            The list of messages in the conversation.
+        prompt : Optional[str], optional
+            The prompt to append, by default None.
+
+        Returns
+        -------
+        List[Message]
+            The messages to send to the language model.
+        """
         if prompt:
             messages.append(HumanMessage(content=prompt))
 
@@ -246,50 +502,103 @@ class AI:
 
         if not self.vision:
             messages = self._collapse_text_messages(messages)
+        return messages
 
-        # Use OpenRouter for DeepSeek models
-        if self.use_openrouter:
-            try:
-                # Convert LangChain messages to OpenRouter format
-                openrouter_messages = []
-                for msg in messages:
-                    role = "assistant" if msg.type == "ai" else msg.type
-                    content = msg.content
-                    if isinstance(content, list):
-                        content = content[0].get("text", "") if content else ""
-                    openrouter_messages.append({"role": role, "content": content})
-                
-                # Use appropriate wrapper based on task type
-                if self.task_type == 'reasoning':
-                    result = call_openrouter_reasoning(openrouter_messages)
-                else:
-                    result = call_openrouter_coding(openrouter_messages)
-                    
-                response_content = result["choices"][0]["message"]["content"]
-                response = AIMessage(content=response_content)
-            except Exception as e:
-                print(f"⚠️  OpenRouter failed, using fallback: {e}")
-                response = self.backoff_inference(messages)
-        else:
-            response = self.backoff_inference(messages)
-        response = self.backoff_inference(messages)
+    def _cache_lookup(
+        self, messages: List[Message], sample: int = 0
+    ) -> Tuple[Optional[LLMCache], Optional[str], Optional[AIMessage]]:
+        """
+        Look up a response for the prepared messages in the response cache.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            The messages that are about to be sent to the language model.
+        sample : int, optional
+            Which of several identical conversations of a batch this is. Each of them is
+            cached under its own key, so that candidates do not all get the same answer.
 
+        Returns
+        -------
+        Tuple[Optional[LLMCache], Optional[str], Optional[AIMessage]]
+            The cache in use, the request key and the cached response; the response is None
+            on a miss, and all three are None when caching is disabled.
+        """
+        cache = self.cache if self.cache is not None else get_llm_response_cache()
+        if cache is None:
+            return None, None, None
+        key = cache.make_key(
+            messages,
+            self.model_name,
+            self.temperature,
+            self.provider.max_tokens,
+            sample,
+        )
+        content = cache.get(key)
+        if content is None:
+            return cache, key, None
+        logger.debug("LLM response cache hit for %s", key)
+        return cache, key, AIMessage(content=content)
+
+    @staticmethod
+    def _cache_store(
+        cache: Optional[LLMCache], key: Optional[str], response: AIMessage
+    ) -> None:
+        if cache is not None and isinstance(response.content, str):
+            cache.put(key, response.content)
+
+    def _record_response(
+        self,
+        messages: List[Message],
+        response: AIMessage,
+        step_name: str,
+        request: Optional[List[Message]] = None,
+        timing: Optional[InferenceTiming] = None,
+    ) -> List[Message]:
+        """
+        Log token usage and timing for the response and append it to the conversation.
+
+        The usage reported by the provider is logged when available; otherwise the
+        tokens are counted locally.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            The conversation the response belongs to.
+        response : AIMessage
+            The response of the language model.
+        step_name : str
+            The name of the step.
+        request : Optional[List[Message]], optional
+            The messages that were actually sent, if they were fitted into the context
+            window; by default the whole conversation.
+        timing : Optional[InferenceTiming], optional
+            The timing of the inference, if it was measured.
+
+        Returns
+        -------
+        List[Message]
+            The updated list of messages in the conversation.
+        """
         self.token_usage_log.update_log(
-            messages=messages, answer=response.content, step_name=step_name
+            messages=request if request is not None else messages,
+            answer=response.content,
+            step_name=step_name,
+            usage=self.provider.usage(response),
+            timing=timing,
         )
         messages.append(response)
         logger.debug(f"Chat completion finished: {messages}")
 
         return messages
 
-    @backoff.on_exception(backoff.expo, openai.RateLimitError, max_tries=7, max_time=45)
     def backoff_inference(self, messages):
         """
         Perform inference using the language model while implementing an exponential backoff strategy.
 
-        This function will retry the inference in case of a rate limit error from the OpenAI API.
-        It uses an exponential backoff strategy, meaning the wait time between retries increases
-        exponentially. The function will attempt to retry up to 7 times within a span of 45 seconds.
+        The call is dispatched exactly once to the selected provider, which owns the retry
+        policy: OpenAI-hosted models retry rate limit errors with an exponential backoff of up
+        to 7 tries within 45 seconds, while OpenRouter walks its model fallback chain instead.
 
         Parameters
         ----------
@@ -316,7 +625,7 @@ class AI:
         >>> messages = [SystemMessage(content="Hello"), HumanMessage(content="How's the weather?")]
         >>> response = backoff_inference(messages)
         """
-        return self.llm.invoke(messages)  # type: ignore
+        return self.provider.invoke(self.llm, messages)
 
     @staticmethod
     def serialize_messages(messages: List[Message]) -> str:
@@ -361,7 +670,7 @@ class AI:
 
     def _create_chat_model(self) -> BaseChatModel:
         """
-        Create a chat model with the specified model name and temperature.
+        Create a chat model with the specified model name and temperature, using the selected provider.
 
         Parameters
         ----------
@@ -373,47 +682,170 @@ class AI:
         Returns
         -------
         BaseChatModel
-            The created chat model.
-        """
-        if self.use_openrouter:
-            # For OpenRouter models, we'll use a dummy ChatOpenAI instance
-            # The actual API calls are handled by the openrouter_wrapper
-            return ChatOpenAI(model="deepseek/deepseek-r1-0528:free", temperature=self.temperature)
-            
-        if self.azure_endpoint:
-            return AzureChatOpenAI(
-                azure_endpoint=self.azure_endpoint,
-                openai_api_version=os.getenv(
-                    "OPENAI_API_VERSION", "2024-05-01-preview"
-                ),
-                deployment_name=self.model_name,
-                openai_api_type="azure",
-                streaming=self.streaming,
-                callbacks=[StreamingStdOutCallbackHandler()],
-            )
-        elif "claude" in self.model_name:
-            return ChatAnthropic(
-                model=self.model_name,
-                temperature=self.temperature,
-                callbacks=[StreamingStdOutCallbackHandler()],
-                streaming=self.streaming,
-                max_tokens_to_sample=4096,
-            )
-        elif self.vision:
-            return ChatOpenAI(
-                model=self.model_name,
-                temperature=self.temperature,
-                streaming=self.streaming,
-                callbacks=[StreamingStdOutCallbackHandler()],
-                max_tokens=4096,  # vision models default to low max token limits
-            )
-        else:
-            return ChatOpenAI(
-                model=self.model_name,
-                temperature=self.temperature,
-                streaming=self.streaming,
-                callbacks=[StreamingStdOutCallbackHandler()],
-            )
+            The created chat model, or None if the provider does not use a LangChain model.
+        """
+        return self.provider.create_chat_model()
+
+
+class AsyncAI(AI):
+    """
+    An asyncio-native variant of `AI`.
+
+    `start`, `next`, `next_many` and `backoff_inference` are coroutines that use the language model's
+    `ainvoke` and an async HTTP client for the OpenRouter path, so a single process can
+    drive many in-flight conversations, e.g. with `asyncio.gather`. Message handling and
+    token usage logging are shared with `AI`.
+    """
+
+    async def start(
+        self,
+        system: str,
+        user: Any,
+        *,
+        step_name: str,
+        on_chunk: Optional[Callable[[str], None]] = None,
+    ) -> List[Message]:
+        """
+        Start the conversation with a system message and a user message.
+
+        Parameters
+        ----------
+        system : str
+            The content of the system message.
+        user : str
+            The content of the user message.
+        step_name : str
+            The name of the step.
+        on_chunk : Optional[Callable[[str], None]], optional
+            If given, the answer is streamed and every text chunk is passed to it.
+
+        Returns
+        -------
+        List[Message]
+            The list of messages in the conversation.
+        """
+        messages: List[Message] = [
+            SystemMessage(content=system),
+            HumanMessage(content=user),
+        ]
+        return await self.next(messages, step_name=step_name, on_chunk=on_chunk)
+
+    async def next(
+        self,
+        messages: List[Message],
+        prompt: Optional[str] = None,
+        *,
+        step_name: str,
+        on_chunk: Optional[Callable[[str], None]] = None,
+    ) -> List[Message]:
+        """
+        Advances the conversation by sending message history
+        to LLM and updating with the response, without blocking the event loop.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            The list of messages in the conversation.
+        prompt : Optional[str], optional
+            The prompt to use, by default None.
+        step_name : str
+            The name of the step.
+        on_chunk : Optional[Callable[[str], None]], optional
+            If given, the answer is streamed and every text chunk is passed to it
+            as it arrives. A cached answer is passed as a single chunk.
+
+        Returns
+        -------
+        List[Message]
+            The updated list of messages in the conversation.
+        """
+        messages, request, response, timing = await self._complete(
+            messages, prompt, on_chunk
+        )
+        return self._record_response(messages, response, step_name, request, timing)
+
+    async def next_many(
+        self,
+        conversations: List[List[Message]],
+        prompt: Optional[str] = None,
+        *,
+        step_name: str,
+        max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    ) -> List[BatchResult]:
+        """
+        Advances many independent conversations concurrently, without blocking the event loop.
+
+        See `AI.next_many`; the concurrency is bounded with a semaphore instead of a thread
+        pool.
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        queued_at = time.perf_counter()
+
+        async def complete(messages: List[Message], sample: int):
+            async with semaphore:
+                return await self._complete(messages, prompt, None, queued_at, sample)
+
+        outcomes = await asyncio.gather(
+            *[
+                complete(messages, sample)
+                for messages, sample in zip(conversations, _samples(conversations))
+            ],
+            return_exceptions=True,
+        )
+        return self._record_batch(list(outcomes), step_name)
+
+    async def _complete(
+        self,
+        messages: List[Message],
+        prompt: Optional[str] = None,
+        on_chunk: Optional[Callable[[str], None]] = None,
+        queued_at: Optional[float] = None,
+        sample: int = 0,
+    ) -> Completion:
+        """Asynchronous variant of `AI._complete`."""
+        clock = _InferenceClock(queued_at)
+        messages = self._prepare_messages(messages, prompt)
+        request = self.context_window.fit(messages)
+        cache, key, response = self._cache_lookup(request, sample)
+        cache_hit = response is not None
+        if response is None:
+            if on_chunk is None:
+                response = await self.backoff_inference(request)
+            else:
+                response = await self.provider.astream(
+                    self.llm, request, clock.on_chunk(on_chunk)
+                )
+            self._cache_store(cache, key, response)
+        elif on_chunk is not None:
+            clock.on_chunk(on_chunk)(response.content)
+        return (
+            messages,
+            request,
+            response,
+            clock.stop(self.provider.route(response), cache_hit),
+        )
+
+    async def backoff_inference(self, messages):
+        """
+        Perform asynchronous inference using the language model with the provider's retry policy.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            A list of chat messages which will be passed to the language model for processing.
+
+        Returns
+        -------
+        Any
+            The output from the language model after processing the provided messages.
+
+        Raises
+        ------
+        openai.error.RateLimitError
+            If the number of retries exceeds the maximum or if the rate limit persists beyond the
+            allotted time, the function will ultimately raise a RateLimitError.
+        """
+        return await self.provider.ainvoke(self.llm, messages)
 
 
 def serialize_messages(messages: List[Message]) -> str:
@@ -448,6 +880,7 @@ class ClipboardAI(AI):
         prompt: Optional[str] = None,
         *,
         step_name: str,
+        on_chunk: Optional[Callable[[str], None]] = None,
     ) -> List[Message]:
         """
         Not yet fully supported
@@ -467,8 +900,29 @@ class ClipboardAI(AI):
         )
 
         response = self.multiline_input()
+        if on_chunk is not None:
+            on_chunk(response)
 
         messages.append(AIMessage(content=response))
         logger.debug(f"Chat completion finished: {messages}")
 
         return messages
+
+    def next_many(
+        self,
+        conversations: List[List[Message]],
+        prompt: Optional[str] = None,
+        *,
+        step_name: str,
+        max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    ) -> List[BatchResult]:
+        """
+        Advances the conversations one after another, as every answer is pasted by hand.
+        """
+        results: List[BatchResult] = []
+        for messages in conversations:
+            try:
+                results.append(self.next(messages, prompt, step_name=step_name))
+            except Exception as e:
+                results.append(e)
+        return results
@@ -11,12 +11,18 @@ Key Components:
   object containing the current state of files. It applies the changes described by the Diff objects to the
   corresponding files in the FilesDict, updating the file contents as specified by the diffs.
 
+- splice_hunks: Builds the content of one file after its hunks are applied, splicing the unchanged stretches of the
+  original content between the added lines in a single pass.
+
 - parse_diffs: Parses a string containing diffs in the unified git diff format, extracting the changes described
   in the diffs and organizing them into a dictionary of Diff objects, keyed by the filename to which each diff applies.
 
 - parse_diff_block: Parses a single block of text from a diff string, translating it into a Diff object that
   represents the changes described in that block of text.
 
+- StreamingFilesParser / StreamingDiffsParser: Consume a chat chunk by chunk while the model is still generating it,
+  emitting each file block or diff block as soon as its closing fence arrives.
+
 This script is intended for use in environments where code collaboration or review is conducted through chat interfaces,
 allowing for the dynamic application of changes to code bases and the efficient handling of file and diff information in chat transcripts.
 """
@@ -24,16 +30,27 @@ allowing for the dynamic application of changes to code bases and the efficient
 import logging
 import re
 
-from typing import Dict, Tuple
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from regex import regex
 
 from gpt_engineer.core.diff import ADD, REMOVE, RETAIN, Diff, Hunk
-from gpt_engineer.core.files_dict import FilesDict, file_to_lines_dict
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.line_table import line_table
 
 # Initialize a logger for this module
 logger = logging.getLogger(__name__)
 
+# Regex to match file paths and associated code blocks
+FILE_BLOCK_PATTERN = re.compile(r"(\S+)\n\s*```[^\n]*\n(.+?)```", re.DOTALL)
+
+# Regex to match individual diff blocks
+DIFF_BLOCK_PATTERN = regex.compile(
+    r"```.*?\n\s*?--- .*?\n\s*?\+\+\+ .*?\n(?:@@ .*? @@\n(?:[-+ ].*?\n)*?)*?```",
+    re.DOTALL,
+)
+
 
 def chat_to_files_dict(chat: str) -> FilesDict:
     """
@@ -45,31 +62,162 @@ def chat_to_files_dict(chat: str) -> FilesDict:
     Returns:
     - FilesDict: A dictionary with file paths as keys and code blocks as values.
     """
-    # Regex to match file paths and associated code blocks
-    regex = r"(\S+)\n\s*```[^\n]*\n(.+?)```"
-    matches = re.finditer(regex, chat, re.DOTALL)
+    matches = FILE_BLOCK_PATTERN.finditer(chat)
 
     files_dict = FilesDict()
     for match in matches:
-        # Clean and standardize the file path
-        path = re.sub(r'[\:<>"|?*]', "", match.group(1))
-        path = re.sub(r"^\[(.*)\]$", r"\1", path)
-        path = re.sub(r"^`(.*)`$", r"\1", path)
-        path = re.sub(r"[\]\:]$", "", path)
-
-        # Extract and clean the code content
-        content = match.group(2)
+        path, content = _file_block_from_match(match)
 
         # Add the cleaned path and content to the FilesDict
-        files_dict[path.strip()] = content.strip()
+        files_dict[path] = content
 
     return files_dict
 
 
+def _file_block_from_match(match: re.Match) -> Tuple[str, str]:
+    """Return the cleaned file path and code content of a FILE_BLOCK_PATTERN match."""
+    # Clean and standardize the file path
+    path = re.sub(r'[\:<>"|?*]', "", match.group(1))
+    path = re.sub(r"^\[(.*)\]$", r"\1", path)
+    path = re.sub(r"^`(.*)`$", r"\1", path)
+    path = re.sub(r"[\]\:]$", "", path)
+
+    # Extract and clean the code content
+    content = match.group(2)
+
+    return path.strip(), content.strip()
+
+
+class _StreamingBlockParser(ABC):
+    """
+    Base class for parsers that extract fenced blocks from a chat while it is still streaming.
+
+    Chunks are accumulated in a buffer and matched against `pattern` from the end of the last
+    completed block. Matching is only attempted when a chunk may have closed a fence, so
+    feeding a long answer token by token stays cheap.
+    """
+
+    pattern: Any = None
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._scanned = 0
+
+    @property
+    def chat(self) -> str:
+        """The chat received so far."""
+        return self._buffer
+
+    def feed(self, chunk: str) -> list:
+        """
+        Add a chunk of the chat and return the blocks completed by it.
+
+        Args:
+        - chunk (str): The next piece of the chat.
+
+        Returns:
+        - list: The blocks whose closing fence arrived with this chunk.
+        """
+        self._buffer += chunk
+        # A fence may be split across chunks, so look back two characters
+        new_text_start = max(self._scanned - 2, self._pos)
+        self._scanned = len(self._buffer)
+        if "```" not in self._buffer[new_text_start:]:
+            return []
+
+        completed = []
+        for match in self._finditer():
+            self._pos = match.end()
+            completed.extend(self._handle(match))
+        return completed
+
+    def _finditer(self) -> Iterator:
+        return self.pattern.finditer(self._buffer, self._pos)
+
+    @abstractmethod
+    def _handle(self, match) -> list:
+        """Return the blocks completed by a match of `pattern`."""
+
+
+class StreamingFilesParser(_StreamingBlockParser):
+    """
+    Incrementally extracts file blocks from a chat while the model is still generating it.
+
+    Every file block whose closing fence has arrived is returned by `feed` (and passed to
+    `on_file`) immediately, so it can be written, linted or shown before the rest of the
+    answer has streamed in. Once the stream has ended, `files_dict` holds the same files
+    as `chat_to_files_dict` returns for the full chat.
+
+    Args:
+    - on_file (Callable[[str, str], None], optional): Called with the path and content of each completed file.
+    """
+
+    pattern = FILE_BLOCK_PATTERN
+
+    def __init__(self, on_file: Optional[Callable[[str, str], None]] = None):
+        super().__init__()
+        self.on_file = on_file
+        self.files_dict = FilesDict()
+
+    def _handle(self, match) -> List[Tuple[str, str]]:
+        path, content = _file_block_from_match(match)
+        self.files_dict[path] = content
+        if self.on_file is not None:
+            self.on_file(path, content)
+        return [(path, content)]
+
+
+class StreamingDiffsParser(_StreamingBlockParser):
+    """
+    Incrementally extracts diff blocks from a chat while the model is still generating it.
+
+    Every diff block whose closing fence has arrived is parsed into `Diff` objects, which
+    are returned by `feed` (and passed to `on_diff`) immediately. As in `parse_diffs`, only
+    the first diff for each file is kept.
+
+    Args:
+    - on_diff (Callable[[Diff], None], optional): Called with each completed diff.
+    - diff_timeout (int): Timeout in seconds for matching a diff block.
+    """
+
+    pattern = DIFF_BLOCK_PATTERN
+
+    def __init__(
+        self, on_diff: Optional[Callable[[Diff], None]] = None, diff_timeout=3
+    ):
+        super().__init__()
+        self.on_diff = on_diff
+        self.diff_timeout = diff_timeout
+        self.diffs: Dict[str, Diff] = {}
+
+    def _finditer(self) -> Iterator:
+        return self.pattern.finditer(self._buffer, self._pos, timeout=self.diff_timeout)
+
+    def _handle(self, match) -> List[Diff]:
+        completed = []
+        for filename, diff in parse_diff_block(match.group()).items():
+            if filename in self.diffs:
+                print(
+                    f"\nMultiple diffs found for {filename}. Only the first one is kept."
+                )
+                continue
+            self.diffs[filename] = diff
+            completed.append(diff)
+            if self.on_diff is not None:
+                self.on_diff(diff)
+        return completed
+
+
 def apply_diffs(diffs: Dict[str, Diff], files: FilesDict) -> FilesDict:
     """
     Applies diffs to the provided files.
 
+    The content of each changed file is built in a single pass over its original lines: the unchanged
+    stretches between hunks are copied as slices of the original content, and each hunk contributes its
+    retained lines from the original and its added lines from the diff. Files without diffs, and files whose
+    hunks neither add nor remove lines, keep their original content.
+
     Args:
     - diffs (Dict[str, Diff]): A dictionary of diffs to apply, keyed by filename.
     - files (FilesDict): The original files to which diffs will be applied.
@@ -78,48 +226,58 @@ def apply_diffs(diffs: Dict[str, Diff], files: FilesDict) -> FilesDict:
     - FilesDict: The updated files after applying diffs.
     """
     files = FilesDict(files.copy())
-    REMOVE_FLAG = "<REMOVE_LINE>"  # Placeholder to mark lines for removal
     for diff in diffs.values():
         if diff.is_new_file():
             # If it's a new file, create it with the content from the diff
             files[diff.filename_post] = "\n".join(
                 line[1] for hunk in diff.hunks for line in hunk.lines
             )
+        elif any(line[0] != RETAIN for hunk in diff.hunks for line in hunk.lines):
+            files[diff.filename_post] = splice_hunks(
+                files[diff.filename_pre], diff.hunks
+            )
         else:
-            # Convert the file content to a dictionary of lines
-            line_dict = file_to_lines_dict(files[diff.filename_pre])
-            for hunk in diff.hunks:
-                current_line = hunk.start_line_pre_edit
-                for line in hunk.lines:
-                    if line[0] == RETAIN:
-                        current_line += 1
-                    elif line[0] == ADD:
-                        # Handle added lines
-                        current_line -= 1
-                        if (
-                            current_line in line_dict.keys()
-                            and line_dict[current_line] != REMOVE_FLAG
-                        ):
-                            line_dict[current_line] += "\n" + line[1]
-                        else:
-                            line_dict[current_line] = line[1]
-                        current_line += 1
-                    elif line[0] == REMOVE:
-                        # Mark removed lines with REMOVE_FLAG
-                        line_dict[current_line] = REMOVE_FLAG
-                        current_line += 1
-
-            # Remove lines marked for removal
-            line_dict = {
-                key: line_content
-                for key, line_content in line_dict.items()
-                if REMOVE_FLAG not in line_content
-            }
-            # Reassemble the file content
-            files[diff.filename_post] = "\n".join(line_dict.values())
+            files[diff.filename_post] = files[diff.filename_pre]
     return files
 
 
+def splice_hunks(content: str, hunks: List[Hunk]) -> str:
+    """
+    Returns the content of a file after applying hunks, in one pass over its lines.
+
+    Every hunk is walked from its start line in the original file: retained and removed lines each stand for one
+    original line, and added lines are inserted after the original line preceding them. The edits of all hunks,
+    including overlapping ones, are collected by original line number, and the output is spliced together from
+    the unchanged stretches of the original content and the added lines.
+    """
+    table = line_table(content)
+    removed = set()
+    # Added lines keyed by the line number of the original line they follow
+    inserted: Dict[int, List[str]] = {}
+    for hunk in hunks:
+        line_number = hunk.start_line_pre_edit
+        for line_type, line in hunk.lines:
+            if line_type == ADD:
+                inserted.setdefault(line_number - 1, []).append(line)
+                continue
+            if line_type == REMOVE:
+                removed.add(line_number)
+            line_number += 1
+
+    pieces: List[str] = []
+    # The line number of the first original line not yet copied or removed
+    cursor = table.first_line
+    for line_number in sorted(removed.union(inserted)):
+        stop = line_number if line_number in removed else line_number + 1
+        if min(stop, table.last_line + 1) > cursor:
+            pieces.append(table.span(cursor, stop))
+        cursor = max(cursor, line_number + 1)
+        pieces.extend(inserted.get(line_number, ()))
+    if cursor <= table.last_line:
+        pieces.append(table.span(cursor, table.last_line + 1))
+    return "\n".join(pieces)
+
+
 def parse_diffs(diff_string: str, diff_timeout=3) -> dict:
     """
     Parses a diff string in the unified git diff format.
@@ -130,15 +288,9 @@ def parse_diffs(diff_string: str, diff_timeout=3) -> dict:
     Returns:
     - dict: A dictionary of Diff objects keyed by filename.
     """
-    # Regex to match individual diff blocks
-    diff_block_pattern = regex.compile(
-        r"```.*?\n\s*?--- .*?\n\s*?\+\+\+ .*?\n(?:@@ .*? @@\n(?:[-+ ].*?\n)*?)*?```",
-        re.DOTALL,
-    )
-
     diffs = {}
     try:
-        for block in diff_block_pattern.finditer(diff_string, timeout=diff_timeout):
+        for block in DIFF_BLOCK_PATTERN.finditer(diff_string, timeout=diff_timeout):
             diff_block = block.group()
 
             # Parse individual diff blocks and update the diffs dictionary
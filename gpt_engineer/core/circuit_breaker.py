@@ -0,0 +1,228 @@
+"""
+Circuit Breaker Module
+
+This module remembers which backends (e.g. individual OpenRouter models) are failing, so
+that callers stop sending requests to a backend that has failed repeatedly and fall back
+right away instead of paying for another wasted round-trip.
+
+Each backend has a `CircuitBreaker` with three states:
+
+- closed: requests flow normally; consecutive failures are counted;
+- open: after `failure_threshold` consecutive failures, requests are refused for a
+  cooldown window, which doubles every time the backend is found to be still failing;
+- half-open: once the cooldown has elapsed, a single probe request is let through; its
+  success closes the circuit and its failure opens it again.
+
+The state is kept for the lifetime of the process and, when ``GPTE_CIRCUIT_BREAKER_PATH``
+points to a file, persisted to disk so that later runs start with what earlier runs learned.
+
+Classes:
+    CircuitBreaker: The health state of one backend.
+
+Functions:
+    circuit_breaker(name: str) -> CircuitBreaker
+        Return the process-wide breaker of a backend, creating it if needed.
+    circuit_breaker_snapshot() -> Dict[str, dict]
+        Return the state of every breaker.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_COOLDOWN_SECONDS = 60.0
+MAX_COOLDOWN_SECONDS = 15 * 60.0
+
+
+class CircuitBreaker:
+    """
+    The health state of one backend.
+
+    Attributes
+    ----------
+    name : str
+        The name of the backend.
+    failure_threshold : int
+        The number of consecutive failures that opens the circuit.
+    cooldown_seconds : float
+        The initial time the circuit stays open before a probe is allowed.
+    state : str
+        One of ``"closed"``, ``"open"`` and ``"half_open"``.
+    failures : int
+        The number of consecutive failures.
+    trips : int
+        The number of times in a row the circuit was opened without recovering; the
+        cooldown doubles with every trip.
+    opened_at : float
+        The Unix time the circuit was last opened (or the probe was started).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        cooldown_seconds: float = DEFAULT_COOLDOWN_SECONDS,
+        on_change=None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = 0.0
+        self._on_change = on_change
+        self._lock = threading.Lock()
+
+    @property
+    def cooldown(self) -> float:
+        """The current cooldown in seconds, which doubles with every trip."""
+        return min(
+            self.cooldown_seconds * 2 ** max(self.trips - 1, 0), MAX_COOLDOWN_SECONDS
+        )
+
+    def allow_request(self) -> bool:
+        """
+        Whether a request may be sent to the backend now.
+
+        An open circuit whose cooldown has elapsed turns half-open and admits a single
+        probe; while the probe is outstanding, other requests are refused.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if time.time() - self.opened_at < self.cooldown:
+                return False
+            # Cooldown elapsed: admit one probe (or a new one if the last never reported)
+            self.state = HALF_OPEN
+            self.opened_at = time.time()
+            logger.info("Circuit of %s is half-open, probing", self.name)
+        self._changed()
+        return True
+
+    def record_success(self) -> None:
+        """Record a successful request, closing the circuit."""
+        with self._lock:
+            changed = self.state != CLOSED or self.trips > 0
+            self.state = CLOSED
+            self.failures = 0
+            self.trips = 0
+        if changed:
+            logger.info("Circuit of %s is closed again", self.name)
+            self._changed()
+
+    def record_failure(self) -> None:
+        """Record a failed request, opening the circuit if the threshold is reached."""
+        with self._lock:
+            self.failures += 1
+            if self.state == OPEN:
+                # A request that was already in flight when the circuit opened
+                return
+            if self.state == CLOSED and self.failures < self.failure_threshold:
+                return
+            self.state = OPEN
+            self.trips += 1
+            self.opened_at = time.time()
+            logger.warning(
+                "Circuit of %s is open for %.0fs after %d failures",
+                self.name,
+                self.cooldown,
+                self.failures,
+            )
+        self._changed()
+
+    def remaining_cooldown(self) -> float:
+        """Return the number of seconds until the next probe is allowed, or 0."""
+        with self._lock:
+            if self.state == CLOSED:
+                return 0.0
+            return max(self.opened_at + self.cooldown - time.time(), 0.0)
+
+    def to_dict(self) -> dict:
+        """Return the persistent state as a plain dictionary."""
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "opened_at": self.opened_at,
+        }
+
+    def load(self, data: dict) -> None:
+        """Restore the state saved by `to_dict`."""
+        self.state = data.get("state", CLOSED)
+        self.failures = data.get("failures", 0)
+        self.trips = data.get("trips", 0)
+        self.opened_at = data.get("opened_at", 0.0)
+
+    def _changed(self) -> None:
+        if self._on_change is not None:
+            self._on_change(self)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def _state_path() -> Optional[Path]:
+    path = os.getenv("GPTE_CIRCUIT_BREAKER_PATH")
+    return Path(path) if path else None
+
+
+def _read_states(path: Path) -> Dict[str, dict]:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _persist(breaker: CircuitBreaker) -> None:
+    # Merge into the file, so that breakers of other processes are kept
+    path = _state_path()
+    if path is None:
+        return
+    with _breakers_lock:
+        states = _read_states(path)
+        states[breaker.name] = breaker.to_dict()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(states, indent=2))
+        os.replace(tmp_path, path)
+
+
+def circuit_breaker(name: str) -> CircuitBreaker:
+    """
+    Return the process-wide breaker of a backend, creating it if needed.
+
+    When ``GPTE_CIRCUIT_BREAKER_PATH`` is set, a new breaker starts from the state saved
+    there, and every state change is written back.
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            breaker = CircuitBreaker(name, on_change=_persist)
+            path = _state_path()
+            if path is not None and name in (states := _read_states(path)):
+                breaker.load(states[name])
+            _breakers[name] = breaker
+        return _breakers[name]
+
+
+def circuit_breaker_snapshot() -> Dict[str, dict]:
+    """Return the state of every breaker, keyed by name."""
+    with _breakers_lock:
+        items = list(_breakers.items())
+    return {
+        name: {**breaker.to_dict(), "remaining_cooldown": breaker.remaining_cooldown()}
+        for name, breaker in items
+    }
@@ -0,0 +1,610 @@
+"""
+Context Window Module
+
+This module fits a conversation into a model's context window before it is sent. Token
+counts come from the real `Tokenizer` in `gpt_engineer.core.token_usage`, and the window of
+each model is looked up in a table of known models, unless it is set explicitly (with the
+``GPTE_CONTEXT_WINDOW`` environment variable, e.g. for Azure deployment names). The
+conversations of models whose window is unknown are sent as they are.
+
+When a conversation is over budget, graded strategies are applied in order, each one only
+as far as needed:
+
+1. drop stale retry turns, i.e. earlier failed answers and the refinement requests that
+   followed them, keeping only the latest retry;
+2. elide the bodies of uploaded files that are not referenced anywhere else in the
+   conversation;
+3. summarize old turns between the task and the latest exchange;
+4. as a last resort, cut the middle out of the largest messages.
+
+All strategies are deterministic, so the same conversation is always fitted the same way
+(which also keeps the response cache effective).
+
+Before an improve request is built, `plan_file_budget` computes what every uploaded file
+costs, reports the total against the budget and, if needed, elides or drops the
+lowest-priority files up front, instead of finding out from a provider error.
+
+Classes:
+    ContextWindowManager: Fits conversations into a model's context window.
+    FileBudget: The token cost of one uploaded file and what the planner does with it.
+    BudgetPlan: The preflight token plan of the files of an improve request.
+
+Functions:
+    context_window_for(model_name: str) -> Optional[int]
+        Return the context window of a model in tokens, or None if it is unknown.
+    elided_file_listing(name: str, n_lines: int) -> str
+        Return the placeholder sent instead of the body of an elided file.
+    plan_file_budget(manager: ContextWindowManager, files_dict: FilesDict, prompt: str, system: str, strategy: str) -> BudgetPlan
+        Plan which files of an improve request are sent in full.
+"""
+
+import logging
+import os
+import re
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.line_table import line_table
+from gpt_engineer.core.token_usage import Tokenizer
+
+Message = Union[AIMessage, HumanMessage, SystemMessage]
+
+logger = logging.getLogger(__name__)
+
+# Context windows in tokens. A key matches a model id (without a vendor prefix such as
+# "openai/") that equals it or continues it after a "-", ":" or "@", so "gpt-4" matches
+# "gpt-4-0613" but not "gpt-4o" or "gpt-4.1". The first match wins, so more specific keys
+# come first.
+MODEL_CONTEXT_WINDOWS: List[Tuple[str, int]] = [
+    ("gpt-5", 400000),
+    ("gpt-4.1", 1047576),
+    ("gpt-4.5", 128000),
+    ("gpt-4o", 128000),
+    ("gpt-4-turbo", 128000),
+    ("gpt-4-1106", 128000),
+    ("gpt-4-0125", 128000),
+    ("gpt-4-vision", 128000),
+    ("gpt-4-32k", 32768),
+    ("gpt-4", 8192),
+    ("gpt-3.5-turbo-instruct", 4096),
+    ("gpt-3.5-turbo", 16385),
+    ("o1-mini", 128000),
+    ("o1-preview", 128000),
+    ("o1", 200000),
+    ("o3", 200000),
+    ("o4-mini", 200000),
+    ("claude", 200000),
+    ("deepseek", 128000),
+    ("qwen", 128000),
+]
+
+# Environment variable setting the context window of the model in use, overriding the table
+CONTEXT_WINDOW_ENV = "GPTE_CONTEXT_WINDOW"
+
+# Tokens reserved for the answer when the completion limit is unknown
+DEFAULT_COMPLETION_RESERVE = 2048
+
+# Start of the refinement request sent by the improve loop after a failed answer
+RETRY_PROMPT_PREFIX = "Some previously produced diffs were not on the requested format"
+
+# A file listing as produced by FilesDict.to_chat: a header followed by numbered lines
+FILE_LISTING_PATTERN = re.compile(
+    r"^File: (?P<name>[^\n]+)\n(?P<body>(?:\d+ [^\n]*\n)+)", re.MULTILINE
+)
+
+SUMMARY_LINE_LENGTH = 200
+
+# Characters kept at each end of a message whose middle is cut out as a last resort, so
+# that a truncated message never loses its instructions or latest context entirely
+TRUNCATE_KEEP_CHARS = 64
+TRUNCATION_MARKER = (
+    "\n[... {removed} characters elided to fit the context window ...]\n"
+)
+
+# What the preflight planner does with a file
+KEEP = "keep"
+ELIDE = "elide"
+DROP = "drop"
+# Strategies of the preflight planner: elide or drop files that do not fit, or only report
+FILE_BUDGET_STRATEGIES = (ELIDE, DROP, "off")
+
+
+def elided_file_listing(name: str, n_lines: int) -> str:
+    """Return the placeholder sent instead of the body of an elided file."""
+    return (
+        f"File: {name}\n"
+        f"[{n_lines} lines elided to fit the context window;"
+        " this file is not part of the change]\n"
+    )
+
+
+def context_window_for(model_name: str) -> Optional[int]:
+    """
+    Return the context window of a model in tokens.
+
+    The ``GPTE_CONTEXT_WINDOW`` environment variable, if set, takes precedence over the
+    table of known models.
+
+    Parameters
+    ----------
+    model_name : str
+        The name of the model.
+
+    Returns
+    -------
+    Optional[int]
+        The size of the context window, or None for unknown models.
+    """
+    configured = os.getenv(CONTEXT_WINDOW_ENV)
+    if configured:
+        return int(configured)
+    model_id = model_name.rsplit("/", 1)[-1].lower()
+    for key, window in MODEL_CONTEXT_WINDOWS:
+        if model_id == key or (
+            model_id.startswith(key) and model_id[len(key)] in "-:@"
+        ):
+            return window
+    return None
+
+
+class ContextWindowManager:
+    """
+    Fits conversations into a model's context window.
+
+    Attributes
+    ----------
+    model_name : str
+        The name of the model.
+    context_window : Optional[int]
+        The size of the model's context window in tokens, or None if it is unknown, in
+        which case conversations are not fitted.
+    max_completion_tokens : int
+        The number of tokens reserved for the answer.
+    tokenizer : Tokenizer
+        The tokenizer used to count tokens.
+    retry_prefixes : Tuple[str, ...]
+        Prefixes identifying the refinement requests that follow a failed answer.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_completion_tokens: Optional[int] = None,
+        context_window: Optional[int] = None,
+        tokenizer: Optional[Tokenizer] = None,
+        retry_prefixes: Sequence[str] = (RETRY_PROMPT_PREFIX,),
+    ):
+        self.model_name = model_name
+        self.context_window = context_window or context_window_for(model_name)
+        if max_completion_tokens is None:
+            max_completion_tokens = DEFAULT_COMPLETION_RESERVE
+            if self.context_window is not None:
+                max_completion_tokens = min(
+                    max_completion_tokens, self.context_window // 4
+                )
+        self.max_completion_tokens = max_completion_tokens
+        self.tokenizer = tokenizer or Tokenizer(model_name)
+        self.retry_prefixes = tuple(retry_prefixes)
+        self._reported_unknown = False
+
+    @property
+    def budget(self) -> Optional[int]:
+        """The number of tokens available for the prompt, or None if the context window is unknown."""
+        if self.context_window is None:
+            return None
+        return max(self.context_window - self.max_completion_tokens, 0)
+
+    def count(self, messages: List[Message]) -> int:
+        """Return the number of prompt tokens used by `messages`."""
+        return self.tokenizer.num_tokens_from_messages(messages)
+
+    def fit(self, messages: List[Message]) -> List[Message]:
+        """
+        Fit a conversation into the token budget.
+
+        The conversation itself is never modified; if it already fits, or if the context
+        window of the model is unknown, it is returned as is.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            The messages that are about to be sent to the model.
+
+        Returns
+        -------
+        List[Message]
+            The messages to send, within the budget whenever that is achievable.
+        """
+        if self.budget is None:
+            if not self._reported_unknown:
+                self._reported_unknown = True
+                logger.warning(
+                    "The context window of %s is unknown, so prompts are sent without"
+                    " fitting them; set %s to fit them",
+                    self.model_name,
+                    CONTEXT_WINDOW_ENV,
+                )
+            return messages
+
+        counts = [self.count([message]) for message in messages]
+        if sum(counts) <= self.budget:
+            return messages
+
+        fitted = list(messages)
+        total_before = sum(counts)
+        applied = []
+        for name, strategy in (
+            ("drop stale retries", self._drop_stale_retries),
+            ("elide unchanged files", self._elide_unchanged_files),
+            ("summarize old turns", self._summarize_old_turns),
+            ("truncate", self._truncate),
+        ):
+            strategy(fitted, counts)
+            applied.append(name)
+            if sum(counts) <= self.budget:
+                break
+        else:
+            logger.warning(
+                "Prompt of %d tokens still exceeds the budget of %d tokens for %s",
+                sum(counts),
+                self.budget,
+                self.model_name,
+            )
+
+        logger.info(
+            "Fitted prompt from %d to %d tokens for %s (%s)",
+            total_before,
+            sum(counts),
+            self.model_name,
+            ", ".join(applied),
+        )
+        return fitted
+
+    def _over_budget(self, counts: List[int]) -> bool:
+        return sum(counts) > (self.budget or 0)
+
+    def _replace(
+        self, messages: List[Message], counts: List[int], index: int, content: str
+    ) -> None:
+        messages[index] = messages[index].__class__(content=content)
+        counts[index] = self.count([messages[index]])
+
+    def _is_retry(self, message: Message) -> bool:
+        return (
+            message.type == "human"
+            and isinstance(message.content, str)
+            and message.content.startswith(self.retry_prefixes)
+        )
+
+    def _drop_stale_retries(self, messages: List[Message], counts: List[int]) -> None:
+        # A stale retry turn is a failed answer followed by its refinement request; the
+        # latest one is kept, since the pending request refers to it.
+        while self._over_budget(counts):
+            retries = [i for i, m in enumerate(messages) if self._is_retry(m)]
+            if len(retries) < 2:
+                return
+            index = retries[0]
+            start = (
+                index - 1 if index > 0 and messages[index - 1].type == "ai" else index
+            )
+            del messages[start : index + 1]
+            del counts[start : index + 1]
+
+    def _elide_unchanged_files(
+        self, messages: List[Message], counts: List[int]
+    ) -> None:
+        # Files that are mentioned outside the listings (in the prompt or in an answer)
+        # are the ones being worked on and keep their bodies.
+        outside_listings = "\n".join(
+            FILE_LISTING_PATTERN.sub("", message.content)
+            for message in messages
+            if isinstance(message.content, str)
+        )
+        candidates = []
+        for index, message in enumerate(messages):
+            if message.type != "human" or not isinstance(message.content, str):
+                continue
+            for match in FILE_LISTING_PATTERN.finditer(message.content):
+                name = match.group("name").strip()
+                if name in outside_listings or name.rsplit("/", 1)[-1] in (
+                    outside_listings
+                ):
+                    continue
+                candidates.append((-len(match.group("body")), index, name))
+
+        # Largest files first; ties are broken by position for determinism
+        for _, index, name in sorted(candidates):
+            if not self._over_budget(counts):
+                return
+            content = messages[index].content
+            match = next(
+                m
+                for m in FILE_LISTING_PATTERN.finditer(content)
+                if m.group("name").strip() == name
+            )
+            n_lines = match.group("body").count("\n")
+            elided = elided_file_listing(match.group("name"), n_lines)
+            self._replace(
+                messages,
+                counts,
+                index,
+                content[: match.start()] + elided + content[match.end() :],
+            )
+
+    def _summarize_old_turns(self, messages: List[Message], counts: List[int]) -> None:
+        # The system prompt, the task (first human message) and the latest exchange are
+        # kept verbatim; everything in between is summarized, oldest first.
+        first_human = next(
+            (i for i, message in enumerate(messages) if message.type == "human"), None
+        )
+        if first_human is None:
+            return
+        for index in range(first_human + 1, len(messages) - 2):
+            if not self._over_budget(counts):
+                return
+            content = messages[index].content
+            if not isinstance(content, str):
+                continue
+            summary = self._summarize(messages[index].type, content, counts[index])
+            if len(summary) < len(content):
+                self._replace(messages, counts, index, summary)
+
+    @staticmethod
+    def _summarize(message_type: str, content: str, n_tokens: int) -> str:
+        lines = [line.strip() for line in content.splitlines() if line.strip()]
+        first_line = lines[0][:SUMMARY_LINE_LENGTH] if lines else ""
+        touched = sorted(set(re.findall(r"^\+\+\+ (\S+)", content, re.MULTILINE)))
+        speaker = "answer" if message_type == "ai" else "message"
+        summary = (
+            f"[Earlier {speaker} of {n_tokens} tokens summarized to fit the"
+            f" context window] {first_line}"
+        )
+        if touched:
+            summary += f"\nFiles changed: {', '.join(touched)}"
+        return summary
+
+    def _truncate(self, messages: List[Message], counts: List[int]) -> None:
+        # Cut the middle out of the largest text message until the prompt fits; the head
+        # and tail of a message usually carry the instructions and the latest context.
+        # Both are always kept, so once a message is cut down to them the next-largest
+        # message is cut instead.
+        exhausted = set()
+        for _ in range(len(messages) * 4):
+            excess = sum(counts) - self.budget
+            if excess <= 0:
+                return
+            text_indices = [
+                i
+                for i, m in enumerate(messages)
+                if isinstance(m.content, str) and i not in exhausted
+            ]
+            if not text_indices:
+                return
+            index = max(text_indices, key=lambda i: (counts[i], -i))
+            content = messages[index].content
+            chars_per_token = len(content) / max(counts[index], 1)
+            marker_chars = len(TRUNCATION_MARKER.format(removed=len(content)))
+            removable = len(content) - 2 * TRUNCATE_KEEP_CHARS
+            remove = min(
+                removable, int((excess * chars_per_token + marker_chars) * 1.1) + 1
+            )
+            if remove <= marker_chars:
+                exhausted.add(index)
+                continue
+            if remove == removable:
+                exhausted.add(index)
+            head = (len(content) - remove) // 2
+            tail = len(content) - remove - head
+            self._replace(
+                messages,
+                counts,
+                index,
+                content[:head]
+                + TRUNCATION_MARKER.format(removed=remove)
+                + content[-tail:],
+            )
+
+
+@dataclass
+class FileBudget:
+    """
+    The token cost of one uploaded file and what the planner does with it.
+
+    Attributes
+    ----------
+    name : str
+        The name of the file.
+    tokens : int
+        The tokens of the file's full listing.
+    referenced : bool
+        Whether the prompt mentions the file; referenced files are never elided or dropped.
+    action : str
+        ``"keep"``, ``"elide"`` or ``"drop"``.
+    sent_tokens : int
+        The tokens actually sent for the file.
+    """
+
+    name: str
+    tokens: int
+    referenced: bool
+    action: str = KEEP
+    sent_tokens: int = 0
+
+
+@dataclass
+class BudgetPlan:
+    """
+    The preflight token plan of the files of an improve request.
+
+    Attributes
+    ----------
+    model_name : str
+        The name of the model.
+    context_window : Optional[int]
+        The model's context window in tokens, or None if it is unknown.
+    budget : Optional[int]
+        The tokens available for the prompt, or None if the context window is unknown.
+    fixed_tokens : int
+        The tokens of everything but the files (system prompt, user prompt, framing).
+    files : List[FileBudget]
+        The files, in the order they are sent.
+    """
+
+    model_name: str
+    context_window: Optional[int]
+    budget: Optional[int]
+    fixed_tokens: int
+    files: List[FileBudget] = field(default_factory=list)
+
+    @property
+    def total_tokens(self) -> int:
+        """The tokens of the prompt as planned."""
+        return self.fixed_tokens + sum(f.sent_tokens for f in self.files)
+
+    @property
+    def fits(self) -> bool:
+        """Whether the planned prompt fits into the budget, which it does if the budget is unknown."""
+        return self.budget is None or self.total_tokens <= self.budget
+
+    @property
+    def changed(self) -> bool:
+        """Whether any file is elided or dropped."""
+        return any(f.action != KEEP for f in self.files)
+
+    def to_chat(self, files_dict: FilesDict) -> str:
+        """
+        Format the files as `FilesDict.to_chat` does, applying the plan.
+
+        Kept files are listed in full, elided files with a placeholder and dropped files
+        not at all. When every file is kept, the result equals ``files_dict.to_chat()``.
+        """
+        actions = {f.name: f.action for f in self.files}
+        chat_str = ""
+        for name, content in files_dict.items():
+            action = actions.get(str(name), KEEP)
+            if action == KEEP:
+                chat_str += _file_listing(name, content)
+            elif action == ELIDE:
+                chat_str += elided_file_listing(name, len(line_table(content))) + "\n"
+        return f"```\n{chat_str}```"
+
+    def report(self) -> str:
+        """Return a human readable table of the per-file costs and the total."""
+        lines = [
+            f"{f.tokens:>9,} tokens  {f.action:<5}  {f.name}"
+            + (" (referenced)" if f.referenced else "")
+            for f in self.files
+        ]
+        if self.budget is None:
+            lines.append(
+                f"Prompt: {self.total_tokens:,} tokens"
+                f" ({self.model_name}, context window unknown)"
+            )
+        else:
+            lines.append(
+                f"Prompt: {self.total_tokens:,} of {self.budget:,} tokens available"
+                f" ({self.model_name}, context window {self.context_window:,})"
+                + ("" if self.fits else " - does not fit")
+            )
+        return "\n".join(lines)
+
+
+def _file_listing(name: Union[str, Path], content: str) -> str:
+    # One file of FilesDict.to_chat
+    listing = f"File: {name}\n"
+    for line_number, line_content in enumerate(line_table(content), 1):
+        listing += f"{line_number} {line_content}\n"
+    return listing + "\n"
+
+
+def _is_referenced(name: str, text: str) -> bool:
+    return name in text or Path(name).name in text
+
+
+def plan_file_budget(
+    manager: ContextWindowManager,
+    files_dict: FilesDict,
+    prompt: str,
+    system: str = "",
+    strategy: str = ELIDE,
+) -> BudgetPlan:
+    """
+    Plan which files of an improve request are sent in full.
+
+    The cost of every file is computed with the manager's tokenizer. If the request does
+    not fit the manager's budget, files that the prompt does not mention are elided
+    (replaced by a one-line placeholder) or dropped, largest first, until it fits. If the
+    context window of the model is unknown, the costs are only reported, whatever the
+    strategy.
+
+    Parameters
+    ----------
+    manager : ContextWindowManager
+        The context window manager of the model the request is for.
+    files_dict : FilesDict
+        The uploaded files.
+    prompt : str
+        The user prompt.
+    system : str, optional
+        The system prompt.
+    strategy : str, optional
+        ``"elide"`` (the default), ``"drop"``, or ``"off"`` to only report the costs.
+
+    Returns
+    -------
+    BudgetPlan
+        The plan.
+    """
+    if strategy not in FILE_BUDGET_STRATEGIES:
+        raise ValueError(
+            f"Unknown file budget strategy {strategy!r}, expected one of"
+            f" {', '.join(FILE_BUDGET_STRATEGIES)}"
+        )
+    tokenizer = manager.tokenizer
+    fixed_tokens = manager.count(
+        [
+            SystemMessage(content=system),
+            HumanMessage(content="```\n```"),
+            HumanMessage(content=prompt),
+        ]
+    )
+    files = []
+    for name, content in files_dict.items():
+        tokens = tokenizer.num_tokens(_file_listing(name, content))
+        files.append(
+            FileBudget(
+                str(name), tokens, _is_referenced(str(name), prompt), KEEP, tokens
+            )
+        )
+    plan = BudgetPlan(
+        manager.model_name, manager.context_window, manager.budget, fixed_tokens, files
+    )
+    if strategy == "off" or plan.budget is None:
+        return plan
+
+    contents: Dict[str, str] = {
+        str(name): content for name, content in files_dict.items()
+    }
+    candidates = sorted(
+        (f for f in files if not f.referenced), key=lambda f: (-f.tokens, f.name)
+    )
+    for candidate in candidates:
+        if plan.fits:
+            break
+        candidate.action = strategy
+        if strategy == ELIDE:
+            n_lines = len(line_table(contents[candidate.name]))
+            candidate.sent_tokens = tokenizer.num_tokens(
+                elided_file_listing(candidate.name, n_lines) + "\n"
+            )
+        else:
+            candidate.sent_tokens = 0
+
+    if plan.changed:
+        logger.info("Planned the files of the request to fit:\n%s", plan.report())
+    return plan
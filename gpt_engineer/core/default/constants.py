@@ -8,5 +8,21 @@ Constants
 ---------
 MAX_EDIT_REFINEMENT_STEPS : int
     The maximum number of refinement steps allowed when generating edit blocks.
+IMPROVE_CANDIDATES : int
+    The default number of candidate answers requested concurrently for an improve prompt.
+IMPROVE_FILE_BUDGET : str
+    What the preflight planner does with files that do not fit into the context window
+    of an improve request: "elide", "drop" or "off". Files are only elided or dropped
+    for models whose context window is known.
+IMPROVE_DIFF_ALIGNMENT : str
+    How the hunks of an improve answer are matched against the files: "greedy" walks
+    them line by line, "align" aligns each hunk with the file as a whole.
+IMPROVE_PATCH_FUZZ : int
+    The fuzz of the local fallback that places hunks failing validation like `patch`
+    before a refinement round trip is requested; a negative value disables it.
 """
 MAX_EDIT_REFINEMENT_STEPS = 2
+IMPROVE_CANDIDATES = 1
+IMPROVE_FILE_BUDGET = "elide"
+IMPROVE_DIFF_ALIGNMENT = "greedy"
+IMPROVE_PATCH_FUZZ = 2
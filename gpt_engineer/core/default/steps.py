@@ -16,9 +16,15 @@ setup_sys_prompt : function
 gen_code : function
     Generates code from a prompt using AI and returns the generated files.
 
+agen_code : function
+    Asynchronous variant of gen_code for use with AsyncAI.
+
 gen_entrypoint : function
     Generates an entrypoint for the codebase and returns the entrypoint files.
 
+agen_entrypoint : function
+    Asynchronous variant of gen_entrypoint for use with AsyncAI.
+
 execute_entrypoint : function
     Executes the entrypoint of the codebase.
 
@@ -28,6 +34,9 @@ setup_sys_prompt_existing_code : function
 
 improve : function
     Improves the code based on user input and returns the updated files.
+
+aimprove_fn : function
+    Asynchronous variant of improve_fn for use with AsyncAI.
 """
 
 import inspect
@@ -37,16 +46,32 @@ import sys
 import traceback
 
 from pathlib import Path
-from typing import List, MutableMapping, Union
+from typing import Callable, List, MutableMapping, Optional, Union
 
 from langchain.schema import HumanMessage, SystemMessage
 from termcolor import colored
 
-from gpt_engineer.core.ai import AI
+from gpt_engineer.core.ai import AI, AsyncAI, BatchResult
 from gpt_engineer.core.base_execution_env import BaseExecutionEnv
 from gpt_engineer.core.base_memory import BaseMemory
-from gpt_engineer.core.chat_to_files import apply_diffs, chat_to_files_dict, parse_diffs
-from gpt_engineer.core.default.constants import MAX_EDIT_REFINEMENT_STEPS
+from gpt_engineer.core.chat_to_files import (
+    StreamingFilesParser,
+    apply_diffs,
+    chat_to_files_dict,
+    parse_diffs,
+)
+from gpt_engineer.core.context_window import (
+    RETRY_PROMPT_PREFIX,
+    ContextWindowManager,
+    plan_file_budget,
+)
+from gpt_engineer.core.default.constants import (
+    IMPROVE_CANDIDATES,
+    IMPROVE_DIFF_ALIGNMENT,
+    IMPROVE_FILE_BUDGET,
+    IMPROVE_PATCH_FUZZ,
+    MAX_EDIT_REFINEMENT_STEPS,
+)
 from gpt_engineer.core.default.paths import (
     CODE_GEN_LOG_FILE,
     DEBUG_LOG_FILE,
@@ -55,7 +80,9 @@ from gpt_engineer.core.default.paths import (
     ENTRYPOINT_LOG_FILE,
     IMPROVE_LOG_FILE,
 )
-from gpt_engineer.core.files_dict import FilesDict, file_to_lines_dict
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.fuzzy_patch import fuzzy_patch_stats
+from gpt_engineer.core.parallel_diffs import validate_diffs
 from gpt_engineer.core.preprompts_holder import PrepromptsHolder
 from gpt_engineer.core.prompt import Prompt
 
@@ -119,7 +146,11 @@ def setup_sys_prompt_existing_code(
 
 
 def gen_code(
-    ai: AI, prompt: Prompt, memory: BaseMemory, preprompts_holder: PrepromptsHolder
+    ai: AI,
+    prompt: Prompt,
+    memory: BaseMemory,
+    preprompts_holder: PrepromptsHolder,
+    on_file: Optional[Callable[[str, str], None]] = None,
 ) -> FilesDict:
     """
     Generates code from a prompt using AI and returns the generated files.
@@ -134,6 +165,9 @@ def gen_code(
         The memory interface where the code and related data are stored.
     preprompts_holder : PrepromptsHolder
         The holder for preprompt messages that guide the AI model.
+    on_file : Optional[Callable[[str, str], None]], optional
+        If given, the answer is streamed and `on_file(path, content)` is called as soon
+        as each file block is complete, before the model has finished generating.
 
     Returns
     -------
@@ -142,8 +176,62 @@ def gen_code(
     """
     preprompts = preprompts_holder.get_preprompts()
     messages = ai.start(
-        setup_sys_prompt(preprompts), prompt.to_langchain_content(), step_name=curr_fn()
+        setup_sys_prompt(preprompts),
+        prompt.to_langchain_content(),
+        step_name=curr_fn(),
+        **_streaming_kwargs(on_file),
+    )
+    return _files_from_code_gen(messages, memory)
+
+
+async def agen_code(
+    ai: AsyncAI,
+    prompt: Prompt,
+    memory: BaseMemory,
+    preprompts_holder: PrepromptsHolder,
+    on_file: Optional[Callable[[str, str], None]] = None,
+) -> FilesDict:
+    """
+    Asynchronous variant of `gen_code` for use with `AsyncAI`.
+
+    Parameters
+    ----------
+    ai : AsyncAI
+        The asynchronous AI model used for generating code.
+    prompt : str
+        The user prompt to generate code from.
+    memory : BaseMemory
+        The memory interface where the code and related data are stored.
+    preprompts_holder : PrepromptsHolder
+        The holder for preprompt messages that guide the AI model.
+    on_file : Optional[Callable[[str, str], None]], optional
+        If given, the answer is streamed and `on_file(path, content)` is called as soon
+        as each file block is complete.
+
+    Returns
+    -------
+    FilesDict
+        A dictionary of file names to their respective source code content.
+    """
+    preprompts = preprompts_holder.get_preprompts()
+    messages = await ai.start(
+        setup_sys_prompt(preprompts),
+        prompt.to_langchain_content(),
+        step_name=curr_fn(),
+        **_streaming_kwargs(on_file),
     )
+    return _files_from_code_gen(messages, memory)
+
+
+def _streaming_kwargs(on_file: Optional[Callable[[str, str], None]]) -> dict:
+    # Only request streaming when a consumer wants the files early, so AI
+    # implementations without streaming support keep working unchanged.
+    if on_file is None:
+        return {}
+    return {"on_chunk": StreamingFilesParser(on_file=on_file).feed}
+
+
+def _files_from_code_gen(messages: List, memory: BaseMemory) -> FilesDict:
     chat = messages[-1].content.strip()
     memory.log(CODE_GEN_LOG_FILE, "\n\n".join(x.pretty_repr() for x in messages))
     files_dict = chat_to_files_dict(chat)
@@ -176,6 +264,51 @@ def gen_entrypoint(
     FilesDict
         A dictionary containing the entrypoint file.
     """
+    preprompts = preprompts_holder.get_preprompts()
+    messages = ai.start(
+        system=(preprompts["entrypoint"]),
+        user=_entrypoint_user_prompt(prompt, files_dict),
+        step_name=curr_fn(),
+    )
+    return _entrypoint_from_messages(messages, memory)
+
+
+async def agen_entrypoint(
+    ai: AsyncAI,
+    prompt: Prompt,
+    files_dict: FilesDict,
+    memory: BaseMemory,
+    preprompts_holder: PrepromptsHolder,
+) -> FilesDict:
+    """
+    Asynchronous variant of `gen_entrypoint` for use with `AsyncAI`.
+
+    Parameters
+    ----------
+    ai : AsyncAI
+        The asynchronous AI model used for generating the entrypoint.
+    files_dict : FilesDict
+        The dictionary of file names to their respective source code content.
+    memory : BaseMemory
+        The memory interface where the code and related data are stored.
+    preprompts_holder : PrepromptsHolder
+        The holder for preprompt messages that guide the AI model.
+
+    Returns
+    -------
+    FilesDict
+        A dictionary containing the entrypoint file.
+    """
+    preprompts = preprompts_holder.get_preprompts()
+    messages = await ai.start(
+        system=(preprompts["entrypoint"]),
+        user=_entrypoint_user_prompt(prompt, files_dict),
+        step_name=curr_fn(),
+    )
+    return _entrypoint_from_messages(messages, memory)
+
+
+def _entrypoint_user_prompt(prompt: Prompt, files_dict: FilesDict) -> str:
     user_prompt = prompt.entrypoint_prompt
     if not user_prompt:
         user_prompt = """
@@ -183,14 +316,10 @@ def gen_entrypoint(
         a) installs dependencies
         b) runs all necessary parts of the codebase (in parallel if necessary)
         """
-    preprompts = preprompts_holder.get_preprompts()
-    messages = ai.start(
-        system=(preprompts["entrypoint"]),
-        user=user_prompt
-        + "\nInformation about the codebase:\n\n"
-        + files_dict.to_chat(),
-        step_name=curr_fn(),
-    )
+    return user_prompt + "\nInformation about the codebase:\n\n" + files_dict.to_chat()
+
+
+def _entrypoint_from_messages(messages: List, memory: BaseMemory) -> FilesDict:
     print()
     chat = messages[-1].content.strip()
     regex = r"```\S*\n(.+?)```"
@@ -275,10 +404,18 @@ def improve_fn(
     memory: BaseMemory,
     preprompts_holder: PrepromptsHolder,
     diff_timeout=3,
+    candidates: int = IMPROVE_CANDIDATES,
+    file_budget: str = IMPROVE_FILE_BUDGET,
+    diff_alignment: str = IMPROVE_DIFF_ALIGNMENT,
+    patch_fuzz: int = IMPROVE_PATCH_FUZZ,
 ) -> FilesDict:
     """
     Improves the code based on user input and returns the updated files.
 
+    With several `candidates`, that many answers are requested concurrently and validated
+    locally, and the conversation continues with the best one (the fewest problems, then
+    the most valid hunks), which trades parallel tokens for fewer refinement round trips.
+
     Parameters
     ----------
     ai : AI
@@ -291,72 +428,328 @@ def improve_fn(
         The memory interface where the code and related data are stored.
     preprompts_holder : PrepromptsHolder
         The holder for preprompt messages that guide the AI model.
+    candidates : int
+        The number of candidate answers to request for the prompt.
+    file_budget : str
+        What to do with files that do not fit into the context window: ``"elide"`` their
+        bodies, ``"drop"`` them, or ``"off"`` to only report the token costs.
+    diff_alignment : str
+        How the hunks of the answer are matched against the files: walked line by line
+        (``"greedy"``) or aligned as a whole (``"align"``).
+    patch_fuzz : int
+        The fuzz of the local fallback for hunks that fail validation, which places them
+        like `patch` before the model is asked to rewrite them; negative to disable it.
 
     Returns
     -------
     FilesDict
         The dictionary of file names to their respective updated source code content.
     """
-    preprompts = preprompts_holder.get_preprompts()
-    messages = [
-        SystemMessage(content=setup_sys_prompt_existing_code(preprompts)),
-    ]
+    messages = _improve_messages(
+        ai, prompt, files_dict, memory, preprompts_holder, file_budget
+    )
+    return _improve_loop(
+        ai,
+        files_dict,
+        memory,
+        messages,
+        diff_timeout=diff_timeout,
+        candidates=candidates,
+        diff_alignment=diff_alignment,
+        patch_fuzz=patch_fuzz,
+    )
+
 
-    # Add files as input
-    messages.append(HumanMessage(content=f"{files_dict.to_chat()}"))
+async def aimprove_fn(
+    ai: AsyncAI,
+    prompt: Prompt,
+    files_dict: FilesDict,
+    memory: BaseMemory,
+    preprompts_holder: PrepromptsHolder,
+    diff_timeout=3,
+    candidates: int = IMPROVE_CANDIDATES,
+    file_budget: str = IMPROVE_FILE_BUDGET,
+    diff_alignment: str = IMPROVE_DIFF_ALIGNMENT,
+    patch_fuzz: int = IMPROVE_PATCH_FUZZ,
+) -> FilesDict:
+    """
+    Asynchronous variant of `improve_fn` for use with `AsyncAI`.
+
+    Parameters
+    ----------
+    ai : AsyncAI
+        The asynchronous AI model used for improving code.
+    prompt :str
+        The user prompt to improve the code.
+    files_dict : FilesDict
+        The dictionary of file names to their respective source code content.
+    memory : BaseMemory
+        The memory interface where the code and related data are stored.
+    preprompts_holder : PrepromptsHolder
+        The holder for preprompt messages that guide the AI model.
+    candidates : int
+        The number of candidate answers to request for the prompt.
+    file_budget : str
+        What to do with files that do not fit into the context window: ``"elide"`` their
+        bodies, ``"drop"`` them, or ``"off"`` to only report the token costs.
+    diff_alignment : str
+        How the hunks of the answer are matched against the files: walked line by line
+        (``"greedy"``) or aligned as a whole (``"align"``).
+    patch_fuzz : int
+        The fuzz of the local fallback for hunks that fail validation, which places them
+        like `patch` before the model is asked to rewrite them; negative to disable it.
+
+    Returns
+    -------
+    FilesDict
+        The dictionary of file names to their respective updated source code content.
+    """
+    messages = _improve_messages(
+        ai, prompt, files_dict, memory, preprompts_holder, file_budget
+    )
+    return await _aimprove_loop(
+        ai,
+        files_dict,
+        memory,
+        messages,
+        diff_timeout=diff_timeout,
+        candidates=candidates,
+        diff_alignment=diff_alignment,
+        patch_fuzz=patch_fuzz,
+    )
+
+
+def _improve_messages(
+    ai: Union[AI, AsyncAI],
+    prompt: Prompt,
+    files_dict: FilesDict,
+    memory: BaseMemory,
+    preprompts_holder: PrepromptsHolder,
+    file_budget: str = IMPROVE_FILE_BUDGET,
+) -> List:
+    preprompts = preprompts_holder.get_preprompts()
+    system = setup_sys_prompt_existing_code(preprompts)
+    messages = [SystemMessage(content=system)]
+
+    # Add files as input, planned against the context window before anything is sent
+    files_chat = files_dict.to_chat()
+    manager = getattr(ai, "context_window", None)
+    if isinstance(manager, ContextWindowManager):
+        plan = plan_file_budget(manager, files_dict, prompt.text, system, file_budget)
+        if plan.changed or not plan.fits:
+            print(plan.report())
+            print()
+        files_chat = plan.to_chat(files_dict)
+        memory.log(DEBUG_LOG_FILE, "TOKEN BUDGET:\n" + plan.report())
+    messages.append(HumanMessage(content=files_chat))
     messages.append(HumanMessage(content=prompt.to_langchain_content()))
     memory.log(
         DEBUG_LOG_FILE,
         "UPLOADED FILES:\n" + files_dict.to_log() + "\nPROMPT:\n" + prompt.text,
     )
-    return _improve_loop(ai, files_dict, memory, messages, diff_timeout=diff_timeout)
+    return messages
 
 
 def _improve_loop(
-    ai: AI, files_dict: FilesDict, memory: BaseMemory, messages: List, diff_timeout=3
+    ai: AI,
+    files_dict: FilesDict,
+    memory: BaseMemory,
+    messages: List,
+    diff_timeout=3,
+    candidates: int = IMPROVE_CANDIDATES,
+    diff_alignment: str = IMPROVE_DIFF_ALIGNMENT,
+    patch_fuzz: int = IMPROVE_PATCH_FUZZ,
 ) -> FilesDict:
-    messages = ai.next(messages, step_name=curr_fn())
-    files_dict, errors = salvage_correct_hunks(
-        messages, files_dict, memory, diff_timeout=diff_timeout
-    )
+    if candidates > 1:
+        results = ai.next_many(
+            [list(messages) for _ in range(candidates)], step_name=curr_fn()
+        )
+        messages, files_dict, errors = _apply_best_candidate(
+            results, files_dict, memory, diff_timeout, diff_alignment, patch_fuzz
+        )
+    else:
+        messages = ai.next(messages, step_name=curr_fn())
+        files_dict, errors = salvage_correct_hunks(
+            messages,
+            files_dict,
+            memory,
+            diff_timeout=diff_timeout,
+            diff_alignment=diff_alignment,
+            patch_fuzz=patch_fuzz,
+        )
 
     retries = 0
     while errors and retries < MAX_EDIT_REFINEMENT_STEPS:
-        messages.append(
-            HumanMessage(
-                content="Some previously produced diffs were not on the requested format, or the code part was not found in the code. Details:\n"
-                + "\n".join(errors)
-                + "\n Only rewrite the problematic diffs, making sure that the failing ones are now on the correct format and can be found in the code. Make sure to not repeat past mistakes. \n"
-            )
-        )
+        messages.append(_refinement_message(errors))
         messages = ai.next(messages, step_name=curr_fn())
         files_dict, errors = salvage_correct_hunks(
-            messages, files_dict, memory, diff_timeout
+            messages, files_dict, memory, diff_timeout, diff_alignment, patch_fuzz
         )
         retries += 1
 
     return files_dict
 
 
-def salvage_correct_hunks(
-    messages: List, files_dict: FilesDict, memory: BaseMemory, diff_timeout=3
-) -> tuple[FilesDict, List[str]]:
-    error_messages = []
+async def _aimprove_loop(
+    ai: AsyncAI,
+    files_dict: FilesDict,
+    memory: BaseMemory,
+    messages: List,
+    diff_timeout=3,
+    candidates: int = IMPROVE_CANDIDATES,
+    diff_alignment: str = IMPROVE_DIFF_ALIGNMENT,
+    patch_fuzz: int = IMPROVE_PATCH_FUZZ,
+) -> FilesDict:
+    if candidates > 1:
+        results = await ai.next_many(
+            [list(messages) for _ in range(candidates)], step_name=curr_fn()
+        )
+        messages, files_dict, errors = _apply_best_candidate(
+            results, files_dict, memory, diff_timeout, diff_alignment, patch_fuzz
+        )
+    else:
+        messages = await ai.next(messages, step_name=curr_fn())
+        files_dict, errors = salvage_correct_hunks(
+            messages,
+            files_dict,
+            memory,
+            diff_timeout=diff_timeout,
+            diff_alignment=diff_alignment,
+            patch_fuzz=patch_fuzz,
+        )
+
+    retries = 0
+    while errors and retries < MAX_EDIT_REFINEMENT_STEPS:
+        messages.append(_refinement_message(errors))
+        messages = await ai.next(messages, step_name=curr_fn())
+        files_dict, errors = salvage_correct_hunks(
+            messages, files_dict, memory, diff_timeout, diff_alignment, patch_fuzz
+        )
+        retries += 1
+
+    return files_dict
+
+
+def _refinement_message(errors: List[str]) -> HumanMessage:
+    return HumanMessage(
+        content=RETRY_PROMPT_PREFIX
+        + ", or the code part was not found in the code. Details:\n"
+        + "\n".join(errors)
+        + "\n Only rewrite the problematic diffs, making sure that the failing ones are now on the correct format and can be found in the code. Make sure to not repeat past mistakes. \n"
+    )
+
+
+def _apply_best_candidate(
+    results: List[BatchResult],
+    files_dict: FilesDict,
+    memory: BaseMemory,
+    diff_timeout=3,
+    diff_alignment: str = IMPROVE_DIFF_ALIGNMENT,
+    patch_fuzz: int = IMPROVE_PATCH_FUZZ,
+) -> tuple[List, FilesDict, List[str]]:
+    """
+    Validate every candidate answer and apply the best one.
+
+    Candidates are ranked by the number of problems, then by the number of valid hunks;
+    ties go to the earliest candidate. Candidates whose request failed or whose diffs cannot
+    be validated at all are skipped.
+
+    Returns
+    -------
+    tuple[List, FilesDict, List[str]]
+        The conversation of the selected candidate, the updated files and its problems.
+    """
+    scored = []
+    report = []
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            report.append(f"Candidate {index + 1}: request failed: {result}")
+            continue
+        try:
+            diffs, errors = _validate_diffs(
+                result, files_dict, diff_timeout, diff_alignment, patch_fuzz
+            )
+        except Exception as e:
+            report.append(f"Candidate {index + 1}: diffs cannot be validated: {e}")
+            continue
+        n_hunks = sum(len(diff.hunks) for diff in diffs.values())
+        report.append(
+            f"Candidate {index + 1}: {len(errors)} problems, {n_hunks} valid hunks"
+        )
+        scored.append(((len(errors), -n_hunks, index), result, diffs, errors))
+    memory.log(DEBUG_LOG_FILE, "IMPROVE CANDIDATES:\n" + "\n".join(report))
+
+    if not scored:
+        failures = [result for result in results if isinstance(result, Exception)]
+        if len(failures) == len(results):
+            raise failures[0]
+        # Let the first answer raise the same error as without candidates
+        messages = next(r for r in results if not isinstance(r, Exception))
+        return (
+            messages,
+            *salvage_correct_hunks(
+                messages, files_dict, memory, diff_timeout, diff_alignment, patch_fuzz
+            ),
+        )
+
+    _, messages, diffs, errors = min(scored, key=lambda candidate: candidate[0])
+    files_dict = _apply_validated_diffs(messages, diffs, errors, files_dict, memory)
+    return messages, files_dict, errors
+
+
+def _validate_diffs(
+    messages: List,
+    files_dict: FilesDict,
+    diff_timeout=3,
+    diff_alignment: str = IMPROVE_DIFF_ALIGNMENT,
+    patch_fuzz: int = IMPROVE_PATCH_FUZZ,
+) -> tuple[dict, List[str]]:
+    """Parse the diffs of the last answer, validating and correcting them against the files, with failing hunks placed by the fuzzy fallback if possible."""
     ai_response = messages[-1].content.strip()
 
     diffs = parse_diffs(ai_response, diff_timeout=diff_timeout)
-    # validate and correct diffs
+    # validate and correct diffs (new files need none), file by file in a process pool for large answers
+    return validate_diffs(diffs, files_dict, diff_alignment, patch_fuzz)
 
-    for _, diff in diffs.items():
-        # if diff is a new file, validation and correction is unnecessary
-        if not diff.is_new_file():
-            problems = diff.validate_and_correct(
-                file_to_lines_dict(files_dict[diff.filename_pre])
-            )
-            error_messages.extend(problems)
+
+def _apply_validated_diffs(
+    messages: List,
+    diffs: dict,
+    error_messages: List[str],
+    files_dict: FilesDict,
+    memory: BaseMemory,
+) -> FilesDict:
     files_dict = apply_diffs(diffs, files_dict)
     memory.log(IMPROVE_LOG_FILE, "\n\n".join(x.pretty_repr() for x in messages))
     memory.log(DIFF_LOG_FILE, "\n\n".join(error_messages))
+    fuzzed = [hunk for diff in diffs.values() for hunk in diff.fallback_hunks]
+    fuzzy_patch_stats().record(len(fuzzed), len(error_messages))
+    if fuzzed:
+        print(
+            f"{len(fuzzed)} hunks did not match the code exactly and were applied"
+            " with fuzzy matching."
+        )
+        memory.log(
+            DEBUG_LOG_FILE,
+            "FUZZY PATCH:\n" + "".join(hunk.hunk_to_string() for hunk in fuzzed),
+        )
+    return files_dict
+
+
+def salvage_correct_hunks(
+    messages: List,
+    files_dict: FilesDict,
+    memory: BaseMemory,
+    diff_timeout=3,
+    diff_alignment: str = IMPROVE_DIFF_ALIGNMENT,
+    patch_fuzz: int = IMPROVE_PATCH_FUZZ,
+) -> tuple[FilesDict, List[str]]:
+    diffs, error_messages = _validate_diffs(
+        messages, files_dict, diff_timeout, diff_alignment, patch_fuzz
+    )
+    files_dict = _apply_validated_diffs(
+        messages, diffs, error_messages, files_dict, memory
+    )
     return files_dict, error_messages
 
 
@@ -13,10 +13,19 @@ Key Features:
 
 4. Utility functions `is_similar` and `count_ratio` offer the capability to compare strings for similarity, accounting for variations in spacing and case. This aids in the validation process by allowing a flexible comparison of code lines.
 
+5. The `LineIndex` class maps the normalized lines of a file to their line numbers, so that the start of a hunk is found with a lookup instead of a similarity scan over the whole file. When several lines match, the candidates are scored on how many of the following hunk lines match too.
+
+6. The `LineHistograms` class keeps a character histogram of every normalized line of a file, so that `count_ratio` of one line against all lines of the file, or of a block of text against a block of file lines, is computed in one batched NumPy operation. Without NumPy, or for files with too many lines and distinct characters for its matrix, it falls back to memoized `Counter`s.
+
+7. In the ``"align"`` mode of `Diff.validate_and_correct`, each hunk is aligned with a window of the file as a whole by `Hunk.align_lines`, using the patience and Myers alignment of the `sequence_alignment` module, instead of being walked line by line; skipped and invented lines are corrected in one pass.
+
 Dependencies:
 
 - `logging`: Utilized for logging warnings and errors encountered during the validation and correction process.
 - `collections.Counter`: Used for counting occurrences of characters in strings, supporting the string similarity assessment functions.
+- `collections.defaultdict`: Used to group the line numbers of identical normalized lines in `LineIndex`.
+- `numpy` (optional): Used by `LineHistograms` for batched similarity computations.
+- `gpt_engineer.core.sequence_alignment`: Used to align hunks with the file in the ``"align"`` mode.
 
 Functions and Classes:
 
@@ -28,18 +37,223 @@ Functions and Classes:
 
 4. `count_ratio(str1, str2)`: Function that computes the ratio of common characters to the length of the longer string, aiding in the assessment of line similarity.
 
+5. `LineIndex`: Class mapping the normalized lines of a file to their line numbers.
+
+6. `normalize_line(line)`: Function returning a line without spaces and in lower case, the form in which lines are compared.
+
+7. `LineHistograms`: Class computing `count_ratio` of a text against many lines of a file at once.
+
 This module is essential for developers and teams utilizing version control systems, providing tools for a deeper analysis and correction of diffs, ensuring the integrity and accuracy of code changes.
 
 """
 import logging
 
-from collections import Counter
-from typing import List
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Mapping, Optional, Sequence
+from weakref import WeakKeyDictionary
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+from gpt_engineer.core.line_table import (
+    LineTable,
+    LineWindow,
+    as_line_window,
+    normalize_line,
+)
+from gpt_engineer.core.sequence_alignment import align_sequences
 
 RETAIN = "retain"
 ADD = "add"
 REMOVE = "remove"
 
+# How hunks are validated against the file: line by line, or aligned as a whole
+GREEDY = "greedy"
+ALIGN = "align"
+ALIGNMENT_MODES = (GREEDY, ALIGN)
+
+# The largest lines x distinct characters matrix `LineHistograms` builds; larger files use
+# the `Counter` fallback, whose memory grows with the file instead
+MAX_HISTOGRAM_CELLS = 4_000_000
+
+
+class LineHistograms:
+    """
+    Character histograms of the normalized lines of a file, for batched `count_ratio` computations.
+
+    With NumPy, every line is a row of counts over the characters of the file (plus a column for characters the
+    file does not contain, which is always zero for file lines), so the common characters of a text and every
+    line are one `minimum` and `sum` over the matrix. Blocks of consecutive lines are sums of their rows. The
+    results are exactly those of `count_ratio`. Without NumPy, or when the matrix would have more than
+    `MAX_HISTOGRAM_CELLS` cells, the same ratios are computed from memoized `Counter`s.
+
+    Attributes:
+        lines (list): The normalized lines of the file.
+        use_numpy (bool): Whether the NumPy kernel is used.
+    """
+
+    def __init__(self, lines: Sequence[str], use_numpy: Optional[bool] = None) -> None:
+        self.lines = list(lines)
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        self._counters: Dict[int, Counter] = {}
+        if not self.use_numpy:
+            return
+        codes = _code_points("".join(self.lines))
+        alphabet = np.union1d(np.unique(codes), [ord("\n")])
+        width = len(alphabet) + 1
+        if len(self.lines) * width > MAX_HISTOGRAM_CELLS:
+            self.use_numpy = False
+            return
+        self._unknown_column = len(alphabet)
+        self._newline_column = int(np.searchsorted(alphabet, ord("\n")))
+        # Column of every code point up to the largest one of the file; the last entry,
+        # for all larger code points, is the column of unknown characters
+        self._code_columns = np.full(
+            int(alphabet[-1]) + 2, self._unknown_column, dtype=np.intp
+        )
+        self._code_columns[alphabet] = np.arange(len(alphabet))
+        lengths = np.fromiter(map(len, self.lines), np.intp, count=len(self.lines))
+        rows = np.repeat(np.arange(len(self.lines)), lengths)
+        matrix = np.bincount(
+            rows * width + self._code_columns[codes],
+            minlength=len(self.lines) * width,
+        ).reshape(len(self.lines), width)
+        self._matrix = matrix.astype(np.int32)
+        self._lengths = lengths.astype(np.int64)
+
+    def _histogram(self, normalized: str):
+        codes = np.minimum(_code_points(normalized), len(self._code_columns) - 1)
+        return np.bincount(
+            self._code_columns[codes], minlength=self._unknown_column + 1
+        )
+
+    def _counter(self, row: int) -> Counter:
+        if row not in self._counters:
+            self._counters[row] = Counter(self.lines[row])
+        return self._counters[row]
+
+    def ratios(self, text: str) -> List[float]:
+        """Returns `count_ratio` of `text` against every line, in order."""
+        normalized = normalize_line(text)
+        if not self.use_numpy:
+            counter = Counter(normalized)
+            return [
+                _ratio(
+                    sum((counter & self._counter(row)).values()),
+                    max(len(normalized), len(line)),
+                )
+                for row, line in enumerate(self.lines)
+            ]
+        common = np.minimum(self._matrix, self._histogram(normalized)).sum(axis=1)
+        longer = np.maximum(self._lengths, len(normalized))
+        return np.where(longer == 0, 1.0, common / np.maximum(longer, 1)).tolist()
+
+    def block_ratio(self, text: str, start: int, stop: int) -> float:
+        """Returns `count_ratio` of `text` against the lines `start` to `stop` (exclusive) joined by newlines."""
+        normalized = normalize_line(text)
+        start, stop = max(start, 0), min(stop, len(self.lines))
+        if stop <= start:
+            return count_ratio(normalized, "")
+        if not self.use_numpy:
+            return count_ratio(normalized, "\n".join(self.lines[start:stop]))
+        newlines = stop - start - 1
+        block = self._matrix[start:stop].sum(axis=0, dtype=np.int64)
+        block[self._newline_column] += newlines
+        block_length = int(self._lengths[start:stop].sum())
+        common = int(np.minimum(block, self._histogram(normalized)).sum())
+        return _ratio(common, max(len(normalized), block_length + newlines))
+
+
+def _code_points(text: str):
+    # The code points of a text as an index array
+    return np.frombuffer(
+        text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32
+    ).astype(np.intp)
+
+
+class LineIndex:
+    """
+    Maps the normalized content of the lines of a file to their line numbers.
+
+    The index is built on the file's shared `LineTable`, once per version of the file (see `for_lines`), and
+    shared by all hunks of all diffs of that version, which turns the search for a hunk's starting line from a
+    similarity scan over the whole file into a lookup of the line's hash.
+
+    Attributes:
+        table (LineTable): The lines of the file.
+    """
+
+    def __init__(self, lines_dict: Mapping) -> None:
+        self.table = as_line_window(lines_dict).table
+        self._line_numbers: Dict[int, List[int]] = defaultdict(list)
+        for line_number, line_hash in enumerate(
+            self.table.hashes, self.table.first_line
+        ):
+            self._line_numbers[line_hash].append(line_number)
+        self._histograms: Optional[LineHistograms] = None
+
+    @classmethod
+    def for_lines(cls, lines_dict: Mapping) -> "LineIndex":
+        """Returns the index of the table of `lines_dict`, building it if this version of the file has none yet."""
+        table = as_line_window(lines_dict).table
+        index = _line_indexes.get(table)
+        if index is None:
+            index = _line_indexes[table] = cls(table.window())
+        return index
+
+    @property
+    def histograms(self) -> LineHistograms:
+        """The character histograms of the lines, built on first use."""
+        if self._histograms is None:
+            self._histograms = LineHistograms(self.table.normalized)
+        return self._histograms
+
+    def lookup(self, line: str, lines_dict: Optional[Mapping] = None) -> List[int]:
+        """Returns the numbers of the lines equal to `line` up to spaces and case, restricted to the keys of `lines_dict` if given."""
+        normalized = normalize_line(line)
+        return [
+            line_number
+            for line_number in self._line_numbers.get(hash(normalized), [])
+            if self.table.normalized[line_number - self.table.first_line] == normalized
+            and (lines_dict is None or line_number in lines_dict)
+        ]
+
+    def matches(self, line_number: int, line: str) -> bool:
+        """Checks whether the line at `line_number` equals `line` up to spaces and case."""
+        row = line_number - self.table.first_line
+        if not 0 <= row < len(self.table):
+            return False
+        normalized = normalize_line(line)
+        return (
+            self.table.hashes[row] == hash(normalized)
+            and self.table.normalized[row] == normalized
+        )
+
+    def similar_lines(
+        self, line: str, lines_dict: Mapping, similarity_threshold=0.9
+    ) -> List[int]:
+        """Returns the numbers of the lines of `lines_dict` that `is_similar` to `line`, in order."""
+        ratios = self.histograms.ratios(line)
+        first_line = self.table.first_line
+        return [
+            line_number
+            for line_number in lines_dict
+            if ratios[line_number - first_line] >= similarity_threshold
+        ]
+
+    def block_ratio(self, text: str, start: int, stop: int) -> float:
+        """Returns `count_ratio` of `text` against the lines numbered `start` to `stop` (exclusive) joined by newlines."""
+        row = start - self.table.first_line
+        if not 0 <= row < len(self.table) or stop <= start:
+            return count_ratio(text, "")
+        return self.histograms.block_ratio(text, row, row + stop - start)
+
+
+# The index of every line table in use, so that each version of a file is indexed once
+_line_indexes: "WeakKeyDictionary[LineTable, LineIndex]" = WeakKeyDictionary()
+
 
 class Hunk:
     """
@@ -95,6 +309,16 @@ class Hunk:
         assert self.category_counts[line[0]] > 0
         self.category_counts[line[0]] -= 1
 
+    def copy(self) -> "Hunk":
+        """Returns a copy of the hunk with its own list of lines."""
+        return Hunk(
+            self.start_line_pre_edit,
+            self.hunk_len_pre_edit,
+            self.start_line_post_edit,
+            self.hunk_len_post_edit,
+            list(self.lines),
+        )
+
     def add_lines(self, new_lines) -> None:
         """Adds multiple lines to the hunk."""
         for line in new_lines:
@@ -130,21 +354,69 @@ class Hunk:
         else:
             pass
 
-    def find_start_line(self, lines_dict: dict, problems: list) -> bool:
+    def anchor_candidates(
+        self, hunk_ind: int, lines_dict: dict, index: LineIndex
+    ) -> List[int]:
+        """Returns the numbers of the file lines the hunk line at `hunk_ind` can be anchored to: the lines equal to it up to spaces and case or, if there are none, the lines similar to it."""
+        line = self.lines[hunk_ind][1]
+        candidates = index.lookup(line, lines_dict)
+        if not candidates:
+            candidates = index.similar_lines(line, lines_dict)
+        return candidates
+
+    def best_anchor(
+        self, hunk_ind: int, candidates: List[int], index: LineIndex
+    ) -> int:
+        """
+        Picks the candidate file line for the hunk line at `hunk_ind` that the rest of the hunk matches best.
+
+        Each candidate is scored on how many of the next `forward_block_len` lines of the hunk that exist in the
+        original (RETAIN and REMOVE lines) equal the file lines following it. Ties go to the candidate closest to
+        the start line stated in the hunk header, then to the first one.
+        """
+        if len(candidates) == 1:
+            return candidates[0]
+        expected = [line[1] for line in self.lines[hunk_ind:] if line[0] != ADD][
+            : self.forward_block_len
+        ]
+
+        def score(candidate: int) -> int:
+            return sum(
+                index.matches(candidate + offset, line)
+                for offset, line in enumerate(expected)
+            )
+
+        return min(
+            candidates,
+            key=lambda candidate: (
+                -score(candidate),
+                abs(candidate - self.start_line_pre_edit),
+                candidate,
+            ),
+        )
+
+    def find_start_line(
+        self, lines_dict: Mapping, problems: list, index: Optional[LineIndex] = None
+    ) -> bool:
         """Finds the starting line of the hunk in the original code and returns a boolean value accordingly. If the starting line is not found, it appends a problem message to the problems list."""
+        lines_dict = as_line_window(lines_dict)
+        if index is None:
+            index = LineIndex.for_lines(lines_dict)
 
         # ToDo handle the case where the start line is 0 or 1 characters separately
         if self.lines[0][0] == ADD:
             # handle the case where the start line is an add
             start_line = None
             # find the first line that is not an add
-            for index, line in enumerate(self.lines):
+            for hunk_ind, line in enumerate(self.lines):
                 if line[0] != ADD:
-                    for line_number, line_content in lines_dict.items():
-                        # if the line is similar to a non-blank line in line_dict, we can pick the line prior to it
-                        if is_similar(line[1], line_content) and line[1] != "":
-                            start_line = line_number - 1
-                            break
+                    # if the line is similar to a non-blank line in line_dict, we can pick the line prior to it
+                    if line[1] != "":
+                        candidates = self.anchor_candidates(hunk_ind, lines_dict, index)
+                        if candidates:
+                            start_line = (
+                                self.best_anchor(hunk_ind, candidates, index) - 1
+                            )
                     # if the start line is not found, append a problem message
                     if start_line is None:
                         problems.append(
@@ -158,79 +430,74 @@ class Hunk:
                         retain_line = lines_dict.get(start_line, "")
                         if retain_line:
                             self.add_retained_line(lines_dict[start_line], 0)
-                            return self.validate_and_correct(lines_dict, problems)
+                            return self.validate_and_correct(
+                                lines_dict, problems, index
+                            )
                         else:
                             problems.append(
                                 f"In {self.hunk_to_string()}:The starting line of the diff {self.hunk_to_string()} does not exist in the code"
                             )
                             return False
-        pot_start_lines = {
-            key: is_similar(self.lines[0][1], line) for key, line in lines_dict.items()
-        }
-        sum_of_matches = sum(pot_start_lines.values())
-        if sum_of_matches == 0:
+        candidates = self.anchor_candidates(0, lines_dict, index)
+        if not candidates:
             # before we go any further, we should check if it's a comment from LLM
             if self.lines[0][1].count("#") > 0:
                 # if it is, we can mark it as an ADD lines
                 self.relabel_line(0, ADD)
                 # and restart the validation at the next line
-                return self.validate_and_correct(lines_dict, problems)
+                return self.validate_and_correct(lines_dict, problems, index)
 
             else:
                 problems.append(
                     f"In {self.hunk_to_string()}:The starting line of the diff {self.hunk_to_string()} does not exist in the code"
                 )
                 return False
-        elif sum_of_matches == 1:
-            start_ind = list(pot_start_lines.keys())[
-                list(pot_start_lines.values()).index(True)
-            ]  # lines are one indexed
-        else:
-            logging.warning("multiple candidates for starting index")
-            # ToDo handle all the cases better again here. Smartest choice is that, for each candidate check match to the next line etc (recursively)
-            start_ind = list(pot_start_lines.keys())[
-                list(pot_start_lines.values()).index(True)
-            ]
-        self.start_line_pre_edit = start_ind
+        if len(candidates) > 1:
+            logging.debug(
+                "%d candidates for the starting line, scoring them on the following lines",
+                len(candidates),
+            )
+        self.start_line_pre_edit = self.best_anchor(0, candidates, index)
 
         # This should now be fulfilled by default
         assert is_similar(self.lines[0][1], lines_dict[self.start_line_pre_edit])
         return True
 
-    def validate_lines(self, lines_dict: dict, problems: list) -> bool:
+    def validate_lines(
+        self, lines_dict: Mapping, problems: list, index: Optional[LineIndex] = None
+    ) -> bool:
         """Validates the lines of the hunk against the original file and returns a boolean value accordingly. If the lines do not match, it appends a problem message to the problems list."""
+        lines_dict = as_line_window(lines_dict)
+        if index is None:
+            index = LineIndex.for_lines(lines_dict)
+        last_line = lines_dict.last_line
         hunk_ind = 0
         file_ind = self.start_line_pre_edit
         # make an orig hunk lines for logging
         # orig_hunk_lines = deepcopy(self.lines)
-        while hunk_ind < len(self.lines) and file_ind <= max(lines_dict):
+        while hunk_ind < len(self.lines) and file_ind <= last_line:
             if self.lines[hunk_ind][0] == ADD:
                 # this cannot be validated, jump one index
                 hunk_ind += 1
-            elif not is_similar(self.lines[hunk_ind][1], lines_dict[file_ind]):
+            elif not (
+                index.matches(file_ind, self.lines[hunk_ind][1])
+                or is_similar(self.lines[hunk_ind][1], lines_dict[file_ind])
+            ):
                 # before we go any further, we should relabel the comment from LLM
                 if self.lines[hunk_ind][1].count("#") > 0:
                     self.relabel_line(hunk_ind, ADD)
                     continue
 
-                # make a forward block from the code for comparisons
-                forward_code = "\n".join(
-                    [
-                        lines_dict[ind]
-                        for ind in range(
-                            file_ind,
-                            min(
-                                file_ind + self.forward_block_len,
-                                max(lines_dict.keys()),
-                            ),
-                        )
-                    ]
+                # the forward block of the code for comparisons, read from the index's histograms
+                forward_code = (
+                    file_ind,
+                    min(file_ind + self.forward_block_len, last_line),
                 )
                 # make the original forward block for quantitative comparison
                 forward_block = self.make_forward_block(
                     hunk_ind, self.forward_block_len
                 )
-                orig_count_ratio = count_ratio(forward_block, forward_code)
+                orig_count_ratio = index.block_ratio(forward_block, *forward_code)
                 # Here we have 2 cases
                 # 1) some lines were simply skipped in the diff and we should add them to the diff
                 # If this is the case, adding the line to the diff, should give an improved forward diff
@@ -241,15 +508,15 @@ class Hunk:
                 forward_block_missing_line = "\n".join(
                     [lines_dict[file_ind], forward_block_missing_line]
                 )
-                missing_line_count_ratio = count_ratio(
-                    forward_block_missing_line, forward_code
+                missing_line_count_ratio = index.block_ratio(
+                    forward_block_missing_line, *forward_code
                 )
                 # 2) Additional lines, not belonging to the code were added to the diff
                 forward_block_false_line = self.make_forward_block(
                     hunk_ind + 1, self.forward_block_len
                 )
-                false_line_count_ratio = count_ratio(
-                    forward_block_false_line, forward_code
+                false_line_count_ratio = index.block_ratio(
+                    forward_block_false_line, *forward_code
                 )
                 if (
                     orig_count_ratio >= missing_line_count_ratio
@@ -285,25 +552,174 @@ class Hunk:
             return False
         return True
 
+    def locate(
+        self, expected: List[int], lines_dict: Mapping, index: LineIndex
+    ) -> Optional[int]:
+        """
+        Returns the line number of the file at which the lines of the hunk at the indices `expected` most likely start, or None if none of them is found.
+
+        Every non-blank expected line votes for the start lines implied by the file lines it can be anchored to (see
+        `anchor_candidates`), with a weight shared among them, so lines that occur once in the file count most.
+        The start with the most votes wins; ties go to the start line stated in the hunk header, then the first one.
+        """
+        votes: Dict[int, float] = defaultdict(float)
+        for position, hunk_ind in enumerate(expected):
+            if not normalize_line(self.lines[hunk_ind][1]):
+                continue
+            candidates = self.anchor_candidates(hunk_ind, lines_dict, index)
+            for candidate in candidates:
+                votes[candidate - position] += 1 / len(candidates)
+        if not votes:
+            return None
+        return min(
+            votes,
+            key=lambda start: (
+                -votes[start],
+                abs(start - self.start_line_pre_edit),
+                start,
+            ),
+        )
+
+    def align_lines(
+        self, lines_dict: Mapping, problems: list, index: Optional[LineIndex] = None
+    ) -> bool:
+        """
+        Aligns the lines of the hunk that exist in the original (RETAIN and REMOVE lines) as a whole with a window of the file and rewrites the hunk from the alignment, returning whether it was found. If it is not, it appends a problem message to the problems list.
+
+        The window spans the most likely start of the hunk (see `locate`) with a margin on both sides. The hunk and
+        the window are aligned with `align_sequences`, lines matching when they are equal up to whitespace and case
+        or `is_similar`. File lines between matched lines that the hunk skipped are inserted as retained lines, and
+        hunk lines without a match in the file are dropped, except comments, which become added lines. The hunk
+        fails when fewer than half of its non-blank lines are found, when a non-blank line to remove is not found,
+        or when it has lines in a different order than the file.
+        """
+        lines_dict = as_line_window(lines_dict)
+        if index is None:
+            index = LineIndex.for_lines(lines_dict)
+        expected = [
+            hunk_ind for hunk_ind, line in enumerate(self.lines) if line[0] != ADD
+        ]
+        start = self.locate(expected, lines_dict, index)
+        if start is None:
+            problems.append(
+                f"In {self.hunk_to_string()}:can not find the starting line of the diff"
+            )
+            return False
+        margin = self.forward_block_len + len(expected)
+        window = range(
+            max(start - margin, lines_dict.first),
+            min(start + len(expected) + margin, lines_dict.last_line + 1),
+        )
+        table = lines_dict.table
+        hunk_normalized = [normalize_line(self.lines[ind][1]) for ind in expected]
+        file_normalized = [
+            table.normalized[line_number - table.first_line] for line_number in window
+        ]
+
+        def equal(position: int, window_ind: int) -> bool:
+            hunk_line, file_line = (
+                hunk_normalized[position],
+                file_normalized[window_ind],
+            )
+            return (
+                hunk_line == file_line
+                or "".join(hunk_line.split()) == "".join(file_line.split())
+                or is_similar(
+                    self.lines[expected[position]][1], lines_dict[window[window_ind]]
+                )
+            )
+
+        matches = dict(
+            align_sequences(
+                [line or None for line in hunk_normalized],
+                [line or None for line in file_normalized],
+                equal,
+            )
+        )
+        n_lines = sum(1 for line in hunk_normalized if line)
+        n_found = sum(1 for position in matches if hunk_normalized[position])
+        if n_found == 0 or 2 * n_found < n_lines:
+            problems.append(
+                f"In Hunk:{self.hunk_to_string()}, only {n_found} of the {n_lines} lines to retain or remove were found in the code."
+            )
+            return False
+        # a line of the hunk that is not matched, but equals a line the hunk skips, was moved
+        skipped = set(range(min(matches.values()), max(matches.values()) + 1))
+        skipped.difference_update(matches.values())
+        for position, line in enumerate(hunk_normalized):
+            if position not in matches and line:
+                moved = [
+                    window_ind for window_ind in skipped if equal(position, window_ind)
+                ]
+                if moved:
+                    problems.append(
+                        f"In Hunk:{self.hunk_to_string()}, the line {lines_dict[window[moved[0]]]!r} is not in the same order as in the code."
+                    )
+                    return False
+                if self.lines[expected[position]][0] == REMOVE:
+                    problems.append(
+                        f"In Hunk:{self.hunk_to_string()}, the line to remove {self.lines[expected[position]][1]!r} was not found in the code."
+                    )
+                    return False
+
+        new_lines = []
+        next_window_ind = None
+        position = 0
+        for line_type, line in self.lines:
+            if line_type == ADD:
+                new_lines.append((line_type, line))
+                continue
+            window_ind = matches.get(position)
+            position += 1
+            if window_ind is None:
+                # the line is not in the code: keep comments from the LLM as added lines
+                if line_type == RETAIN and line.count("#") > 0:
+                    new_lines.append((ADD, line))
+                continue
+            if next_window_ind is None:
+                self.start_line_pre_edit = window[window_ind]
+            else:
+                # the lines the hunk skipped are retained
+                new_lines.extend(
+                    (RETAIN, lines_dict[line_number])
+                    for line_number in window[next_window_ind:window_ind]
+                )
+            new_lines.append((line_type, lines_dict[window[window_ind]]))
+            next_window_ind = window_ind + 1
+
+        self.lines = []
+        self.category_counts = {RETAIN: 0, ADD: 0, REMOVE: 0}
+        self.add_lines(new_lines)
+        return True
+
     def validate_and_correct(
         self,
-        lines_dict: dict,
+        lines_dict: Mapping,
         problems: list,
+        index: Optional[LineIndex] = None,
+        alignment: str = GREEDY,
     ) -> bool:
         """
         Validates and corrects the hunk based on the original lines.
 
         This function attempts to validate the hunk by comparing its lines to the original file and making corrections
-        where necessary. It also identifies problems such as non-matching lines or incorrect line types.
+        where necessary. It also identifies problems such as non-matching lines or incorrect line types. The `index`
+        of the file's lines is built from `lines_dict` if not given. With the `alignment` mode ``"align"``, the hunk
+        is aligned with the file as a whole by `align_lines` instead of being walked line by line.
         """
+        lines_dict = as_line_window(lines_dict)
+        if index is None:
+            index = LineIndex.for_lines(lines_dict)
+        if alignment == ALIGN:
+            return self.align_lines(lines_dict, problems, index)
         start_true = self.check_start_line(lines_dict)
 
         if not start_true:
-            if not self.find_start_line(lines_dict, problems):
+            if not self.find_start_line(lines_dict, problems, index):
                 return False
 
         # Now we should be able to validate the hunk line by line and add missing line
-        if not self.validate_lines(lines_dict, problems):
+        if not self.validate_lines(lines_dict, problems, index):
             return False
         # Pass the validation
         return True
@@ -317,12 +733,14 @@ class Diff:
         filename_pre (str): The name of the original file.
         filename_post (str): The name of the edited file.
         hunks (list): A list of Hunk objects representing the changes in the diff.
+        fallback_hunks (list): The hunks that failed validation and were placed by the fallback of the last validation.
     """
 
     def __init__(self, filename_pre, filename_post) -> None:
         self.filename_pre = filename_pre
         self.filename_post = filename_post
         self.hunks = []
+        self.fallback_hunks = []
 
     def is_new_file(self) -> bool:
         """Determines if the diff represents a new file."""
@@ -337,11 +755,23 @@ class Diff:
             string += hunk.hunk_to_string()
         return string.strip()
 
-    def validate_and_correct(self, lines_dict: dict) -> List[str]:
-        """Validates and corrects each hunk in the diff."""
+    def validate_and_correct(
+        self,
+        lines_dict: Mapping,
+        alignment: str = GREEDY,
+        fallback: Optional[Callable[[Hunk, LineWindow], Optional[Hunk]]] = None,
+    ) -> List[str]:
+        """Validates and corrects each hunk in the diff against the lines of the original file, given as a `LineWindow` or as a dictionary like those of `file_to_lines_dict`, walking each hunk line by line (``"greedy"``) or aligning it as a whole (``"align"``). A hunk that fails is passed, as it was before validation, to `fallback` if given, and replaced by the hunk it returns instead of being reported and removed."""
+        if alignment not in ALIGNMENT_MODES:
+            raise ValueError(
+                f"Unknown alignment mode {alignment!r}, expected one of"
+                f" {', '.join(ALIGNMENT_MODES)}"
+            )
         problems = []
         past_hunk = None
-        cut_lines_dict = lines_dict.copy()
+        cut_lines_dict = as_line_window(lines_dict)
+        index = LineIndex.for_lines(cut_lines_dict)
+        self.fallback_hunks = []
         for hunk in self.hunks:
             if past_hunk is not None:
                 # make sure to not cut so much that the start_line gets out of range
@@ -349,10 +779,19 @@ class Diff:
                     past_hunk.start_line_pre_edit + past_hunk.hunk_len_pre_edit,
                     hunk.start_line_pre_edit,
                 )
-                cut_lines_dict = {
-                    key: val for key, val in cut_lines_dict.items() if key >= (cut_ind)
-                }
-            is_valid = hunk.validate_and_correct(cut_lines_dict, problems)
+                cut_lines_dict = cut_lines_dict.window(cut_ind)
+            original = hunk.copy() if fallback is not None else None
+            n_problems = len(problems)
+            is_valid = hunk.validate_and_correct(
+                cut_lines_dict, problems, index, alignment
+            )
+            if not is_valid and fallback is not None:
+                placed = fallback(original, cut_lines_dict)
+                if placed is not None:
+                    self.hunks[self.hunks.index(hunk)] = hunk = placed
+                    self.fallback_hunks.append(placed)
+                    del problems[n_problems:]
+                    is_valid = True
             if not is_valid and len(problems) > 0:
                 for idx, val in enumerate(problems):
                     print(f"\nInvalid Hunk NO.{idx}---\n{val}\n---")
@@ -408,12 +847,17 @@ def count_ratio(str1, str2) -> float:
     Returns:
     - float: The ratio of common characters to the length of the longer string.
     """
-    str1, str2 = str1.replace(" ", "").lower(), str2.replace(" ", "").lower()
+    str1, str2 = normalize_line(str1), normalize_line(str2)
+    if str1 == str2:
+        return 1
 
     counter1, counter2 = Counter(str1), Counter(str2)
     intersection = sum((counter1 & counter2).values())
-    longer_length = max(len(str1), len(str2))
+    return _ratio(intersection, max(len(str1), len(str2)))
+
+
+def _ratio(intersection: int, longer_length: int) -> float:
+    # The ratio of `count_ratio`, where two empty strings are equal
     if longer_length == 0:
         return 1
-    else:
-        return intersection / longer_length
+    return intersection / longer_length
@@ -13,6 +13,8 @@ from collections import OrderedDict
 from pathlib import Path
 from typing import Union
 
+from gpt_engineer.core.line_table import line_table
+
 
 # class Code(MutableMapping[str | Path, str]):
 # ToDo: implement as mutable mapping, potentially holding a dict instead of being a dict.
@@ -64,9 +66,8 @@ class FilesDict(dict):
         """
         chat_str = ""
         for file_name, file_content in self.items():
-            lines_dict = file_to_lines_dict(file_content)
             chat_str += f"File: {file_name}\n"
-            for line_number, line_content in lines_dict.items():
+            for line_number, line_content in enumerate(line_table(file_content), 1):
                 chat_str += f"{line_number} {line_content}\n"
             chat_str += "\n"
         return f"```\n{chat_str}```"
@@ -0,0 +1,222 @@
+"""
+Fuzzy Patch Module
+
+This module is the local fallback for diff hunks that fail validation: before the model is asked to rewrite a
+failing hunk, the hunk is matched against the file the way `patch` and `git apply --recount` do, and applied
+locally if it is found.
+
+A hunk is matched on the lines it expects in the original file (its context and removed lines), ignoring
+differences in whitespace, at any position of the file, preferring the one closest to the start line in its
+header. With a fuzz of `n`, up to `n` context lines at each end of the hunk need not match, like the fuzz factor
+of `patch`; removed lines always have to match. The line counts of the header are recounted from the lines.
+
+`fuzzy_relocate` is passed to `Diff.validate_and_correct` as its fallback, and the outcome of every applied answer
+is counted in a process-wide `FuzzyPatchStats`, including the refinement round trips that were avoided.
+
+Classes:
+    FuzzyPatchStats: Counts of the hunks applied by the fuzzy fallback.
+
+Functions:
+    whitespace_key(line: str) -> str
+        Return a line with its whitespace collapsed, the form in which lines are compared.
+    fuzzy_relocate(hunk: Hunk, lines_dict: Mapping[int, str], fuzz: int) -> Optional[Hunk]
+        Return a copy of the hunk placed where it matches the file up to whitespace and fuzz, or None.
+    fuzzy_patch_stats() -> FuzzyPatchStats
+        Return the process-wide counts of the fuzzy fallback.
+"""
+
+import threading
+
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional
+from weakref import WeakKeyDictionary
+
+from gpt_engineer.core.diff import ADD, REMOVE, RETAIN, Hunk
+from gpt_engineer.core.line_table import LineTable, as_line_window
+
+# The number of context lines at each end of a hunk that need not match, as in `patch`
+DEFAULT_FUZZ = 2
+
+
+def whitespace_key(line: str) -> str:
+    """Return the line with runs of whitespace collapsed to a space and no leading or trailing whitespace."""
+    return " ".join(line.split())
+
+
+class _WhitespaceIndex:
+    # The whitespace keys of the lines of a table, and the line numbers of every key
+    def __init__(self, table: LineTable):
+        self.first_line = table.first_line
+        self.keys = [whitespace_key(line) for line in table]
+        self.line_numbers: Dict[str, List[int]] = defaultdict(list)
+        for line_number, key in enumerate(self.keys, table.first_line):
+            self.line_numbers[key].append(line_number)
+
+
+# The whitespace index of every line table in use, built when a hunk of that version of the file first fails
+_whitespace_indexes: "WeakKeyDictionary[LineTable, _WhitespaceIndex]" = (
+    WeakKeyDictionary()
+)
+
+
+def fuzzy_relocate(
+    hunk: Hunk, lines_dict: Mapping, fuzz: int = DEFAULT_FUZZ
+) -> Optional[Hunk]:
+    """
+    Return a copy of the hunk placed where it matches the lines of `lines_dict`, or None if it matches nowhere.
+
+    The lines the hunk expects in the original (RETAIN and REMOVE lines) are compared with the file ignoring
+    whitespace, first all of them, then leaving out one more context line at each end for every level of `fuzz`.
+    At each level, the match closest to the start line of the header wins. In the copy, the expected lines are
+    replaced by the lines of the file they were matched to, and the header is recounted.
+    """
+    window = as_line_window(lines_dict)
+    table = window.table
+    index = _whitespace_indexes.get(table)
+    if index is None:
+        index = _whitespace_indexes[table] = _WhitespaceIndex(table)
+    expected = [
+        whitespace_key(line) for line_type, line in hunk.lines if line_type != ADD
+    ]
+    if not expected:
+        return None
+    line_types = [line_type for line_type, _ in hunk.lines if line_type != ADD]
+    leading_context = next(
+        (ind for ind, line_type in enumerate(line_types) if line_type != RETAIN),
+        len(line_types),
+    )
+    trailing_context = next(
+        (
+            ind
+            for ind, line_type in enumerate(reversed(line_types))
+            if line_type != RETAIN
+        ),
+        len(line_types),
+    )
+    last_start = window.last_line - len(expected) + 1
+
+    for level in range(max(fuzz, 0) + 1):
+        lead = min(level, leading_context)
+        trail = min(level, trailing_context)
+        if level > 0 and (lead, trail) == (
+            min(level - 1, leading_context),
+            min(level - 1, trailing_context),
+        ):
+            # no more context to leave out
+            break
+        compared = range(lead, len(expected) - trail)
+        if not compared:
+            break
+        starts = [
+            line_number - lead
+            for line_number in index.line_numbers.get(expected[lead], [])
+            if window.first <= line_number - lead <= last_start
+        ]
+        matches = [
+            start
+            for start in starts
+            if all(
+                index.keys[start + ind - index.first_line] == expected[ind]
+                for ind in compared
+            )
+            and not _moves_lines(index, expected, compared, start)
+        ]
+        if matches:
+            start = min(
+                matches,
+                key=lambda start: (abs(start - hunk.start_line_pre_edit), start),
+            )
+            return _placed(hunk, start, window)
+    return None
+
+
+def _moves_lines(
+    index: _WhitespaceIndex, expected: List[str], compared: range, start: int
+) -> bool:
+    # Whether a context line left out by the fuzz, which does not match at its own position, is found elsewhere
+    # in the matched lines; the hunk then moves lines, which a fuzzy match must not paper over
+    stop = start + len(expected)
+    for ind, key in enumerate(expected):
+        if ind in compared or not key:
+            continue
+        if index.keys[start + ind - index.first_line] == key:
+            continue
+        if any(
+            start <= line_number < stop
+            for line_number in index.line_numbers.get(key, [])
+        ):
+            return True
+    return False
+
+
+def _placed(hunk: Hunk, start: int, window: Mapping) -> Hunk:
+    # A copy of the hunk starting at `start`, with the expected lines taken from the file
+    lines = []
+    line_number = start
+    for line_type, line in hunk.lines:
+        if line_type == ADD:
+            lines.append((line_type, line))
+            continue
+        lines.append((line_type, window[line_number]))
+        line_number += 1
+    placed = Hunk(start, 0, start, 0, lines)
+    placed.hunk_len_pre_edit = (
+        placed.category_counts[RETAIN] + placed.category_counts[REMOVE]
+    )
+    placed.hunk_len_post_edit = (
+        placed.category_counts[RETAIN] + placed.category_counts[ADD]
+    )
+    return placed
+
+
+@dataclass
+class FuzzyPatchStats:
+    """
+    Counts of the hunks applied by the fuzzy fallback, over the answers applied in this process.
+
+    Attributes
+    ----------
+    answers : int
+        The number of answers whose diffs were applied.
+    hunks_failed : int
+        The number of hunks that failed validation.
+    hunks_fuzzed : int
+        The number of failing hunks that the fuzzy fallback applied.
+    retries_avoided : int
+        The number of answers with failing hunks that were applied without problems thanks to the fallback,
+        each of which would otherwise have been sent back to the model for refinement.
+    """
+
+    answers: int = 0
+    hunks_failed: int = 0
+    hunks_fuzzed: int = 0
+    retries_avoided: int = 0
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def record(self, hunks_fuzzed: int, problems: int) -> None:
+        """Record an applied answer, with the number of hunks the fallback applied and of remaining problems."""
+        with self._lock:
+            self.answers += 1
+            self.hunks_failed += hunks_fuzzed + problems
+            self.hunks_fuzzed += hunks_fuzzed
+            if hunks_fuzzed and not problems:
+                self.retries_avoided += 1
+
+    def report(self) -> str:
+        """Return a one-line summary of the counts."""
+        return (
+            f"Fuzzy patching applied {self.hunks_fuzzed} of {self.hunks_failed} failing hunks"
+            f" and avoided {self.retries_avoided} refinement round trips"
+            f" over {self.answers} answers."
+        )
+
+
+_stats = FuzzyPatchStats()
+
+
+def fuzzy_patch_stats() -> FuzzyPatchStats:
+    """Return the process-wide counts of the fuzzy fallback."""
+    return _stats
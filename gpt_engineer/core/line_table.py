@@ -0,0 +1,190 @@
+"""
+Line Table Module
+
+This module provides a compact, immutable table of the lines of one version of a file, which is computed once
+and shared by everything that looks at the file line by line: `FilesDict.to_chat`, the validation of diff hunks
+and `apply_diffs`.
+
+The table keeps the file content and the offsets at which its lines start, instead of a dictionary of line
+strings, and computes the normalized form of every line (see `normalize_line`) and its hash on first use. Parts
+of a file, such as the window a hunk is validated against, are expressed as `LineWindow` views over line number
+ranges of the table instead of copies.
+
+Classes:
+    LineTable: The lines of one version of a file.
+    LineWindow: A read-only mapping from line numbers to lines over a range of a `LineTable`.
+
+Functions:
+    normalize_line(line: str) -> str
+        Return a line without spaces and in lower case, the form in which lines are compared.
+    line_table(content: str) -> LineTable
+        Return the shared line table of a file content.
+    as_line_window(lines_dict: Mapping[int, str]) -> LineWindow
+        Return a mapping from line numbers to lines as a `LineWindow`.
+"""
+
+from array import array
+from collections.abc import Mapping, Sequence
+from functools import lru_cache
+from itertools import accumulate
+from typing import Iterator, List, Optional, Union
+
+# The number of file versions whose line tables are kept for reuse
+LINE_TABLE_CACHE_SIZE = 128
+
+
+def normalize_line(line: str) -> str:
+    """Return the line without spaces and in lower case, the form in which lines are compared."""
+    return line.replace(" ", "").lower()
+
+
+class LineTable(Sequence):
+    """
+    The lines of one version of a file.
+
+    The table is a sequence of the lines of `content` split at newlines, as `file_to_lines_dict` splits them. Lines
+    are sliced out of the content on access; their normalized form and hash are computed for all lines on first
+    use and kept.
+
+    Attributes
+    ----------
+    content : str
+        The content of the file.
+    first_line : int
+        The line number of the first line, 1 for a whole file.
+    """
+
+    def __init__(self, content: str, first_line: int = 1):
+        self.content = content
+        self.first_line = first_line
+        # The offset of every line in the content, and one past the end
+        self._offsets = array("q", [0])
+        self._offsets.extend(accumulate(len(line) + 1 for line in content.split("\n")))
+        self._normalized: Optional[List[str]] = None
+        self._hashes: Optional[array] = None
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("line table index out of range")
+        return self.content[self._offsets[index] : self._offsets[index + 1] - 1]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.content.split("\n"))
+
+    @property
+    def last_line(self) -> int:
+        """The line number of the last line."""
+        return self.first_line + len(self) - 1
+
+    def line(self, line_number: int) -> str:
+        """Return the line with the given line number."""
+        return self[line_number - self.first_line]
+
+    def span(self, start: int, stop: int) -> str:
+        """Return the lines numbered `start` to `stop` (exclusive) as one string, joined by newlines."""
+        start = max(start - self.first_line, 0)
+        stop = min(stop - self.first_line, len(self))
+        if stop <= start:
+            return ""
+        return self.content[self._offsets[start] : self._offsets[stop] - 1]
+
+    @property
+    def normalized(self) -> List[str]:
+        """The normalized form of every line, in order."""
+        if self._normalized is None:
+            self._normalized = [normalize_line(line) for line in self]
+        return self._normalized
+
+    @property
+    def hashes(self) -> array:
+        """The hash of the normalized form of every line, in order."""
+        if self._hashes is None:
+            self._hashes = array("q", map(hash, self.normalized))
+        return self._hashes
+
+    def window(self, first: Optional[int] = None) -> "LineWindow":
+        """Return a mapping view of the lines from line number `first` (by default the first line) to the end."""
+        return LineWindow(self, self.first_line if first is None else first)
+
+
+class LineWindow(Mapping):
+    """
+    A read-only mapping from line numbers to lines, over the lines of a `LineTable` from line `first` to the end.
+
+    A window behaves like the dictionaries of `file_to_lines_dict` restricted to the line numbers from `first`,
+    without copying any lines.
+
+    Attributes
+    ----------
+    table : LineTable
+        The table the window is a view of.
+    first : int
+        The first line number of the window.
+    """
+
+    def __init__(self, table: LineTable, first: int):
+        self.table = table
+        self.first = max(first, table.first_line)
+
+    def __getitem__(self, line_number: int) -> str:
+        if line_number not in self:
+            raise KeyError(line_number)
+        return self.table.line(line_number)
+
+    def __contains__(self, line_number: object) -> bool:
+        return (
+            isinstance(line_number, int)
+            and self.first <= line_number <= self.table.last_line
+        )
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.first, self.table.last_line + 1))
+
+    def __len__(self) -> int:
+        return max(self.table.last_line - self.first + 1, 0)
+
+    @property
+    def last_line(self) -> int:
+        """The line number of the last line."""
+        return self.table.last_line
+
+    def window(self, first: int) -> "LineWindow":
+        """Return the part of this window from line number `first`."""
+        return LineWindow(self.table, max(first, self.first))
+
+
+@lru_cache(maxsize=LINE_TABLE_CACHE_SIZE)
+def line_table(content: str) -> LineTable:
+    """
+    Return the shared line table of a file content.
+
+    The tables of recently used contents are kept, so every step that looks at the same version of a file uses the
+    same table, including its normalized lines and hashes.
+    """
+    return LineTable(content)
+
+
+def as_line_window(lines_dict: Mapping) -> LineWindow:
+    """
+    Return a mapping from line numbers to lines as a `LineWindow`.
+
+    Windows are returned as they are. Other mappings, such as those of `file_to_lines_dict`, must have consecutive
+    line numbers; they are converted into a window over a new table.
+    """
+    if isinstance(lines_dict, LineWindow):
+        return lines_dict
+    line_numbers = list(lines_dict)
+    table = LineTable(
+        "\n".join(lines_dict.values()), line_numbers[0] if line_numbers else 1
+    )
+    if not line_numbers:
+        # An empty mapping: a window past the single empty line of an empty table
+        return LineWindow(table, table.last_line + 1)
+    return table.window()
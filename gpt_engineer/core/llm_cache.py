@@ -0,0 +1,286 @@
+"""
+LLM Response Cache Module
+
+This module provides a content-addressed cache of LLM responses that is shared by every
+consumer of `gpt_engineer.core.ai.AI` (the CLI, the benchmark runner and the web-ui), so
+identical requests are answered without calling the model again.
+
+Responses are keyed on the normalized (collapsed) messages together with the model name,
+temperature and max_tokens, and stored in a SQLite database in WAL mode, which allows
+concurrent readers and writers from several processes. Entries expire after a TTL and the
+least recently used entries are evicted once the stored content exceeds a size budget.
+
+Classes:
+    LLMCache: A SQLite-backed response cache with TTL and size-based LRU eviction.
+
+Functions:
+    default_cache_path() -> Path
+        The location of the shared cache database.
+    set_llm_response_cache(cache: Optional[LLMCache]) -> None
+        Install a process-wide cache used by AI instances that were not given one.
+    get_llm_response_cache() -> Optional[LLMCache]
+        Return the process-wide cache, if one is installed.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from pathlib import Path
+from typing import Any, List, Optional, Union
+
+# Defaults for the shared cache; both can be overridden per instance
+DEFAULT_MAX_SIZE_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+
+
+def default_cache_path() -> Path:
+    """
+    The location of the shared cache database.
+
+    ``GPTE_LLM_CACHE_PATH`` overrides the default of ``~/.cache/gpt-engineer/llm_cache.sqlite3``
+    (or the equivalent under ``XDG_CACHE_HOME``).
+
+    Returns
+    -------
+    Path
+        The path of the cache database.
+    """
+    if os.getenv("GPTE_LLM_CACHE_PATH"):
+        return Path(os.environ["GPTE_LLM_CACHE_PATH"])
+    cache_home = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "gpt-engineer" / "llm_cache.sqlite3"
+
+
+class LLMCache:
+    """
+    A SQLite-backed LLM response cache with TTL and size-based LRU eviction.
+
+    Every thread uses its own connection to the database. The database is opened in WAL
+    mode with a busy timeout, so several processes (e.g. parallel benchmark runs and the
+    web-ui) can share one cache file safely.
+
+    Attributes
+    ----------
+    path : Path
+        The path of the cache database.
+    max_size_bytes : int
+        The maximum total size of the cached responses before LRU eviction kicks in.
+    ttl_seconds : Optional[float]
+        The time after which an entry expires, or None to keep entries until evicted.
+    hits : int
+        The number of lookups answered from the cache by this instance.
+    misses : int
+        The number of lookups that were not found in the cache by this instance.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path, None] = None,
+        max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES,
+        ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+    ):
+        self.path = Path(path) if path is not None else default_cache_path()
+        self.max_size_bytes = max_size_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " content TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at"
+                " ON responses (accessed_at)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(
+        messages: List[Any],
+        model_name: str,
+        temperature: float,
+        max_tokens: Optional[int] = None,
+        sample: int = 0,
+    ) -> str:
+        """
+        Compute the content address of a request.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            The normalized (collapsed) messages sent to the model.
+        model_name : str
+            The name of the model.
+        temperature : float
+            The sampling temperature.
+        max_tokens : Optional[int]
+            The completion token limit, if any.
+        sample : int, optional
+            Which of several identical requests sent together this is, so that each of
+            them gets its own answer, by default 0.
+
+        Returns
+        -------
+        str
+            The SHA-256 hex digest identifying the request.
+        """
+        payload = {
+            "model": model_name,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "messages": [
+                {"type": message.type, "content": message.content}
+                for message in messages
+            ],
+        }
+        if sample:
+            payload["sample"] = sample
+        encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response and mark it as recently used.
+
+        Parameters
+        ----------
+        key : str
+            The key computed by `make_key`.
+
+        Returns
+        -------
+        Optional[str]
+            The cached response content, or None on a miss.
+        """
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT content, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or self._is_expired(row[1], now):
+            with self._counter_lock:
+                self.misses += 1
+            return None
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        with self._counter_lock:
+            self.hits += 1
+        return row[0]
+
+    def put(self, key: str, content: str) -> None:
+        """
+        Store a response and evict expired and least recently used entries if needed.
+
+        Parameters
+        ----------
+        key : str
+            The key computed by `make_key`.
+        content : str
+            The response content to store.
+        """
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (key, content, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, content, size, now, now),
+            )
+            self._evict(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        if self.ttl_seconds is not None:
+            conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[
+            0
+        ]
+        if total <= self.max_size_bytes:
+            return
+        excess = total - self.max_size_bytes
+        freed = 0
+        stale_keys = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+        ):
+            if freed >= excess:
+                break
+            stale_keys.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+
+    def stats(self) -> dict:
+        """
+        Return the hit/miss counters of this instance and the size of the shared store.
+
+        Returns
+        -------
+        dict
+            A dictionary with ``hits``, ``misses``, ``entries`` and ``size_bytes``.
+        """
+        entries, size = (
+            self._connection()
+            .execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses")
+            .fetchone()
+        )
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        self._connection().execute("DELETE FROM responses")
+
+
+_llm_response_cache: Optional[LLMCache] = None
+
+
+def set_llm_response_cache(cache: Optional[LLMCache]) -> None:
+    """
+    Install a process-wide cache used by AI instances that were not given one.
+
+    Parameters
+    ----------
+    cache : Optional[LLMCache]
+        The cache to install, or None to disable caching.
+    """
+    global _llm_response_cache
+    _llm_response_cache = cache
+
+
+def get_llm_response_cache() -> Optional[LLMCache]:
+    """Return the process-wide cache, if one is installed."""
+    return _llm_response_cache
@@ -0,0 +1,121 @@
+"""
+Lightweight in-process metrics for LLM inference.
+
+This module provides a thread-safe latency histogram and a process-wide registry of
+named histograms, so that components such as the provider router can record how long
+each backend takes to answer without pulling in an external metrics library.
+
+Classes:
+    LatencyHistogram: A bucketed latency histogram with percentile estimates.
+
+Functions:
+    latency_histogram(name: str) -> LatencyHistogram
+        Return the process-wide histogram registered under `name`, creating it if needed.
+    latency_snapshot() -> Dict[str, dict]
+        Return a snapshot of every registered histogram.
+"""
+
+import bisect
+import math
+import threading
+
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence
+
+# Upper bounds (in seconds) of the histogram buckets; the last bucket is unbounded.
+DEFAULT_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class LatencyHistogram:
+    """
+    A thread-safe histogram of latencies in seconds.
+
+    Observations are counted into fixed buckets, which is cheap and stable for export, and
+    the most recent observations are kept in a bounded window for percentile estimates.
+
+    Attributes
+    ----------
+    buckets : Sequence[float]
+        The upper bounds of the histogram buckets in seconds.
+    count : int
+        The number of observations.
+    total : float
+        The sum of all observed latencies in seconds.
+    """
+
+    def __init__(
+        self,
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+        window: int = 1024,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        self._bucket_counts = [0] * (len(self.buckets) + 1)
+        self._recent: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Record one latency observation."""
+        with self._lock:
+            self._bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self._recent.append(seconds)
+            self.count += 1
+            self.total += seconds
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Estimate the `q`-th percentile (0-100) over the recent observations.
+
+        Returns
+        -------
+        Optional[float]
+            The percentile in seconds, or None if nothing has been observed yet.
+        """
+        with self._lock:
+            samples = sorted(self._recent)
+        if not samples:
+            return None
+        rank = max(0, math.ceil(q / 100 * len(samples)) - 1)
+        return samples[min(rank, len(samples) - 1)]
+
+    def mean(self) -> Optional[float]:
+        """Return the mean latency in seconds, or None if nothing has been observed yet."""
+        with self._lock:
+            return self.total / self.count if self.count else None
+
+    def bucket_counts(self) -> Dict[str, int]:
+        """Return the number of observations per bucket, keyed by the bucket's upper bound."""
+        with self._lock:
+            counts = list(self._bucket_counts)
+        labels: List[str] = [f"le_{bound:g}" for bound in self.buckets] + ["le_inf"]
+        return dict(zip(labels, counts))
+
+    def snapshot(self) -> dict:
+        """Return the count, mean, p50, p95 and bucket counts as a plain dictionary."""
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "buckets": self.bucket_counts(),
+        }
+
+
+_histograms: Dict[str, LatencyHistogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def latency_histogram(name: str) -> LatencyHistogram:
+    """Return the process-wide histogram registered under `name`, creating it if needed."""
+    with _histograms_lock:
+        if name not in _histograms:
+            _histograms[name] = LatencyHistogram()
+        return _histograms[name]
+
+
+def latency_snapshot() -> Dict[str, dict]:
+    """Return a snapshot of every registered histogram, keyed by name."""
+    with _histograms_lock:
+        items = list(_histograms.items())
+    return {name: histogram.snapshot() for name, histogram in items}
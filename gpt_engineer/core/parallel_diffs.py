@@ -0,0 +1,118 @@
+"""
+Parallel Diffs Module
+
+This module validates and corrects the diffs of an answer file by file, in a pool of worker processes when the
+answer touches enough lines of enough files to pay for starting the pool, and in the calling process otherwise.
+
+Diffs of different files are independent: each is validated against its own file, and validation is the costly
+part of handling an answer (locating hunks, comparing and aligning lines, placing failing hunks). The corrected
+diffs, their problems and whatever their validation prints are merged in the order of the diffs, so the outcome
+does not depend on which worker finishes first and is the same as without a pool.
+
+Functions:
+    use_process_pool(line_counts: Sequence[int], workers: int, min_lines: int) -> bool
+        Return whether files with the given numbers of lines are worth validating in a pool of `workers` processes.
+    validate_diffs(diffs: Dict[str, Diff], files_dict: FilesDict, alignment: str, patch_fuzz: int, workers: Optional[int]) -> Tuple[Dict[str, Diff], List[str]]
+        Validate and correct the diffs against the files, returning the corrected diffs and the problems found.
+"""
+
+import contextlib
+import functools
+import io
+import logging
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from gpt_engineer.core.diff import GREEDY, Diff
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.fuzzy_patch import DEFAULT_FUZZ, fuzzy_relocate
+from gpt_engineer.core.line_table import line_table
+
+logger = logging.getLogger(__name__)
+
+# The number of lines to validate outside the largest file below which starting a pool costs more than it saves:
+# a pool costs some 20 ms to start and shipping a file to a worker a fifth of the time it takes to validate it
+PARALLEL_MIN_LINES = 30_000
+
+# A file to validate: the key of its diff, the diff, the content of the file, the alignment mode and the fuzz
+_Job = Tuple[str, Diff, str, str, int]
+# A validated file: the key of its diff, the corrected diff, its problems and what its validation printed
+_Result = Tuple[str, Diff, List[str], str]
+
+
+def use_process_pool(
+    line_counts: Sequence[int], workers: int, min_lines: int = PARALLEL_MIN_LINES
+) -> bool:
+    """
+    Return whether files with the given numbers of lines are worth validating in a pool of `workers` processes.
+
+    The largest file takes as long in a pool as without one, so only the lines of the other files count towards
+    `min_lines`.
+    """
+    if workers < 2 or len(line_counts) < 2:
+        return False
+    return sum(line_counts) - max(line_counts) >= min_lines
+
+
+def validate_diffs(
+    diffs: Dict[str, Diff],
+    files_dict: FilesDict,
+    alignment: str = GREEDY,
+    patch_fuzz: int = DEFAULT_FUZZ,
+    workers: Optional[int] = None,
+) -> Tuple[Dict[str, Diff], List[str]]:
+    """
+    Validate and correct the diffs against the files, returning the corrected diffs and the problems found.
+
+    Diffs that create files are not validated. The others are validated with `Diff.validate_and_correct` in the
+    given `alignment` mode, with failing hunks passed to `fuzzy_relocate` unless `patch_fuzz` is negative. When
+    `use_process_pool` says the files are worth it, the files are validated in a pool of up to `workers`
+    processes (by default one per CPU), falling back to the calling process if the pool cannot be used.
+
+    Returns
+    -------
+    Tuple[Dict[str, Diff], List[str]]
+        The diffs, with the validated ones replaced by their corrected versions, and the problems of all files in
+        the order of the diffs.
+    """
+    jobs: List[_Job] = [
+        (key, diff, files_dict[diff.filename_pre], alignment, patch_fuzz)
+        for key, diff in diffs.items()
+        if not diff.is_new_file()
+    ]
+    max_workers = min(workers or os.cpu_count() or 1, len(jobs))
+    results: Optional[List[_Result]] = None
+    line_counts = [len(line_table(content)) for _, _, content, _, _ in jobs]
+    if use_process_pool(line_counts, max_workers, PARALLEL_MIN_LINES):
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                results = list(pool.map(_validate_file, jobs))
+        except (BrokenProcessPool, OSError) as e:
+            logger.warning("Validating diffs in one process, the pool failed: %s", e)
+    if results is None:
+        results = [_validate_file(job) for job in jobs]
+
+    validated = dict(diffs)
+    problems: List[str] = []
+    for key, diff, file_problems, output in results:
+        print(output, end="")
+        validated[key] = diff
+        problems.extend(file_problems)
+    return validated, problems
+
+
+def _validate_file(job: _Job) -> _Result:
+    # Validate the diff of one file, capturing what the validation prints
+    key, diff, content, alignment, patch_fuzz = job
+    fallback = (
+        functools.partial(fuzzy_relocate, fuzz=patch_fuzz) if patch_fuzz >= 0 else None
+    )
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        problems = diff.validate_and_correct(
+            line_table(content).window(), alignment, fallback
+        )
+    return key, diff, problems, output.getvalue()
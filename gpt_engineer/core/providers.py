@@ -0,0 +1,736 @@
+"""
+Provider Router Module
+
+This module routes chat completions to the backend that serves a given model. Each backend
+owns its client, its retry policy and the way it reports token usage. Every call is
+throttled by a per-provider rate limiter (see `gpt_engineer.core.rate_limiter`) and timed
+into a per-provider latency histogram (see `gpt_engineer.core.metrics`).
+
+Classes:
+    Provider: Abstract base class for an inference backend.
+    LangChainProvider: Base class for backends served through a LangChain chat model.
+    OpenAIProvider: OpenAI chat models.
+    AzureProvider: Azure-hosted OpenAI deployments.
+    AnthropicProvider: Anthropic Claude models.
+    LocalProvider: Local or self-hosted OpenAI-compatible servers (``LOCAL_MODEL``).
+    OpenRouterProvider: DeepSeek/Qwen models served through OpenRouter with model fallbacks.
+
+Functions:
+    register_provider(name: str, provider_cls: Type[Provider]) -> None
+        Register a provider class under a name so it can be selected by the router.
+    select_provider(model_name: str, azure_endpoint: Optional[str], use_openrouter: bool) -> str
+        Pick the name of the provider that serves a model.
+    create_provider(name: str, **kwargs) -> Provider
+        Instantiate a registered provider.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
+
+import anthropic
+import backoff
+import openai
+
+from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
+from langchain.chat_models.base import BaseChatModel
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import AIMessageChunk
+from langchain_openai import AzureChatOpenAI, ChatOpenAI
+
+from gpt_engineer.core.metrics import latency_histogram
+from gpt_engineer.core.rate_limiter import (
+    RateLimiter,
+    estimate_request_tokens,
+    rate_limiter,
+)
+from gpt_engineer.tools.openrouter_wrapper import (
+    OPENROUTER_ROLES,
+    acall_openrouter_coding,
+    acall_openrouter_reasoning,
+    astream_openrouter,
+    call_openrouter_coding,
+    call_openrouter_reasoning,
+    stream_openrouter,
+)
+
+Message = Union[AIMessage, HumanMessage, SystemMessage]
+
+# Substrings of model names that are only served through OpenRouter
+OPENROUTER_MODEL_MARKERS = ("deepseek", "qwen")
+
+logger = logging.getLogger(__name__)
+
+
+class Provider(ABC):
+    """
+    Abstract base class for an inference backend.
+
+    Subclasses create the client used to talk to the backend, implement a single inference
+    call and declare which exceptions are retried. `invoke` and `ainvoke` wrap the call
+    with the retry policy and record its latency under the provider's name; `stream` and
+    `astream` do the same while passing the answer's text chunks to a callback as they
+    arrive. The number of attempts a call took is kept in the response's metadata (see
+    `route`).
+
+    Attributes
+    ----------
+    name : str
+        The name the provider is registered under; also the latency histogram's name.
+    retry_exceptions : Tuple[Type[Exception], ...]
+        Exceptions that trigger an exponential backoff retry.
+    max_tries : int
+        The maximum number of attempts per call.
+    max_time : float
+        The maximum number of seconds spent retrying a call.
+    max_tokens : Optional[int]
+        The completion token limit requested from the backend, if any.
+    api_key_env : Optional[str]
+        The environment variable holding the API key; rate limits are tracked per key.
+    rate_limited : bool
+        Whether calls are throttled by the provider's `RateLimiter`. Backends that limit
+        each HTTP request themselves (such as OpenRouter) disable it.
+    """
+
+    name: str = "base"
+    retry_exceptions: Tuple[Type[Exception], ...] = ()
+    max_tries: int = 1
+    max_time: float = 0
+    max_tokens: Optional[int] = None
+    api_key_env: Optional[str] = None
+    rate_limited: bool = True
+
+    def __init__(
+        self,
+        model_name: str,
+        temperature: float = 0.1,
+        streaming: bool = True,
+        vision: bool = False,
+        azure_endpoint: Optional[str] = None,
+        task_type: str = "coding",
+    ):
+        self.model_name = model_name
+        self.temperature = temperature
+        self.streaming = streaming
+        self.vision = vision
+        self.azure_endpoint = azure_endpoint
+        self.task_type = task_type
+
+    @property
+    def latency(self):
+        """The process-wide latency histogram of this provider."""
+        return latency_histogram(self.name)
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """The process-wide rate limiter of this provider and API key."""
+        return rate_limiter(
+            self.name, os.getenv(self.api_key_env) if self.api_key_env else None
+        )
+
+    @abstractmethod
+    def create_chat_model(self) -> Optional[BaseChatModel]:
+        """Create the LangChain chat model used by this provider, if it uses one."""
+
+    @abstractmethod
+    def _invoke(
+        self, llm: Optional[BaseChatModel], messages: List[Message]
+    ) -> AIMessage:
+        """Perform a single inference call without retries."""
+
+    @abstractmethod
+    async def _ainvoke(
+        self, llm: Optional[BaseChatModel], messages: List[Message]
+    ) -> AIMessage:
+        """Perform a single asynchronous inference call without retries."""
+
+    def _retrying(self, fn):
+        if not self.retry_exceptions or self.max_tries <= 1:
+            return fn
+        return backoff.on_exception(
+            backoff.expo,
+            self.retry_exceptions,
+            max_tries=self.max_tries,
+            max_time=self.max_time,
+        )(fn)
+
+    def _tokens_used(self, response: AIMessage) -> Optional[int]:
+        usage = self.usage(response)
+        return usage["prompt_tokens"] + usage["completion_tokens"] if usage else None
+
+    @staticmethod
+    def _counted(fn):
+        # Count the attempts of one call; backends that report their own attempt keep it
+        attempts = 0
+
+        def call(*args):
+            nonlocal attempts
+            attempts += 1
+            response = fn(*args)
+            response.response_metadata.setdefault("attempt", attempts)
+            return response
+
+        return call
+
+    @staticmethod
+    def _acounted(fn):
+        attempts = 0
+
+        async def call(*args):
+            nonlocal attempts
+            attempts += 1
+            response = await fn(*args)
+            response.response_metadata.setdefault("attempt", attempts)
+            return response
+
+        return call
+
+    def _limited(self, fn):
+        # Every attempt (including retries) waits for a permit of the rate limiter
+        if not self.rate_limited:
+            return fn
+
+        def call(llm, messages, *args):
+            limiter = self.rate_limiter
+            with limiter.request(
+                estimate_request_tokens(messages, self.max_tokens)
+            ) as permit:
+                response = fn(llm, messages, *args)
+                permit.tokens_used = self._tokens_used(response)
+                return response
+
+        return call
+
+    def _alimited(self, fn):
+        if not self.rate_limited:
+            return fn
+
+        async def call(llm, messages, *args):
+            limiter = self.rate_limiter
+            async with limiter.arequest(
+                estimate_request_tokens(messages, self.max_tokens)
+            ) as permit:
+                response = await fn(llm, messages, *args)
+                permit.tokens_used = self._tokens_used(response)
+                return response
+
+        return call
+
+    def invoke(
+        self, llm: Optional[BaseChatModel], messages: List[Message]
+    ) -> AIMessage:
+        """
+        Perform one inference, applying the provider's retry policy and recording its latency.
+
+        Parameters
+        ----------
+        llm : Optional[BaseChatModel]
+            The chat model created by `create_chat_model`.
+        messages : List[Message]
+            The messages to send.
+
+        Returns
+        -------
+        AIMessage
+            The response of the model.
+        """
+        start = time.perf_counter()
+        try:
+            return self._retrying(self._limited(self._counted(self._invoke)))(
+                llm, messages
+            )
+        finally:
+            self.latency.observe(time.perf_counter() - start)
+
+    async def ainvoke(
+        self, llm: Optional[BaseChatModel], messages: List[Message]
+    ) -> AIMessage:
+        """Asynchronous variant of `invoke`."""
+        start = time.perf_counter()
+        try:
+            return await self._retrying(self._alimited(self._acounted(self._ainvoke)))(
+                llm, messages
+            )
+        finally:
+            self.latency.observe(time.perf_counter() - start)
+
+    def _stream(
+        self,
+        llm: Optional[BaseChatModel],
+        messages: List[Message],
+        on_chunk: Callable[[str], None],
+    ) -> AIMessage:
+        """Perform a single streaming inference call without retries; by default the whole answer is one chunk."""
+        response = self._invoke(llm, messages)
+        on_chunk(response.content)
+        return response
+
+    async def _astream(
+        self,
+        llm: Optional[BaseChatModel],
+        messages: List[Message],
+        on_chunk: Callable[[str], None],
+    ) -> AIMessage:
+        """Asynchronous variant of `_stream`."""
+        response = await self._ainvoke(llm, messages)
+        on_chunk(response.content)
+        return response
+
+    def stream(
+        self,
+        llm: Optional[BaseChatModel],
+        messages: List[Message],
+        on_chunk: Callable[[str], None],
+    ) -> AIMessage:
+        """
+        Perform one inference, passing each text chunk to `on_chunk` as it arrives.
+
+        The retry policy and latency recording are the same as for `invoke`.
+
+        Parameters
+        ----------
+        llm : Optional[BaseChatModel]
+            The chat model created by `create_chat_model`.
+        messages : List[Message]
+            The messages to send.
+        on_chunk : Callable[[str], None]
+            Called with every text chunk of the answer.
+
+        Returns
+        -------
+        AIMessage
+            The complete response of the model.
+        """
+        start = time.perf_counter()
+        try:
+            return self._retrying(self._limited(self._counted(self._stream)))(
+                llm, messages, on_chunk
+            )
+        finally:
+            self.latency.observe(time.perf_counter() - start)
+
+    async def astream(
+        self,
+        llm: Optional[BaseChatModel],
+        messages: List[Message],
+        on_chunk: Callable[[str], None],
+    ) -> AIMessage:
+        """Asynchronous variant of `stream`."""
+        start = time.perf_counter()
+        try:
+            return await self._retrying(self._alimited(self._acounted(self._astream)))(
+                llm, messages, on_chunk
+            )
+        finally:
+            self.latency.observe(time.perf_counter() - start)
+
+    def usage(self, response: AIMessage) -> Optional[Dict[str, int]]:
+        """
+        Return the token usage reported by the backend for a response, if any.
+
+        Returns
+        -------
+        Optional[Dict[str, int]]
+            A dictionary with ``prompt_tokens`` and ``completion_tokens``, or None when the
+            backend did not report usage.
+        """
+        usage_metadata = getattr(response, "usage_metadata", None)
+        if usage_metadata:
+            return {
+                "prompt_tokens": usage_metadata["input_tokens"],
+                "completion_tokens": usage_metadata["output_tokens"],
+            }
+        metadata = getattr(response, "response_metadata", None) or {}
+        token_usage = metadata.get("token_usage") or metadata.get("usage")
+        if token_usage and "prompt_tokens" in token_usage:
+            return {
+                "prompt_tokens": token_usage["prompt_tokens"],
+                "completion_tokens": token_usage.get("completion_tokens", 0),
+            }
+        if token_usage and "input_tokens" in token_usage:
+            return {
+                "prompt_tokens": token_usage["input_tokens"],
+                "completion_tokens": token_usage.get("output_tokens", 0),
+            }
+        return None
+
+    def route(self, response: AIMessage) -> Dict[str, Any]:
+        """
+        Return where a response was actually served from.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The ``provider`` name, the ``model`` that answered (which differs from the
+            requested model when a fallback was used), whether a ``fallback_used`` and the
+            number of ``retries`` before the answer.
+        """
+        metadata = getattr(response, "response_metadata", None) or {}
+        return {
+            "provider": self.name,
+            "model": metadata.get("model_name") or self.model_name,
+            "fallback_used": bool(metadata.get("fallback_used", False)),
+            "retries": max(int(metadata.get("attempt", 1)) - 1, 0),
+        }
+
+
+class LangChainProvider(Provider):
+    """Base class for backends that are called through a LangChain chat model."""
+
+    def _invoke(
+        self, llm: Optional[BaseChatModel], messages: List[Message]
+    ) -> AIMessage:
+        return llm.invoke(messages)  # type: ignore
+
+    async def _ainvoke(
+        self, llm: Optional[BaseChatModel], messages: List[Message]
+    ) -> AIMessage:
+        return await llm.ainvoke(messages)  # type: ignore
+
+    @staticmethod
+    def _merge_chunks(merged: Optional[AIMessageChunk]) -> AIMessage:
+        if merged is None:
+            return AIMessage(content="")
+        return AIMessage(
+            content=merged.content,
+            response_metadata=merged.response_metadata,
+            usage_metadata=merged.usage_metadata,
+        )
+
+    def _stream(
+        self,
+        llm: Optional[BaseChatModel],
+        messages: List[Message],
+        on_chunk: Callable[[str], None],
+    ) -> AIMessage:
+        merged = None
+        for chunk in llm.stream(messages):  # type: ignore
+            if chunk.content:
+                on_chunk(chunk.content)
+            merged = chunk if merged is None else merged + chunk
+        return self._merge_chunks(merged)
+
+    async def _astream(
+        self,
+        llm: Optional[BaseChatModel],
+        messages: List[Message],
+        on_chunk: Callable[[str], None],
+    ) -> AIMessage:
+        merged = None
+        async for chunk in llm.astream(messages):  # type: ignore
+            if chunk.content:
+                on_chunk(chunk.content)
+            merged = chunk if merged is None else merged + chunk
+        return self._merge_chunks(merged)
+
+
+class OpenAIProvider(LangChainProvider):
+    """OpenAI chat models, retried on rate limits."""
+
+    name = "openai"
+    retry_exceptions = (openai.RateLimitError,)
+    max_tries = 7
+    max_time = 45
+    api_key_env = "OPENAI_API_KEY"
+
+    @property
+    def max_tokens(self) -> Optional[int]:
+        # vision models default to low max token limits
+        return 4096 if self.vision else None
+
+    def create_chat_model(self) -> BaseChatModel:
+        if self.vision:
+            return ChatOpenAI(
+                model=self.model_name,
+                temperature=self.temperature,
+                streaming=self.streaming,
+                callbacks=[StreamingStdOutCallbackHandler()],
+                max_tokens=self.max_tokens,
+            )
+        return ChatOpenAI(
+            model=self.model_name,
+            temperature=self.temperature,
+            streaming=self.streaming,
+            callbacks=[StreamingStdOutCallbackHandler()],
+        )
+
+
+class AzureProvider(LangChainProvider):
+    """Azure-hosted OpenAI deployments, retried on rate limits."""
+
+    name = "azure"
+    retry_exceptions = (openai.RateLimitError,)
+    max_tries = 7
+    max_time = 45
+    api_key_env = "AZURE_OPENAI_API_KEY"
+
+    def create_chat_model(self) -> BaseChatModel:
+        return AzureChatOpenAI(
+            azure_endpoint=self.azure_endpoint,
+            openai_api_version=os.getenv("OPENAI_API_VERSION", "2024-05-01-preview"),
+            deployment_name=self.model_name,
+            openai_api_type="azure",
+            streaming=self.streaming,
+            callbacks=[StreamingStdOutCallbackHandler()],
+        )
+
+
+class AnthropicProvider(LangChainProvider):
+    """Anthropic Claude models, retried on rate limits and overload."""
+
+    name = "anthropic"
+    retry_exceptions = (anthropic.RateLimitError, anthropic.InternalServerError)
+    max_tries = 7
+    max_time = 45
+    max_tokens = 4096
+    api_key_env = "ANTHROPIC_API_KEY"
+
+    def create_chat_model(self) -> BaseChatModel:
+        return ChatAnthropic(
+            model=self.model_name,
+            temperature=self.temperature,
+            callbacks=[StreamingStdOutCallbackHandler()],
+            streaming=self.streaming,
+            max_tokens_to_sample=self.max_tokens,
+        )
+
+
+class LocalProvider(LangChainProvider):
+    """
+    Local or self-hosted OpenAI-compatible servers, selected with ``LOCAL_MODEL``.
+
+    The server is addressed through ``OPENAI_API_BASE``; there is no rate limit to back off
+    from, so only dropped connections are retried.
+    """
+
+    name = "local"
+    retry_exceptions = (openai.APIConnectionError,)
+    max_tries = 3
+    max_time = 15
+
+    def create_chat_model(self) -> BaseChatModel:
+        return ChatOpenAI(
+            model=self.model_name,
+            temperature=self.temperature,
+            streaming=self.streaming,
+            callbacks=[StreamingStdOutCallbackHandler()],
+            base_url=os.getenv("OPENAI_API_BASE"),
+            api_key=os.getenv("OPENAI_API_KEY", "local"),
+        )
+
+
+class OpenRouterProvider(Provider):
+    """
+    DeepSeek/Qwen models served through OpenRouter.
+
+    The OpenRouter wrapper already walks a chain of fallback models, so calls are not
+    retried here; a turn either succeeds on one of the models or raises. The wrapper also
+    rate limits each model request itself.
+    """
+
+    name = "openrouter"
+    max_tokens = 1800
+    rate_limited = False
+
+    def create_chat_model(self) -> None:
+        # The API calls are handled by the openrouter_wrapper
+        return None
+
+    @staticmethod
+    def to_openrouter_messages(messages: List[Message]) -> List[dict]:
+        """
+        Convert LangChain messages to the role/content dictionaries expected by OpenRouter.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            The list of messages to convert.
+
+        Returns
+        -------
+        List[dict]
+            The messages in OpenRouter format.
+        """
+        openrouter_messages = []
+        for msg in messages:
+            role = OPENROUTER_ROLES.get(msg.type, msg.type)
+            content = msg.content
+            if isinstance(content, list):
+                content = content[0].get("text", "") if content else ""
+            openrouter_messages.append({"role": role, "content": content})
+        return openrouter_messages
+
+    @staticmethod
+    def _to_ai_message(
+        result: Dict[str, Any], content: Optional[str] = None
+    ) -> AIMessage:
+        if content is None:
+            content = result["choices"][0]["message"]["content"]
+        return AIMessage(
+            content=content,
+            response_metadata={
+                "model_name": result.get("_used_model"),
+                "fallback_used": result.get("_fallback_used", False),
+                "attempt": result.get("_attempt", 1),
+                "token_usage": result.get("usage"),
+            },
+        )
+
+    def _stream(
+        self,
+        llm: Optional[BaseChatModel],
+        messages: List[Message],
+        on_chunk: Callable[[str], None],
+    ) -> AIMessage:
+        info: Dict[str, Any] = {}
+        chunks = []
+        for chunk in stream_openrouter(
+            self.to_openrouter_messages(messages),
+            temperature=self.temperature,
+            is_reasoning=self.task_type == "reasoning",
+            info=info,
+        ):
+            on_chunk(chunk)
+            chunks.append(chunk)
+        return self._to_ai_message(info, "".join(chunks))
+
+    async def _astream(
+        self,
+        llm: Optional[BaseChatModel],
+        messages: List[Message],
+        on_chunk: Callable[[str], None],
+    ) -> AIMessage:
+        info: Dict[str, Any] = {}
+        chunks = []
+        async for chunk in astream_openrouter(
+            self.to_openrouter_messages(messages),
+            temperature=self.temperature,
+            is_reasoning=self.task_type == "reasoning",
+            info=info,
+        ):
+            on_chunk(chunk)
+            chunks.append(chunk)
+        return self._to_ai_message(info, "".join(chunks))
+
+    def _invoke(
+        self, llm: Optional[BaseChatModel], messages: List[Message]
+    ) -> AIMessage:
+        openrouter_messages = self.to_openrouter_messages(messages)
+        if self.task_type == "reasoning":
+            result = call_openrouter_reasoning(
+                openrouter_messages, temperature=self.temperature
+            )
+        else:
+            result = call_openrouter_coding(
+                openrouter_messages, temperature=self.temperature
+            )
+        return self._to_ai_message(result)
+
+    async def _ainvoke(
+        self, llm: Optional[BaseChatModel], messages: List[Message]
+    ) -> AIMessage:
+        openrouter_messages = self.to_openrouter_messages(messages)
+        if self.task_type == "reasoning":
+            result = await acall_openrouter_reasoning(
+                openrouter_messages, temperature=self.temperature
+            )
+        else:
+            result = await acall_openrouter_coding(
+                openrouter_messages, temperature=self.temperature
+            )
+        return self._to_ai_message(result)
+
+
+PROVIDERS: Dict[str, Type[Provider]] = {}
+
+
+def register_provider(name: str, provider_cls: Type[Provider]) -> None:
+    """
+    Register a provider class under a name so it can be selected by the router.
+
+    Parameters
+    ----------
+    name : str
+        The name to register the provider under.
+    provider_cls : Type[Provider]
+        The provider class.
+    """
+    PROVIDERS[name] = provider_cls
+
+
+for _provider_cls in (
+    OpenAIProvider,
+    AzureProvider,
+    AnthropicProvider,
+    LocalProvider,
+    OpenRouterProvider,
+):
+    register_provider(_provider_cls.name, _provider_cls)
+
+
+def select_provider(
+    model_name: str,
+    azure_endpoint: Optional[str] = None,
+    use_openrouter: bool = False,
+) -> str:
+    """
+    Pick the name of the provider that serves a model.
+
+    Parameters
+    ----------
+    model_name : str
+        The name of the model.
+    azure_endpoint : Optional[str]
+        The Azure endpoint, if the model is an Azure deployment.
+    use_openrouter : bool
+        Force the OpenRouter provider.
+
+    Returns
+    -------
+    str
+        The name of a registered provider.
+    """
+    lowered = model_name.lower()
+    if use_openrouter or any(marker in lowered for marker in OPENROUTER_MODEL_MARKERS):
+        return OpenRouterProvider.name
+    if azure_endpoint:
+        return AzureProvider.name
+    if "claude" in model_name:
+        return AnthropicProvider.name
+    if os.getenv("LOCAL_MODEL"):
+        return LocalProvider.name
+    return OpenAIProvider.name
+
+
+def create_provider(name: str, **kwargs) -> Provider:
+    """
+    Instantiate a registered provider.
+
+    Parameters
+    ----------
+    name : str
+        The name the provider is registered under.
+    **kwargs
+        Keyword arguments forwarded to the provider's constructor.
+
+    Returns
+    -------
+    Provider
+        The provider instance.
+
+    Raises
+    ------
+    ValueError
+        If no provider is registered under `name`.
+    """
+    if name not in PROVIDERS:
+        raise ValueError(
+            f"Unknown provider '{name}'. Registered providers: {', '.join(PROVIDERS)}"
+        )
+    return PROVIDERS[name](**kwargs)
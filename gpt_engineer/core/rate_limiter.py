@@ -0,0 +1,628 @@
+"""
+Rate Limiter Module
+
+This module throttles requests to inference backends before they are sent, instead of only
+reacting to rate limit errors. Every provider (and API key) gets a `RateLimiter` combining:
+
+- token buckets for requests per minute and tokens per minute, whose state lives in memory
+  or, when ``GPTE_RATE_LIMIT_DB`` points to a SQLite file, is shared between processes
+  (e.g. parallel benchmark runs and the web-ui);
+- an AIMD concurrency limit, which is halved when the backend answers with HTTP 429 and
+  grows by one slot per window of successful calls;
+- a cooldown that honours the backend's ``Retry-After`` header.
+
+Limits are configured per provider with `configure_rate_limits` or an environment variable
+such as ``GPTE_RATE_LIMIT_OPENAI="rpm=500,tpm=150000,concurrency=8"``. Queue waits are
+recorded in the latency histogram ``<limiter name>.queue_wait`` (see
+`gpt_engineer.core.metrics`), and `rate_limiter_snapshot` exposes the limiter state.
+
+Classes:
+    RateLimits: The configured limits of a provider.
+    Permit: The right to send one request, returned by `RateLimiter.acquire`.
+    RateLimiter: A token-bucket rate limiter with adaptive concurrency.
+
+Functions:
+    rate_limiter(provider: str, key: Optional[str], scope: Optional[str]) -> RateLimiter
+        Return the process-wide limiter of a provider, API key and optional scope.
+    configure_rate_limits(provider: str, limits: RateLimits) -> None
+        Set the limits of a provider.
+    rate_limiter_snapshot() -> Dict[str, dict]
+        Return the state of every limiter.
+    estimate_request_tokens(messages: List[Any], max_tokens: Optional[int]) -> int
+        Roughly estimate the tokens a request counts against a tokens-per-minute limit.
+    parse_retry_after(value: Optional[str]) -> Optional[float]
+        Parse a ``Retry-After`` header into seconds.
+"""
+
+import asyncio
+import email.utils
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from gpt_engineer.core.metrics import latency_histogram
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+# The longest a waiting caller sleeps before re-checking the limiter
+MAX_POLL_SECONDS = 1.0
+ASYNC_POLL_SECONDS = 0.05
+
+# Minimum time between two multiplicative decreases, so a burst of 429s from requests
+# that were already in flight only halves the concurrency once
+DECREASE_INTERVAL_SECONDS = 1.0
+
+# (bucket key, refill rate per second, capacity, amount)
+Bucket = Tuple[str, float, float, float]
+
+
+@dataclass
+class RateLimits:
+    """
+    The configured limits of a provider.
+
+    Attributes
+    ----------
+    requests_per_minute : Optional[float]
+        The request rate limit, or None for no limit.
+    tokens_per_minute : Optional[float]
+        The token rate limit (prompt and completion), or None for no limit.
+    max_concurrency : int
+        The upper bound of the adaptive concurrency limit.
+    """
+
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+
+    @classmethod
+    def from_string(cls, spec: str) -> "RateLimits":
+        """Parse a specification such as ``"rpm=500,tpm=150000,concurrency=8"``."""
+        limits = cls()
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            key, _, value = item.partition("=")
+            key = key.strip().lower()
+            if key == "rpm":
+                limits.requests_per_minute = float(value)
+            elif key == "tpm":
+                limits.tokens_per_minute = float(value)
+            elif key == "concurrency":
+                limits.max_concurrency = int(value)
+            else:
+                raise ValueError(f"Unknown rate limit '{key}' in '{spec}'")
+        return limits
+
+
+# Limits applied when nothing is configured; free OpenRouter models allow 20 requests/min
+DEFAULT_RATE_LIMITS: Dict[str, RateLimits] = {
+    "openrouter": RateLimits(requests_per_minute=20),
+}
+
+
+@dataclass
+class Permit:
+    """
+    The right to send one request, returned by `RateLimiter.acquire`.
+
+    The caller fills in the outcome before handing the permit back to `RateLimiter.release`
+    (the `request` context managers do this for exceptions).
+
+    Attributes
+    ----------
+    tokens : int
+        The tokens reserved for the request.
+    wait_seconds : float
+        How long the caller was queued before the permit was granted.
+    tokens_used : Optional[int]
+        The tokens the request actually used, if known; the difference to `tokens` is
+        returned to (or taken from) the token bucket.
+    succeeded : bool
+        Whether the request succeeded.
+    rate_limited : bool
+        Whether the backend rejected the request with a rate limit error.
+    retry_after : Optional[float]
+        The number of seconds the backend asked to wait, if any.
+    """
+
+    tokens: int
+    wait_seconds: float
+    tokens_used: Optional[int] = None
+    succeeded: bool = True
+    rate_limited: bool = False
+    retry_after: Optional[float] = None
+
+
+class _BucketStore(ABC):
+    """Token bucket and cooldown state; subclasses decide where the state lives."""
+
+    @abstractmethod
+    def _transaction(self) -> ContextManager[None]:
+        """Return a context in which loads and saves are atomic with respect to other users of the state."""
+
+    @abstractmethod
+    def _load(self, key: str) -> Optional[Tuple[float, float]]:
+        """Return the level and update time of a bucket, or None if it has no state yet."""
+
+    @abstractmethod
+    def _save(self, key: str, level: float, updated_at: float) -> None:
+        """Store the level and update time of a bucket."""
+
+    @staticmethod
+    def _refilled(
+        state: Optional[Tuple[float, float]], rate: float, capacity: float, now: float
+    ) -> float:
+        if state is None:
+            return capacity
+        level, updated_at = state
+        return min(capacity, level + max(now - updated_at, 0) * rate)
+
+    def take(self, cooldown_key: str, buckets: List[Bucket], now: float) -> float:
+        """
+        Atomically take `amount` from every bucket if all of them allow it.
+
+        Returns 0 on success, or else the number of seconds to wait before trying again.
+        """
+        with self._transaction():
+            cooldown = self._load(cooldown_key)
+            if cooldown is not None and cooldown[1] > now:
+                return cooldown[1] - now
+
+            levels = []
+            wait = 0.0
+            for key, rate, capacity, amount in buckets:
+                level = self._refilled(self._load(key), rate, capacity, now)
+                levels.append(level)
+                # Requests larger than the bucket are let through once it is full
+                needed = min(amount, capacity)
+                if level < needed:
+                    wait = max(wait, (needed - level) / rate)
+            if wait > 0:
+                return wait
+
+            for (key, _, _, amount), level in zip(buckets, levels):
+                self._save(key, level - amount, now)
+            return 0.0
+
+    def adjust(self, bucket: Bucket, now: float) -> None:
+        """Add `amount` (which may be negative) to a bucket, e.g. to settle an estimate."""
+        key, rate, capacity, amount = bucket
+        with self._transaction():
+            level = self._refilled(self._load(key), rate, capacity, now)
+            self._save(key, min(capacity, level + amount), now)
+
+    def cooldown_remaining(self, cooldown_key: str, now: float) -> float:
+        """Return the number of seconds requests are still blocked for."""
+        with self._transaction():
+            cooldown = self._load(cooldown_key)
+        return max(cooldown[1] - now, 0.0) if cooldown is not None else 0.0
+
+    def cool_down(self, cooldown_key: str, until: float) -> None:
+        """Block every request until `until` (a Unix timestamp)."""
+        with self._transaction():
+            current = self._load(cooldown_key)
+            if current is None or current[1] < until:
+                self._save(cooldown_key, 0, until)
+
+
+class _MemoryBucketStore(_BucketStore):
+    """Bucket state shared by the threads of one process."""
+
+    def __init__(self):
+        self._state: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        with self._lock:
+            yield
+
+    def _load(self, key: str) -> Optional[Tuple[float, float]]:
+        return self._state.get(key)
+
+    def _save(self, key: str, level: float, updated_at: float) -> None:
+        self._state[key] = (level, updated_at)
+
+
+class _SQLiteBucketStore(_BucketStore):
+    """Bucket state shared between processes through a SQLite database in WAL mode."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " key TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _load(self, key: str) -> Optional[Tuple[float, float]]:
+        return (
+            self._connection()
+            .execute("SELECT level, updated_at FROM buckets WHERE key = ?", (key,))
+            .fetchone()
+        )
+
+    def _save(self, key: str, level: float, updated_at: float) -> None:
+        self._connection().execute(
+            "INSERT OR REPLACE INTO buckets (key, level, updated_at) VALUES (?, ?, ?)",
+            (key, level, updated_at),
+        )
+
+
+class RateLimiter:
+    """
+    A token-bucket rate limiter with adaptive (AIMD) concurrency.
+
+    Attributes
+    ----------
+    name : str
+        The name of the limiter, which also prefixes its bucket keys.
+    limits : RateLimits
+        The configured limits.
+    min_concurrency : int
+        The lower bound of the adaptive concurrency limit.
+    requests : int
+        The number of permits granted.
+    throttled : int
+        The number of permits that had to wait.
+    rate_limited : int
+        The number of requests rejected by the backend with a rate limit error.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limits: Optional[RateLimits] = None,
+        min_concurrency: int = 1,
+        store: Optional[_BucketStore] = None,
+    ):
+        self.name = name
+        self.limits = limits or RateLimits()
+        self.min_concurrency = min_concurrency
+        self._store = store or _MemoryBucketStore()
+        self._limit = float(self.limits.max_concurrency)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self.requests = 0
+        self.throttled = 0
+        self.rate_limited = 0
+
+    @property
+    def concurrency_limit(self) -> int:
+        """The current number of requests allowed in flight at once."""
+        return max(self.min_concurrency, int(self._limit))
+
+    def cooldown_remaining(self) -> float:
+        """Return the number of seconds left of a ``Retry-After`` cooldown, if any."""
+        return self._store.cooldown_remaining(f"{self.name}:cooldown", time.time())
+
+    @property
+    def queue_wait(self):
+        """The latency histogram of the time callers were queued."""
+        return latency_histogram(f"{self.name}.queue_wait")
+
+    def _buckets(self, tokens: int) -> List[Bucket]:
+        buckets = []
+        if self.limits.requests_per_minute:
+            rpm = self.limits.requests_per_minute
+            buckets.append((f"{self.name}:requests", rpm / 60, rpm, 1))
+        if self.limits.tokens_per_minute and tokens:
+            tpm = self.limits.tokens_per_minute
+            buckets.append((f"{self.name}:tokens", tpm / 60, tpm, tokens))
+        return buckets
+
+    def _try_acquire(self, tokens: int) -> Optional[float]:
+        # Returns None once a slot and the bucket capacity are taken, or else how long to
+        # wait (0 when only a concurrency slot is missing). Called with the lock held.
+        if self._in_flight >= self.concurrency_limit:
+            return 0.0
+        wait = self._store.take(
+            f"{self.name}:cooldown", self._buckets(tokens), time.time()
+        )
+        if wait > 0:
+            return wait
+        self._in_flight += 1
+        self.requests += 1
+        return None
+
+    def _granted(self, tokens: int, started: float, waited: bool) -> Permit:
+        wait_seconds = time.perf_counter() - started
+        self.queue_wait.observe(wait_seconds)
+        if waited:
+            self.throttled += 1
+        return Permit(tokens=tokens, wait_seconds=wait_seconds)
+
+    def acquire(self, tokens: int = 0) -> Permit:
+        """
+        Block until a request of `tokens` tokens may be sent.
+
+        Parameters
+        ----------
+        tokens : int
+            The estimated number of tokens of the request.
+
+        Returns
+        -------
+        Permit
+            The permit, which must be handed back to `release`.
+        """
+        started = time.perf_counter()
+        waited = False
+        with self._cond:
+            while True:
+                wait = self._try_acquire(tokens)
+                if wait is None:
+                    return self._granted(tokens, started, waited)
+                waited = True
+                self._cond.wait(timeout=min(wait or MAX_POLL_SECONDS, MAX_POLL_SECONDS))
+
+    async def aacquire(self, tokens: int = 0) -> Permit:
+        """Asynchronous variant of `acquire`, which waits without blocking the event loop."""
+        started = time.perf_counter()
+        waited = False
+        while True:
+            with self._cond:
+                wait = self._try_acquire(tokens)
+                if wait is None:
+                    return self._granted(tokens, started, waited)
+            waited = True
+            await asyncio.sleep(min(wait or ASYNC_POLL_SECONDS, MAX_POLL_SECONDS))
+
+    def release(self, permit: Permit) -> None:
+        """
+        Hand back a permit and adapt the limiter to the outcome recorded on it.
+
+        A rate limited request halves the concurrency limit and, if the backend sent a
+        ``Retry-After``, pauses all requests for that long. A successful request raises
+        the concurrency limit by ``1 / limit``, i.e. one slot per window of successes.
+        """
+        now = time.time()
+        with self._cond:
+            self._in_flight -= 1
+            if (
+                permit.tokens_used is not None
+                and self.limits.tokens_per_minute
+                and permit.tokens
+            ):
+                tpm = self.limits.tokens_per_minute
+                self._store.adjust(
+                    (
+                        f"{self.name}:tokens",
+                        tpm / 60,
+                        tpm,
+                        permit.tokens - permit.tokens_used,
+                    ),
+                    now,
+                )
+            if permit.rate_limited:
+                self.rate_limited += 1
+                if now - self._last_decrease >= DECREASE_INTERVAL_SECONDS:
+                    self._limit = max(float(self.min_concurrency), self._limit / 2)
+                    self._last_decrease = now
+                if permit.retry_after:
+                    self._store.cool_down(
+                        f"{self.name}:cooldown", now + permit.retry_after
+                    )
+            elif permit.succeeded:
+                self._limit = min(
+                    float(self.limits.max_concurrency), self._limit + 1 / self._limit
+                )
+            self._cond.notify_all()
+
+    @staticmethod
+    def _record_failure(permit: Permit, exc: BaseException) -> None:
+        permit.succeeded = False
+        if is_rate_limit_error(exc):
+            permit.rate_limited = True
+            permit.retry_after = retry_after_from_exception(exc)
+
+    @contextmanager
+    def request(self, tokens: int = 0) -> Iterator[Permit]:
+        """Hold a permit for the duration of a ``with`` block, releasing it on exit."""
+        permit = self.acquire(tokens)
+        try:
+            yield permit
+        except BaseException as exc:
+            self._record_failure(permit, exc)
+            raise
+        finally:
+            self.release(permit)
+
+    @asynccontextmanager
+    async def arequest(self, tokens: int = 0):
+        """Asynchronous variant of `request`."""
+        permit = await self.aacquire(tokens)
+        try:
+            yield permit
+        except BaseException as exc:
+            self._record_failure(permit, exc)
+            raise
+        finally:
+            self.release(permit)
+
+    def snapshot(self) -> dict:
+        """Return the limits, the adaptive state and the counters as a plain dictionary."""
+        with self._cond:
+            return {
+                "requests_per_minute": self.limits.requests_per_minute,
+                "tokens_per_minute": self.limits.tokens_per_minute,
+                "concurrency_limit": self.concurrency_limit,
+                "in_flight": self._in_flight,
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "rate_limited": self.rate_limited,
+                "queue_wait": self.queue_wait.snapshot(),
+            }
+
+
+def estimate_request_tokens(
+    messages: List[Any], max_tokens: Optional[int] = None
+) -> int:
+    """
+    Roughly estimate the tokens a request counts against a tokens-per-minute limit.
+
+    Backends reserve the completion limit up front, so `max_tokens` is included. The
+    estimate is settled against the reported usage once the response arrives.
+
+    Parameters
+    ----------
+    messages : List[Any]
+        LangChain messages or OpenAI-style message dictionaries.
+    max_tokens : Optional[int]
+        The completion token limit of the request, if any.
+
+    Returns
+    -------
+    int
+        The estimated number of tokens.
+    """
+    chars = 0
+    for message in messages:
+        content = message["content"] if isinstance(message, dict) else message.content
+        chars += len(content) if isinstance(content, str) else len(str(content))
+    return chars // 4 + (max_tokens or 0)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a ``Retry-After`` header, given in seconds or as an HTTP date, into seconds.
+
+    Returns None if the header is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """Whether an exception reports an HTTP 429 response."""
+    if getattr(exc, "status_code", None) == 429:
+        return True
+    return getattr(getattr(exc, "response", None), "status_code", None) == 429
+
+
+def retry_after_from_exception(exc: BaseException) -> Optional[float]:
+    """Return the ``Retry-After`` of the response attached to an exception, if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        seconds = parse_retry_after(retry_after_ms)
+        return seconds / 1000 if seconds is not None else None
+    return parse_retry_after(headers.get("retry-after"))
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_configured_limits: Dict[str, RateLimits] = {}
+_limiters_lock = threading.Lock()
+_shared_store: Optional[_BucketStore] = None
+_shared_store_lock = threading.Lock()
+
+
+def _limits_for(provider: str) -> RateLimits:
+    if provider in _configured_limits:
+        return _configured_limits[provider]
+    spec = os.getenv(f"GPTE_RATE_LIMIT_{provider.upper()}")
+    if spec:
+        return RateLimits.from_string(spec)
+    return DEFAULT_RATE_LIMITS.get(provider, RateLimits())
+
+
+def _store() -> _BucketStore:
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            path = os.getenv("GPTE_RATE_LIMIT_DB")
+            _shared_store = (
+                _SQLiteBucketStore(Path(path)) if path else _MemoryBucketStore()
+            )
+        return _shared_store
+
+
+def rate_limiter(
+    provider: str, key: Optional[str] = None, scope: Optional[str] = None
+) -> RateLimiter:
+    """
+    Return the process-wide limiter of a provider, API key and optional scope.
+
+    Parameters
+    ----------
+    provider : str
+        The name of the provider, which selects the configured limits.
+    key : Optional[str]
+        The API key in use; limits are tracked separately per key. Only a digest of the
+        key is kept.
+    scope : Optional[str]
+        A further subdivision, e.g. the model for backends that limit each model separately.
+
+    Returns
+    -------
+    RateLimiter
+        The limiter, created on first use.
+    """
+    name = provider
+    if scope:
+        name += f":{scope}"
+    if key:
+        name += ":" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = RateLimiter(name, _limits_for(provider), store=_store())
+        return _limiters[name]
+
+
+def configure_rate_limits(provider: str, limits: RateLimits) -> None:
+    """
+    Set the limits of a provider, replacing those from the environment or the defaults.
+
+    Limiters of the provider that already exist are recreated on their next use.
+    """
+    with _limiters_lock:
+        _configured_limits[provider] = limits
+        for name in [n for n in _limiters if n.split(":", 1)[0] == provider]:
+            del _limiters[name]
+
+
+def rate_limiter_snapshot() -> Dict[str, dict]:
+    """Return the state of every limiter, keyed by name."""
+    with _limiters_lock:
+        items = list(_limiters.items())
+    return {name: limiter.snapshot() for name, limiter in items}
@@ -0,0 +1,179 @@
+"""
+Sequence Alignment Module
+
+This module aligns two sequences of lines, such as the lines a diff hunk expects in the original file and a window
+of the lines actually in the file, and returns the pairs of positions that match.
+
+The alignment is a patience alignment: the lines that occur exactly once in both sequences anchor it, in the longest
+run of anchors that appear in the same order in both, and the stretches between anchors are aligned by Myers'
+algorithm, which finds a longest common subsequence under an arbitrary, for instance fuzzy, notion of equality.
+
+Functions:
+    patience_anchors(keys_a: Sequence[Hashable], keys_b: Sequence[Hashable]) -> List[Tuple[int, int]]
+        Return the pairs of positions of the keys that are unique in both sequences, in their longest common order.
+    myers_matches(len_a: int, len_b: int, equal: Callable[[int, int], bool]) -> List[Tuple[int, int]]
+        Return the pairs of positions of a longest common subsequence of two sequences.
+    align_sequences(keys_a: Sequence[Hashable], keys_b: Sequence[Hashable], equal: Callable[[int, int], bool]) -> List[Tuple[int, int]]
+        Return the pairs of positions at which two sequences match, anchored on their unique lines.
+"""
+
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable, Hashable, List, Optional, Sequence, Tuple
+
+Matches = List[Tuple[int, int]]
+
+
+def patience_anchors(
+    keys_a: Sequence[Optional[Hashable]], keys_b: Sequence[Optional[Hashable]]
+) -> Matches:
+    """
+    Return the pairs of positions of the keys that occur exactly once in each sequence, keeping the longest run of
+    pairs that is in the same order in both sequences. Keys that are None never anchor.
+    """
+    counts_a = Counter(key for key in keys_a if key is not None)
+    counts_b = Counter(key for key in keys_b if key is not None)
+    position_b = {
+        key: j for j, key in enumerate(keys_b) if key is not None and counts_b[key] == 1
+    }
+    pairs = [
+        (i, position_b[key])
+        for i, key in enumerate(keys_a)
+        if key is not None and counts_a[key] == 1 and key in position_b
+    ]
+
+    # The longest increasing subsequence of the positions in b, by patience sorting
+    tails: List[int] = []
+    tail_pairs: List[int] = []
+    previous: List[Optional[int]] = []
+    for pair_ind, (_, j) in enumerate(pairs):
+        pile = bisect_left(tails, j)
+        if pile == len(tails):
+            tails.append(j)
+            tail_pairs.append(pair_ind)
+        else:
+            tails[pile] = j
+            tail_pairs[pile] = pair_ind
+        previous.append(tail_pairs[pile - 1] if pile > 0 else None)
+
+    anchors: Matches = []
+    pair_ind = tail_pairs[-1] if tail_pairs else None
+    while pair_ind is not None:
+        anchors.append(pairs[pair_ind])
+        pair_ind = previous[pair_ind]
+    return anchors[::-1]
+
+
+def myers_matches(len_a: int, len_b: int, equal: Callable[[int, int], bool]) -> Matches:
+    """
+    Return the pairs of positions of a longest common subsequence of two sequences of lengths `len_a` and `len_b`,
+    where `equal(i, j)` tells whether position `i` of the first matches position `j` of the second.
+
+    The greedy algorithm of Myers (1986) takes time proportional to the sum of the lengths times the number of
+    lines that are not matched; of several longest subsequences, it prefers matching lines early in both sequences.
+    """
+    offset = len_a + len_b + 1
+    furthest = [0] * (2 * offset + 1)
+    trace = []
+    for edits in range(len_a + len_b + 1):
+        trace.append(furthest[:])
+        for diagonal in range(-edits, edits + 1, 2):
+            k = diagonal + offset
+            if diagonal == -edits or (
+                diagonal != edits and furthest[k - 1] < furthest[k + 1]
+            ):
+                i = furthest[k + 1]
+            else:
+                i = furthest[k - 1] + 1
+            j = i - diagonal
+            while i < len_a and j < len_b and equal(i, j):
+                i += 1
+                j += 1
+            furthest[k] = i
+            if i >= len_a and j >= len_b:
+                return _backtrack(trace, edits, len_a, len_b, offset)
+    return []  # pragma: no cover - the loop always reaches the end of both sequences
+
+
+def _backtrack(trace: List[List[int]], edits: int, i: int, j: int, offset: int):
+    # Walk the furthest reaching paths back from the end, collecting their diagonal runs
+    matches: Matches = []
+    for edits in range(edits, -1, -1):
+        furthest = trace[edits]
+        diagonal = i - j
+        k = diagonal + offset
+        if diagonal == -edits or (
+            diagonal != edits and furthest[k - 1] < furthest[k + 1]
+        ):
+            previous_diagonal = diagonal + 1
+        else:
+            previous_diagonal = diagonal - 1
+        previous_i = furthest[previous_diagonal + offset]
+        previous_j = previous_i - previous_diagonal
+        while i > previous_i and j > previous_j:
+            i -= 1
+            j -= 1
+            matches.append((i, j))
+        i, j = previous_i, previous_j
+    return matches[::-1]
+
+
+def align_sequences(
+    keys_a: Sequence[Optional[Hashable]],
+    keys_b: Sequence[Optional[Hashable]],
+    equal: Callable[[int, int], bool],
+) -> Matches:
+    """
+    Return the pairs of positions at which two sequences match, in increasing order.
+
+    The sequences are anchored on the keys that are unique in both (see `patience_anchors`), and the stretches
+    before, between and after the anchors are aligned with `myers_matches` under `equal`. The stretch before the
+    first anchor is aligned from its end, so that its lines are matched as close to the anchor as possible.
+    """
+    anchors = patience_anchors(keys_a, keys_b)
+    matches: Matches = []
+    start_a = start_b = 0
+    for gap, (anchor_a, anchor_b) in enumerate(anchors + [(len(keys_a), len(keys_b))]):
+        matches.extend(
+            _gap_matches(
+                start_a,
+                anchor_a,
+                start_b,
+                anchor_b,
+                equal,
+                reverse=gap == 0 and bool(anchors),
+            )
+        )
+        if anchor_a < len(keys_a):
+            matches.append((anchor_a, anchor_b))
+        start_a, start_b = anchor_a + 1, anchor_b + 1
+    return matches
+
+
+def _gap_matches(
+    start_a: int,
+    stop_a: int,
+    start_b: int,
+    stop_b: int,
+    equal: Callable[[int, int], bool],
+    reverse: bool = False,
+) -> Matches:
+    # The matches between two stretches, aligned from their ends if `reverse`
+    len_a, len_b = stop_a - start_a, stop_b - start_b
+    if len_a <= 0 or len_b <= 0:
+        return []
+    if not reverse:
+        return [
+            (start_a + i, start_b + j)
+            for i, j in myers_matches(
+                len_a, len_b, lambda i, j: equal(start_a + i, start_b + j)
+            )
+        ]
+    return [
+        (stop_a - 1 - i, stop_b - 1 - j)
+        for i, j in reversed(
+            myers_matches(
+                len_a, len_b, lambda i, j: equal(stop_a - 1 - i, stop_b - 1 - j)
+            )
+        )
+    ]
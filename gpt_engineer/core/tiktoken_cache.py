@@ -0,0 +1,256 @@
+"""
+Tiktoken Cache Module
+
+This module keeps the BPE files of the tiktoken encodings used by gpt-engineer in a local
+cache directory, so that tokenizers load without network access.
+
+tiktoken downloads the BPE file of an encoding on first use and caches it in
+``TIKTOKEN_CACHE_DIR`` (by default a temporary directory), which fails on air-gapped hosts
+and slows down the first cold start. Here the cache directory is made configurable and
+persistent, it can be filled once (from the internet, or from a directory of
+``<encoding>.tiktoken`` files copied onto an offline host), and it can be checked at
+startup without touching the network. Build it with::
+
+    python -m gpt_engineer.core.tiktoken_cache [--source-dir DIR]
+
+The cache directory is, in order of precedence, ``GPTE_TIKTOKEN_CACHE_DIR``,
+``TIKTOKEN_CACHE_DIR`` or ``~/.cache/gpt-engineer/tiktoken``. With ``GPTE_TIKTOKEN_OFFLINE``
+set, tokenizers whose files are not cached fail instead of downloading them.
+
+Functions:
+    tiktoken_cache_dir() -> Path
+        Return the configured cache directory.
+    configure_tiktoken_cache(cache_dir: Optional[Path]) -> Path
+        Point tiktoken at the cache directory.
+    missing_encodings(encodings: Iterable[str], cache_dir: Optional[Path]) -> List[str]
+        Return the encodings whose BPE files are not in the cache.
+    tiktoken_offline() -> bool
+        Return whether tokenizer files must never be downloaded.
+    require_cached_encoding(encoding: str, cache_dir: Optional[Path]) -> None
+        Raise if downloads are disabled and the BPE file of an encoding is not cached.
+    build_tiktoken_cache(encodings: Iterable[str], cache_dir: Optional[Path], source_dir: Optional[Path]) -> Path
+        Fill the cache with the BPE files of the encodings.
+    check_tiktoken_cache(encodings: Iterable[str]) -> List[str]
+        Configure the cache and warn about missing encodings, without network access.
+"""
+
+import hashlib
+import logging
+import os
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import requests
+import typer
+
+logger = logging.getLogger(__name__)
+
+# The source URL and SHA-256 of the BPE file of every encoding gpt-engineer uses; the
+# URLs are also the keys of tiktoken's cache
+ENCODING_FILES: Dict[str, Tuple[str, str]] = {
+    "cl100k_base": (
+        "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken",
+        "223921b76ee99bde995b7ff738513eef100fb51d18c93597a113bcffe865b2a7",
+    ),
+    "o200k_base": (
+        "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken",
+        "446a9538cb6c348e3516120d7c08b09f57c36495e2acfffe59a5bf8b0cfb1a2d",
+    ),
+}
+REQUIRED_ENCODINGS = ("cl100k_base", "o200k_base")
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "gpt-engineer" / "tiktoken"
+
+# Set to a non-empty value other than "0" to never download tokenizer files
+OFFLINE_ENV = "GPTE_TIKTOKEN_OFFLINE"
+
+BUILD_COMMAND = "python -m gpt_engineer.core.tiktoken_cache"
+
+
+def tiktoken_cache_dir() -> Path:
+    """Return the configured tiktoken cache directory."""
+    path = os.getenv("GPTE_TIKTOKEN_CACHE_DIR") or os.getenv("TIKTOKEN_CACHE_DIR")
+    return Path(path).expanduser() if path else DEFAULT_CACHE_DIR
+
+
+def configure_tiktoken_cache(cache_dir: Optional[Path] = None) -> Path:
+    """
+    Point tiktoken at the cache directory by setting ``TIKTOKEN_CACHE_DIR``.
+
+    Parameters
+    ----------
+    cache_dir : Optional[Path]
+        The cache directory; by default the configured one.
+
+    Returns
+    -------
+    Path
+        The cache directory in use.
+    """
+    path = Path(cache_dir) if cache_dir is not None else tiktoken_cache_dir()
+    os.environ["TIKTOKEN_CACHE_DIR"] = str(path)
+    return path
+
+
+def _cache_path(cache_dir: Path, encoding: str) -> Path:
+    # tiktoken names cached files after the SHA-1 of their source URL
+    url, _ = ENCODING_FILES[encoding]
+    return cache_dir / hashlib.sha1(url.encode()).hexdigest()
+
+
+def _is_valid(data: bytes, encoding: str) -> bool:
+    return hashlib.sha256(data).hexdigest() == ENCODING_FILES[encoding][1]
+
+
+def missing_encodings(
+    encodings: Iterable[str] = REQUIRED_ENCODINGS, cache_dir: Optional[Path] = None
+) -> List[str]:
+    """
+    Return the encodings whose BPE files are missing from the cache or corrupted.
+
+    Only the local files are read; the network is never used.
+    """
+    cache_dir = Path(cache_dir) if cache_dir is not None else tiktoken_cache_dir()
+    missing = []
+    for encoding in encodings:
+        path = _cache_path(cache_dir, encoding)
+        if not path.is_file() or not _is_valid(path.read_bytes(), encoding):
+            missing.append(encoding)
+    return missing
+
+
+def tiktoken_offline() -> bool:
+    """Return whether tokenizer files must never be downloaded, see ``GPTE_TIKTOKEN_OFFLINE``."""
+    return os.getenv(OFFLINE_ENV, "") not in ("", "0")
+
+
+def require_cached_encoding(encoding: str, cache_dir: Optional[Path] = None) -> None:
+    """
+    Fail fast instead of letting tiktoken download the BPE file of an encoding offline.
+
+    Parameters
+    ----------
+    encoding : str
+        The name of the encoding.
+    cache_dir : Optional[Path]
+        The cache directory; by default the configured one.
+
+    Raises
+    ------
+    RuntimeError
+        If downloads are disabled and the BPE file of the encoding is not cached.
+    """
+    if not tiktoken_offline() or encoding not in ENCODING_FILES:
+        return
+    cache_dir = Path(cache_dir) if cache_dir is not None else tiktoken_cache_dir()
+    if not _cache_path(cache_dir, encoding).is_file():
+        raise RuntimeError(
+            f"The tokenizer file of {encoding} is not in {cache_dir} and {OFFLINE_ENV} is"
+            f" set. Run {BUILD_COMMAND} to build the cache (use --source-dir on hosts"
+            " without network access)."
+        )
+
+
+def build_tiktoken_cache(
+    encodings: Iterable[str] = REQUIRED_ENCODINGS,
+    cache_dir: Optional[Path] = None,
+    source_dir: Optional[Path] = None,
+) -> Path:
+    """
+    Fill the cache with the BPE files of the encodings that are missing from it.
+
+    Parameters
+    ----------
+    encodings : Iterable[str]
+        The names of the encodings.
+    cache_dir : Optional[Path]
+        The cache directory; by default the configured one.
+    source_dir : Optional[Path]
+        A directory with ``<encoding>.tiktoken`` files to copy, for hosts without network
+        access. By default the files are downloaded.
+
+    Returns
+    -------
+    Path
+        The cache directory.
+
+    Raises
+    ------
+    ValueError
+        If a file does not have the expected SHA-256.
+    """
+    cache_dir = Path(cache_dir) if cache_dir is not None else tiktoken_cache_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for encoding in missing_encodings(encodings, cache_dir):
+        url, _ = ENCODING_FILES[encoding]
+        if source_dir is not None:
+            data = (Path(source_dir) / f"{encoding}.tiktoken").read_bytes()
+        else:
+            logger.info("Downloading %s from %s", encoding, url)
+            response = requests.get(url, timeout=60)
+            response.raise_for_status()
+            data = response.content
+        if not _is_valid(data, encoding):
+            raise ValueError(f"The BPE file of {encoding} does not match its SHA-256")
+
+        path = _cache_path(cache_dir, encoding)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        logger.info("Cached %s in %s", encoding, path)
+    return cache_dir
+
+
+def check_tiktoken_cache(encodings: Iterable[str] = REQUIRED_ENCODINGS) -> List[str]:
+    """
+    Point tiktoken at the cache and warn about missing encodings, without network access.
+
+    Returns
+    -------
+    List[str]
+        The encodings that tiktoken would have to download on first use.
+    """
+    cache_dir = configure_tiktoken_cache()
+    missing = missing_encodings(encodings, cache_dir)
+    if missing:
+        logger.warning(
+            "Tokenizer files for %s are not in %s, so they will be %s on first use."
+            " Run %s to build the cache once (use --source-dir on hosts without network"
+            " access).",
+            ", ".join(missing),
+            cache_dir,
+            "missing" if tiktoken_offline() else "downloaded",
+            BUILD_COMMAND,
+        )
+    return missing
+
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    cache_dir: Optional[Path] = typer.Option(
+        None, help="The cache directory (default: GPTE_TIKTOKEN_CACHE_DIR or ~/.cache)."
+    ),
+    source_dir: Optional[Path] = typer.Option(
+        None,
+        help="A directory with <encoding>.tiktoken files to copy instead of downloading.",
+    ),
+):
+    """Download or copy the tokenizer files into the tiktoken cache."""
+    cache_dir = cache_dir or tiktoken_cache_dir()
+    build_tiktoken_cache(REQUIRED_ENCODINGS, cache_dir, source_dir)
+    missing = missing_encodings(REQUIRED_ENCODINGS, cache_dir)
+    if missing:
+        typer.echo(f"Missing encodings: {', '.join(missing)}", err=True)
+        raise typer.Exit(code=1)
+    print(f"Tokenizer cache ready in {cache_dir}")
+    print(
+        f"Set GPTE_TIKTOKEN_CACHE_DIR={cache_dir} if this is not the default location."
+    )
+
+
+if __name__ == "__main__":
+    app()
@@ -1,15 +1,29 @@
 import base64
+import binascii
+import hashlib
 import io
+import json
 import logging
 import math
+import os
+import struct
+import threading
 
-from dataclasses import dataclass
-from typing import List, Union
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 import tiktoken
 
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
 from PIL import Image
+from tiktoken.model import encoding_name_for_model
+
+from gpt_engineer.core.tiktoken_cache import (
+    configure_tiktoken_cache,
+    require_cached_encoding,
+)
 
 # workaround for function moved in:
 # https://github.com/langchain-ai/langchain/blob/535db72607c4ae308566ede4af65295967bb33a8/libs/community/langchain_community/callbacks/openai_info.py
@@ -27,6 +41,180 @@ Message = Union[AIMessage, HumanMessage, SystemMessage]
 
 logger = logging.getLogger(__name__)
 
+# Token counts of texts at least this long are memoized by content digest, so that the
+# large messages resent on every turn (e.g. the uploaded files) are only encoded once
+MEMO_MIN_CHARS = 256
+MEMO_MAX_ENTRIES = 1024
+
+
+class _TokenCountCache:
+    """A bounded, thread-safe LRU map from (encoding, content digest) to a token count."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._counts: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, bytes]) -> Union[int, None]:
+        with self._lock:
+            count = self._counts.get(key)
+            if count is None:
+                self.misses += 1
+                return None
+            self._counts.move_to_end(key)
+            self.hits += 1
+            return count
+
+    def put(self, key: Tuple[str, bytes], count: int) -> None:
+        with self._lock:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._counts),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_token_counts = _TokenCountCache(MEMO_MAX_ENTRIES)
+
+# Base64 prefixes (in characters, multiples of 4) decoded to find an image's dimensions in
+# its header; JPEG headers can be preceded by large metadata segments, hence the retry
+IMAGE_HEADER_PREFIXES = (4 * 1024, 64 * 1024)
+
+# JPEG start-of-frame markers, which carry the image dimensions
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def image_size_from_header(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Read the width and height of a PNG, GIF or JPEG image from the start of its bytes.
+
+    Parameters
+    ----------
+    data : bytes
+        The image bytes; only the header is needed.
+
+    Returns
+    -------
+    Optional[Tuple[int, int]]
+        The width and height, or None if the format is not recognized or the dimensions
+        are not within `data`.
+    """
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        if len(data) >= 24 and data[12:16] == b"IHDR":
+            return struct.unpack(">II", data[16:24])
+        return None
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return struct.unpack("<HH", data[6:10]) if len(data) >= 10 else None
+    if not data.startswith(b"\xff\xd8"):
+        return None
+
+    index = 2
+    while index + 9 <= len(data):
+        if data[index] != 0xFF:
+            return None
+        marker = data[index + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            index += 1
+        elif marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Markers without a payload
+            index += 2
+        elif marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[index + 5 : index + 9])
+            return width, height
+        else:
+            (length,) = struct.unpack(">H", data[index + 2 : index + 4])
+            index += 2 + length
+    return None
+
+
+def _image_size(image_base64: str) -> Tuple[int, int]:
+    # Decode growing prefixes and parse the header; only fall back to decoding and opening
+    # the whole image for formats or layouts the header parser does not handle
+    for n_chars in IMAGE_HEADER_PREFIXES:
+        prefix = image_base64[:n_chars]
+        try:
+            size = image_size_from_header(
+                base64.b64decode(prefix[: len(prefix) - len(prefix) % 4])
+            )
+        except (binascii.Error, ValueError):
+            break
+        if size is not None:
+            return size
+        if len(prefix) == len(image_base64):
+            break
+    with Image.open(io.BytesIO(base64.b64decode(image_base64))) as image:
+        return image.size
+
+
+def token_count_cache_stats() -> Dict[str, int]:
+    """Return the number of entries, hits and misses of the memoized token counts."""
+    return _token_counts.stats()
+
+
+def clear_token_count_cache() -> None:
+    """Forget all memoized token counts."""
+    _token_counts.clear()
+
+
+@dataclass
+class InferenceTiming:
+    """
+    Dataclass representing the timing of the inference of a conversation step.
+
+    Attributes
+    ----------
+    queue_wait : float
+        Seconds the request waited for a free slot of a batch before it was dispatched.
+    time_to_first_token : Optional[float]
+        Seconds from dispatch to the first streamed chunk; None when the answer was not
+        streamed.
+    latency : float
+        Seconds from dispatch to the complete answer.
+    output_tokens_per_second : Optional[float]
+        Completion tokens per second of generation (after the first token, when known);
+        None for cache hits and empty answers.
+    provider : str
+        The name of the provider the request was routed to.
+    model : str
+        The model that actually answered.
+    fallback_used : bool
+        Whether a fallback model answered instead of the requested one.
+    retries : int
+        The number of failed attempts before the answer.
+    cache_hit : bool
+        Whether the answer came from the response cache.
+    """
+
+    queue_wait: float
+    time_to_first_token: Optional[float]
+    latency: float
+    output_tokens_per_second: Optional[float] = None
+    provider: str = ""
+    model: str = ""
+    fallback_used: bool = False
+    retries: int = 0
+    cache_hit: bool = False
+
+
+# The CSV columns of the timing of a step, in order
+TIMING_COLUMNS = [f.name for f in fields(InferenceTiming)]
+
 
 @dataclass
 class TokenUsage:
@@ -49,6 +237,12 @@ class TokenUsage:
         The cumulative number of completion tokens used up to this step.
     total_tokens : int
         The cumulative total number of tokens used up to this step.
+    usage_source : str
+        Where the step's counts come from: ``"provider"`` when reported by the backend,
+        ``"local"`` when counted with the local tokenizer, ``"cache"`` when the answer came
+        from the response cache and no tokens were spent.
+    timing : Optional[InferenceTiming]
+        The latency and routing of the step's inference, if it was measured.
     """
 
     """
@@ -62,25 +256,122 @@ class TokenUsage:
     total_prompt_tokens: int
     total_completion_tokens: int
     total_tokens: int
+    usage_source: str = "local"
+    timing: Optional[InferenceTiming] = None
+
+
+# The encoding used to count tokens for models without a tiktoken encoding of their own
+DEFAULT_ENCODING = "cl100k_base"
+
+_encodings: Dict[str, "tiktoken.Encoding"] = {}
+_encodings_lock = threading.Lock()
+
+
+def encoding_name(model_name: str) -> str:
+    """Return the name of the tiktoken encoding used to count tokens for a model."""
+    if "gpt-4" in model_name or "gpt-3.5" in model_name:
+        return encoding_name_for_model(model_name)
+    return DEFAULT_ENCODING
+
+
+def get_encoding(model_name: str) -> "tiktoken.Encoding":
+    """
+    Return the tiktoken encoding of a model from the process-wide registry.
+
+    Every encoding is loaded once, on first use, and shared by all tokenizers; loading is
+    thread-safe.
+
+    Raises
+    ------
+    RuntimeError
+        If ``GPTE_TIKTOKEN_OFFLINE`` is set and the encoding is not in the local cache.
+
+    Parameters
+    ----------
+    model_name : str
+        The name of the model.
+
+    Returns
+    -------
+    tiktoken.Encoding
+        The encoding.
+    """
+    name = encoding_name(model_name)
+    encoding = _encodings.get(name)
+    if encoding is None:
+        with _encodings_lock:
+            encoding = _encodings.get(name)
+            if encoding is None:
+                if "TIKTOKEN_CACHE_DIR" not in os.environ:
+                    # Load the BPE files from gpt-engineer's persistent cache
+                    configure_tiktoken_cache()
+                require_cached_encoding(name, Path(os.environ["TIKTOKEN_CACHE_DIR"]))
+                encoding = tiktoken.get_encoding(name)
+                _encodings[name] = encoding
+    return encoding
+
+
+def preload_tokenizers(
+    model_names: Iterable[str], background: bool = True
+) -> Optional[threading.Thread]:
+    """
+    Load the encodings of the given models into the registry ahead of their first use.
+
+    Parameters
+    ----------
+    model_names : Iterable[str]
+        The names of the models.
+    background : bool, optional
+        Whether to load them in a daemon thread, by default True.
+
+    Returns
+    -------
+    Optional[threading.Thread]
+        The loading thread, or None when loading synchronously.
+    """
+    model_names = list(model_names)
+
+    def load() -> None:
+        for model_name in model_names:
+            try:
+                get_encoding(model_name)
+            except Exception as e:
+                logger.warning(
+                    "Could not preload the tokenizer of %s: %s", model_name, e
+                )
+
+    if not background:
+        load()
+        return None
+    thread = threading.Thread(target=load, name="tokenizer-preload", daemon=True)
+    thread.start()
+    return thread
 
 
 class Tokenizer:
     """
     Tokenizer for counting tokens in text.
+
+    The encoding is taken from the process-wide registry on first use, so constructing a
+    tokenizer is cheap.
     """
 
     def __init__(self, model_name):
         self.model_name = model_name
-        self._tiktoken_tokenizer = (
-            tiktoken.encoding_for_model(model_name)
-            if "gpt-4" in model_name or "gpt-3.5" in model_name
-            else tiktoken.get_encoding("cl100k_base")
-        )
+        self.encoding_name = encoding_name(model_name)
+
+    @property
+    def _tiktoken_tokenizer(self) -> "tiktoken.Encoding":
+        return get_encoding(self.model_name)
 
     def num_tokens(self, txt: str) -> int:
         """
         Get the number of tokens in a text.
 
+        Counts of long texts are memoized by content digest and shared between all
+        tokenizers with the same encoding, so a message that is resent on every turn is
+        only encoded once.
+
         Parameters
         ----------
         txt : str
@@ -91,7 +382,18 @@ class Tokenizer:
         int
             The number of tokens in the text.
         """
-        return len(self._tiktoken_tokenizer.encode(txt))
+        if len(txt) < MEMO_MIN_CHARS:
+            return len(self._tiktoken_tokenizer.encode(txt))
+
+        digest = hashlib.blake2b(
+            txt.encode("utf-8", "surrogatepass"), digest_size=16
+        ).digest()
+        key = (self.encoding_name, digest)
+        count = _token_counts.get(key)
+        if count is None:
+            count = len(self._tiktoken_tokenizer.encode(txt))
+            _token_counts.put(key, count)
+        return count
 
     def num_tokens_for_base64_image(
         self, image_base64: str, detail: str = "high"
@@ -99,8 +401,11 @@ class Tokenizer:
         """
         Calculate the token size for a base64 encoded image based on OpenAI's token calculation rules.
 
+        The dimensions of PNG, GIF and JPEG images are read from the header in a short decoded
+        prefix, and the result is memoized per image digest.
+
         Parameters:
-        - image_base64 (str): The base64 encoded string of the image.
+        - image_base64 (str): The base64 encoded string of the image, or a data URL.
         - detail (str): The detail level of the image, 'low' or 'high'.
 
         Returns:
@@ -110,17 +415,29 @@ class Tokenizer:
         if detail == "low":
             return 85  # Fixed cost for low detail images
 
-        # Decode image from base64
-        image_data = base64.b64decode(image_base64)
+        # Accept data URLs as well as bare base64
+        if image_base64.startswith("data:"):
+            image_base64 = image_base64.split(",", 1)[-1]
+
+        # Images stay in the history, so their cost is memoized per image digest
+        key = (
+            f"image:{detail}",
+            hashlib.blake2b(
+                image_base64.encode("ascii", "ignore"), digest_size=16
+            ).digest(),
+        )
+        cached = _token_counts.get(key)
+        if cached is not None:
+            return cached
 
-        # Convert byte data to image for size extraction
-        image = Image.open(io.BytesIO(image_data))
+        # Read the dimensions from the image header rather than decoding the whole image
+        width, height = _image_size(image_base64)
 
         # Calculate the initial scale to fit within 2048 square while maintaining aspect ratio
-        max_dimension = max(image.size)
+        max_dimension = max(width, height)
         scale_factor = min(2048 / max_dimension, 1)  # Ensure we don't scale up
-        new_width = int(image.size[0] * scale_factor)
-        new_height = int(image.size[1] * scale_factor)
+        new_width = int(width * scale_factor)
+        new_height = int(height * scale_factor)
 
         # Scale such that the shortest side is 768px
         shortest_side = min(new_width, new_height)
@@ -137,6 +454,7 @@ class Tokenizer:
         # Each tile costs 170 tokens, plus a base cost of 85 tokens for high detail
         token_cost = total_tiles * 170 + 85
 
+        _token_counts.put(key, token_cost)
         return token_cost
 
     def num_tokens_from_messages(self, messages: List[Message]) -> int:
@@ -177,9 +495,21 @@ class Tokenizer:
         return n_tokens
 
 
+def _csv_value(value: object) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.4f}"
+    return str(value)
+
+
 class TokenUsageLog:
     """
     Represents a log of token usage statistics for a conversation.
+
+    Token usage reported by the provider is preferred. The local tokenizer is only a
+    fallback: it is exact for OpenAI models, but only an estimate for other models, which
+    use different tokenizers.
     """
 
     def __init__(self, model_name):
@@ -190,7 +520,14 @@ class TokenUsageLog:
         self._log = []
         self._tokenizer = Tokenizer(model_name)
 
-    def update_log(self, messages: List[Message], answer: str, step_name: str) -> None:
+    def update_log(
+        self,
+        messages: List[Message],
+        answer: str,
+        step_name: str,
+        usage: Optional[Dict[str, int]] = None,
+        timing: Optional[InferenceTiming] = None,
+    ) -> None:
         """
         Update the token usage log with the number of tokens used in the current step.
 
@@ -202,15 +539,36 @@ class TokenUsageLog:
             The answer from the AI.
         step_name : str
             The name of the step.
+        usage : Optional[Dict[str, int]], optional
+            The ``prompt_tokens`` and ``completion_tokens`` reported by the provider. The
+            tokens are counted locally when omitted.
+        timing : Optional[InferenceTiming], optional
+            The timing of the step's inference; its output tokens per second are derived
+            from the completion tokens. A cache hit is logged without any tokens, so that
+            it is not priced as spend.
         """
-        prompt_tokens = self._tokenizer.num_tokens_from_messages(messages)
-        completion_tokens = self._tokenizer.num_tokens(answer)
+        if timing is not None and timing.cache_hit:
+            prompt_tokens = completion_tokens = 0
+            usage_source = "cache"
+        elif usage and usage.get("prompt_tokens") is not None:
+            prompt_tokens = usage["prompt_tokens"]
+            completion_tokens = usage.get("completion_tokens") or 0
+            usage_source = "provider"
+        else:
+            prompt_tokens = self._tokenizer.num_tokens_from_messages(messages)
+            completion_tokens = self._tokenizer.num_tokens(answer)
+            usage_source = "local"
         total_tokens = prompt_tokens + completion_tokens
 
         self._cumulative_prompt_tokens += prompt_tokens
         self._cumulative_completion_tokens += completion_tokens
         self._cumulative_total_tokens += total_tokens
 
+        if timing is not None and not timing.cache_hit and completion_tokens:
+            generation_time = timing.latency - (timing.time_to_first_token or 0.0)
+            if generation_time > 0:
+                timing.output_tokens_per_second = completion_tokens / generation_time
+
         self._log.append(
             TokenUsage(
                 step_name=step_name,
@@ -220,6 +578,8 @@ class TokenUsageLog:
                 total_prompt_tokens=self._cumulative_prompt_tokens,
                 total_completion_tokens=self._cumulative_completion_tokens,
                 total_tokens=self._cumulative_total_tokens,
+                usage_source=usage_source,
+                timing=timing,
             )
         )
 
@@ -234,20 +594,67 @@ class TokenUsageLog:
         """
         return self._log
 
-    def format_log(self) -> str:
+    def format_log(
+        self,
+        include_source: bool = False,
+        include_timing: bool = False,
+        output_format: str = "csv",
+    ) -> str:
         """
-        Format the token usage log as a CSV string.
+        Format the token usage log as a CSV or JSON Lines string.
+
+        Parameters
+        ----------
+        include_source : bool, optional
+            Whether to add a ``usage_source`` column, by default False.
+        include_timing : bool, optional
+            Whether to add the columns of `InferenceTiming`, by default False. They are
+            empty for steps whose timing was not measured.
+        output_format : str, optional
+            ``"csv"`` (the default) or ``"jsonl"``, one JSON object per step.
 
         Returns
         -------
         str
-            The token usage log formatted as a CSV string.
+            The token usage log formatted as a CSV or JSON Lines string.
         """
-        result = "step_name,prompt_tokens_in_step,completion_tokens_in_step,total_tokens_in_step,total_prompt_tokens,total_completion_tokens,total_tokens\n"
+        if output_format == "jsonl":
+            return "".join(
+                json.dumps(self._log_record(log, include_source, include_timing)) + "\n"
+                for log in self._log
+            )
+        if output_format != "csv":
+            raise ValueError(f"Unknown token usage log format {output_format!r}")
+
+        result = "step_name,prompt_tokens_in_step,completion_tokens_in_step,total_tokens_in_step,total_prompt_tokens,total_completion_tokens,total_tokens"
+        result += ",usage_source" if include_source else ""
+        result += (
+            "".join(f",{column}" for column in TIMING_COLUMNS) if include_timing else ""
+        )
+        result += "\n"
         for log in self._log:
-            result += f"{log.step_name},{log.in_step_prompt_tokens},{log.in_step_completion_tokens},{log.in_step_total_tokens},{log.total_prompt_tokens},{log.total_completion_tokens},{log.total_tokens}\n"
+            result += f"{log.step_name},{log.in_step_prompt_tokens},{log.in_step_completion_tokens},{log.in_step_total_tokens},{log.total_prompt_tokens},{log.total_completion_tokens},{log.total_tokens}"
+            result += f",{log.usage_source}" if include_source else ""
+            if include_timing:
+                timing = asdict(log.timing) if log.timing is not None else {}
+                result += "".join(
+                    f",{_csv_value(timing.get(column))}" for column in TIMING_COLUMNS
+                )
+            result += "\n"
         return result
 
+    @staticmethod
+    def _log_record(
+        log: TokenUsage, include_source: bool, include_timing: bool
+    ) -> Dict[str, object]:
+        record = asdict(log)
+        timing = record.pop("timing")
+        if not include_source:
+            record.pop("usage_source")
+        if include_timing:
+            record.update(timing or dict.fromkeys(TIMING_COLUMNS))
+        return record
+
     def is_openai_model(self) -> bool:
         """
         Check if the model is an OpenAI model.
@@ -272,7 +679,7 @@ class TokenUsageLog:
 
     def usage_cost(self) -> float | None:
         """
-        Return the total cost in USD of the API usage.
+        Return the total cost in USD of the API usage, pricing the tokens of every step.
 
         Returns
         -------
@@ -286,10 +693,10 @@ class TokenUsageLog:
             result = 0
             for log in self.log():
                 result += get_openai_token_cost_for_model(
-                    self.model_name, log.total_prompt_tokens, is_completion=False
+                    self.model_name, log.in_step_prompt_tokens, is_completion=False
                 )
                 result += get_openai_token_cost_for_model(
-                    self.model_name, log.total_completion_tokens, is_completion=True
+                    self.model_name, log.in_step_completion_tokens, is_completion=True
                 )
             return result
         except Exception as e:
@@ -3,12 +3,50 @@ OpenRouter API wrapper for DeepSeek models with proper fallbacks.
 
 This module provides a wrapper function to interact with OpenRouter's API
 using DeepSeek and Qwen models with proper fallback handling.
+
+Models that keep failing are remembered by a per-model circuit breaker (see
+`gpt_engineer.core.circuit_breaker`) and skipped for a cooldown window, instead of every
+call starting again at the primary model.
+
+All requests share one pooled keep-alive HTTP client per process (see `OpenRouterSession`),
+so the TCP and TLS handshakes are amortized over many turns. The pool size, HTTP/2 and the
+gzip compression of large request bodies are configured with ``OPENROUTER_POOL_SIZE``,
+``OPENROUTER_HTTP2`` and ``OPENROUTER_COMPRESS_MIN_BYTES``.
+
+Optionally (``hedge=True`` or ``OPENROUTER_HEDGE=1``), calls are hedged: when a model
+has not answered within its p95 latency, the next model in the fallback chain is fired
+concurrently and the first answer wins.
 """
 
-import os
-import requests
+import asyncio
+import contextlib
+import gzip
+import importlib.util
 import json
-from typing import List, Dict, Any, Optional
+import logging
+import os
+import threading
+import time
+import weakref
+
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+from gpt_engineer.core.circuit_breaker import CircuitBreaker, circuit_breaker
+from gpt_engineer.core.context_window import ContextWindowManager
+from gpt_engineer.core.metrics import LatencyHistogram, latency_histogram
+from gpt_engineer.core.rate_limiter import (
+    Permit,
+    RateLimiter,
+    estimate_request_tokens,
+    parse_retry_after,
+    rate_limiter,
+)
+
+logger = logging.getLogger(__name__)
 
 # Model configurations with token limits
 MODELS = {
@@ -35,6 +73,32 @@ MODELS = {
 }
 
 OPENROUTER_CHAT_ENDPOINT = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_FALLBACK_KEY = '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'
+
+# Connection pooling: the number of keep-alive connections kept per process, and the size
+# from which request bodies (mostly file context) are gzip-compressed; 0 disables compression
+DEFAULT_POOL_SIZE = 10
+DEFAULT_COMPRESS_MIN_BYTES = 64 * 1024
+REQUEST_TIMEOUT = 60
+
+# Responses that count against a model's health; client errors such as 400 do not
+BREAKER_FAILURE_STATUSES = {404, 408, 429, 500, 502, 503, 504}
+
+# Hedging: the hedge delay is a model's p95 latency once this many calls have been seen,
+# clamped to [HEDGE_MIN_DELAY, HEDGE_MAX_DELAY] seconds, and HEDGE_DEFAULT_DELAY before that
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_DEFAULT_DELAY = 20.0
+HEDGE_MIN_DELAY = 2.0
+HEDGE_MAX_DELAY = 60.0
+
+# OpenRouter (OpenAI-style) roles and the LangChain message types they correspond to
+OPENROUTER_ROLES = {"ai": "assistant", "human": "user", "system": "system"}
+OPENROUTER_MESSAGE_TYPES = {
+    "assistant": AIMessage,
+    "user": HumanMessage,
+    "system": SystemMessage,
+}
 
 
 def estimate_tokens(text: str) -> int:
@@ -42,35 +106,543 @@ def estimate_tokens(text: str) -> int:
     return len(text) // 4
 
 
-def truncate_messages_if_needed(messages: List[Dict[str, str]], max_context: int) -> List[Dict[str, str]]:
-    """Truncate messages if they exceed context limit"""
-    total_tokens = sum(estimate_tokens(msg.get('content', '')) for msg in messages)
-    
-    if total_tokens <= max_context:
-        return messages
-    
-    # Keep system message and truncate from the middle
-    if len(messages) <= 2:
-        return messages
-    
-    system_msg = messages[0] if messages[0].get('role') == 'system' else None
-    user_msg = messages[-1] if messages[-1].get('role') == 'user' else None
-    
-    result = []
-    if system_msg:
-        result.append(system_msg)
-    if user_msg and user_msg != system_msg:
-        result.append(user_msg)
-    
+def truncate_messages_if_needed(
+    messages: List[Dict[str, str]], max_context: int, max_tokens: int = 0
+) -> List[Dict[str, str]]:
+    """
+    Fit messages into a model's context limit.
+
+    Token counts come from the real tokenizer, and the graded strategies of
+    `ContextWindowManager` are applied (dropping stale retries, eliding unchanged files,
+    summarizing old turns) rather than discarding everything but the first and last message.
+    """
+    manager = ContextWindowManager(
+        "openrouter", max_completion_tokens=max_tokens, context_window=max_context
+    )
+    fitted = manager.fit(
+        [
+            OPENROUTER_MESSAGE_TYPES.get(msg['role'], HumanMessage)(content=msg['content'])
+            for msg in messages
+        ]
+    )
+    return [
+        {"role": OPENROUTER_ROLES.get(msg.type, msg.type), "content": msg.content} for msg in fitted
+    ]
+
+
+def _get_api_key() -> str:
+    """Return the OpenRouter API key from the environment, or the bundled fallback key."""
+    api_key = os.getenv('OPENROUTER_KEY')
+    if not api_key:
+        # Use the provided key as fallback
+        logger.warning("OPENROUTER_KEY is not set, using the fallback OpenRouter key")
+        return OPENROUTER_FALLBACK_KEY
+    logger.info("Using the OpenRouter key from the environment")
+    return api_key
+
+
+def _build_headers(api_key: str) -> Dict[str, str]:
+    """Build the HTTP headers sent with every OpenRouter request."""
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "https://multiverse-ai.com",
+        "X-Title": "Multiverse AI Web Builder"
+    }
+
+
+class ConnectionStats:
+    """
+    Counters showing how well an `OpenRouterSession` amortizes its handshakes.
+
+    New connections and TLS handshakes are counted from httpx's ``trace`` extension, so
+    requests sent through a client without a real network transport (e.g. in tests) are
+    counted as requests only.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+        self.compressed_requests = 0
+        self.bytes_before_compression = 0
+        self.bytes_after_compression = 0
+        self._lock = threading.Lock()
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def count_compression(self, original_size: int, compressed_size: int) -> None:
+        with self._lock:
+            self.compressed_requests += 1
+            self.bytes_before_compression += original_size
+            self.bytes_after_compression += compressed_size
+
+    def trace(self, event: str, info: Dict[str, Any]) -> None:
+        """The ``trace`` extension callback of the synchronous client."""
+        with self._lock:
+            if event == "connection.connect_tcp.complete":
+                self.connections += 1
+            elif event == "connection.start_tls.complete":
+                self.tls_handshakes += 1
+
+    async def atrace(self, event: str, info: Dict[str, Any]) -> None:
+        """The ``trace`` extension callback of the asynchronous clients."""
+        self.trace(event, info)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the counters, with the number of requests that reused a connection."""
+        with self._lock:
+            reused = max(self.requests - self.connections, 0)
+            return {
+                "requests": self.requests,
+                "connections": self.connections,
+                "tls_handshakes": self.tls_handshakes,
+                "reused_connections": reused,
+                "reuse_ratio": reused / self.requests if self.requests else 0.0,
+                "compressed_requests": self.compressed_requests,
+                "bytes_saved": self.bytes_before_compression - self.bytes_after_compression,
+            }
+
+
+class OpenRouterSession:
+    """
+    The pooled keep-alive HTTP clients shared by all OpenRouter calls of a process.
+
+    The API key and headers are resolved once. Synchronous calls share one `httpx.Client`;
+    asynchronous calls share one `httpx.AsyncClient` per event loop, since connections
+    cannot move between loops. Request bodies of at least `compress_min_bytes` are sent
+    gzip-compressed; if the server rejects a compressed body, it is resent uncompressed
+    and compression is switched off for the session.
+
+    Attributes
+    ----------
+    api_key : str
+        The OpenRouter API key.
+    headers : Dict[str, str]
+        The headers sent with every request.
+    endpoint : str
+        The chat completions endpoint.
+    pool_size : int
+        The maximum number of (keep-alive) connections per client.
+    http2 : bool
+        Whether HTTP/2 is negotiated; requires the ``h2`` package.
+    compress_min_bytes : int
+        The body size from which requests are compressed; 0 disables compression.
+    stats : ConnectionStats
+        The connection reuse statistics.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        endpoint: str = OPENROUTER_CHAT_ENDPOINT,
+        pool_size: Optional[int] = None,
+        http2: Optional[bool] = None,
+        compress_min_bytes: Optional[int] = None
+    ):
+        self.api_key = api_key or _get_api_key()
+        self.headers = _build_headers(self.api_key)
+        self.endpoint = endpoint
+        self.pool_size = pool_size or int(os.getenv('OPENROUTER_POOL_SIZE', DEFAULT_POOL_SIZE))
+        if http2 is None:
+            http2 = os.getenv('OPENROUTER_HTTP2', '').lower() in ('1', 'true', 'yes')
+        if http2 and importlib.util.find_spec('h2') is None:
+            logger.warning("HTTP/2 needs the 'h2' package (pip install httpx[http2]), using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        if compress_min_bytes is None:
+            compress_min_bytes = int(os.getenv('OPENROUTER_COMPRESS_MIN_BYTES', DEFAULT_COMPRESS_MIN_BYTES))
+        self.compress_min_bytes = compress_min_bytes
+        self.stats = ConnectionStats()
+        self._client: Optional[httpx.Client] = None
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    def _client_options(self) -> Dict[str, Any]:
+        return {
+            "http2": self.http2,
+            "timeout": REQUEST_TIMEOUT,
+            "limits": httpx.Limits(
+                max_connections=self.pool_size, max_keepalive_connections=self.pool_size
+            ),
+        }
+
+    @property
+    def client(self) -> httpx.Client:
+        """The pooled synchronous client, created on first use."""
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(**self._client_options())
+            return self._client
+
+    def async_client(self) -> httpx.AsyncClient:
+        """Return the pooled asynchronous client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(**self._client_options())
+                self._async_clients[loop] = client
+            return client
+
+    def encode(self, payload: Dict[str, Any], compress: bool = True) -> Tuple[bytes, Dict[str, str]]:
+        """Serialize a payload, compressing it when it is large; return the body and headers."""
+        body = json.dumps(payload).encode("utf-8")
+        if not compress or not self.compress_min_bytes or len(body) < self.compress_min_bytes:
+            return body, self.headers
+        compressed = gzip.compress(body, compresslevel=6)
+        self.stats.count_compression(len(body), len(compressed))
+        return compressed, {**self.headers, "Content-Encoding": "gzip"}
+
+    def _request_options(self, payload: Dict[str, Any], trace, compress: bool = True) -> Dict[str, Any]:
+        body, headers = self.encode(payload, compress)
+        self.stats.count_request()
+        return {
+            "content": body,
+            "headers": headers,
+            "timeout": REQUEST_TIMEOUT,
+            "extensions": {"trace": trace},
+        }
+
+    def _compression_rejected(self, options: Dict[str, Any], response: httpx.Response) -> bool:
+        # Servers answer 415 (or a plain 400) to a Content-Encoding they do not accept
+        if "Content-Encoding" not in options["headers"] or response.status_code not in (400, 415):
+            return False
+        logger.warning(
+            "OpenRouter rejected a compressed request (HTTP %d), disabling request compression",
+            response.status_code,
+        )
+        self.compress_min_bytes = 0
+        return True
+
+    def post(self, payload: Dict[str, Any]) -> httpx.Response:
+        """Send a chat completion request and return the response."""
+        options = self._request_options(payload, self.stats.trace)
+        response = self.client.post(self.endpoint, **options)
+        if self._compression_rejected(options, response):
+            response = self.client.post(self.endpoint, **self._request_options(payload, self.stats.trace, False))
+        return response
+
+    async def apost(self, payload: Dict[str, Any], client: Optional[httpx.AsyncClient] = None) -> httpx.Response:
+        """Asynchronous variant of `post`, optionally sent through a caller-provided client."""
+        client = client or self.async_client()
+        options = self._request_options(payload, self.stats.atrace)
+        response = await client.post(self.endpoint, **options)
+        if self._compression_rejected(options, response):
+            response = await client.post(self.endpoint, **self._request_options(payload, self.stats.atrace, False))
+        return response
+
+    @contextlib.contextmanager
+    def stream(self, payload: Dict[str, Any]) -> Iterator[httpx.Response]:
+        """Send a streaming chat completion request; the response body is read lazily."""
+        options = self._request_options(payload, self.stats.trace)
+        with self.client.stream("POST", self.endpoint, **options) as response:
+            if not self._compression_rejected(options, response):
+                yield response
+                return
+        options = self._request_options(payload, self.stats.trace, False)
+        with self.client.stream("POST", self.endpoint, **options) as response:
+            yield response
+
+    @contextlib.asynccontextmanager
+    async def astream(
+        self, payload: Dict[str, Any], client: Optional[httpx.AsyncClient] = None
+    ) -> AsyncIterator[httpx.Response]:
+        """Asynchronous variant of `stream`."""
+        client = client or self.async_client()
+        options = self._request_options(payload, self.stats.atrace)
+        async with client.stream("POST", self.endpoint, **options) as response:
+            if not self._compression_rejected(options, response):
+                yield response
+                return
+        options = self._request_options(payload, self.stats.atrace, False)
+        async with client.stream("POST", self.endpoint, **options) as response:
+            yield response
+
+    def close(self) -> None:
+        """
+        Close the synchronous client and the client of the background loop of hedged calls;
+        other asynchronous clients close with their event loop.
+        """
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+            loop = _hedge_loop
+            client = self._async_clients.pop(loop, None) if loop is not None else None
+        if client is not None and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+
+_session: Optional[OpenRouterSession] = None
+_session_lock = threading.Lock()
+
+
+def openrouter_session() -> OpenRouterSession:
+    """Return the process-wide `OpenRouterSession`, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = OpenRouterSession()
+        return _session
+
+
+def configure_openrouter_session(**options) -> OpenRouterSession:
+    """
+    Replace the process-wide `OpenRouterSession`, e.g. to change its pool size.
+
+    The keyword arguments are those of `OpenRouterSession`; the previous session is closed.
+    """
+    global _session
+    with _session_lock:
+        previous, _session = _session, OpenRouterSession(**options)
+    if previous is not None:
+        previous.close()
+    return _session
+
+
+def openrouter_connection_stats() -> Dict[str, Any]:
+    """Return the connection reuse statistics of the process-wide session."""
+    return openrouter_session().stats.snapshot()
+
+
+def _model_order(is_reasoning: bool) -> List[str]:
+    """Determine the fallback chain of model keys based on task type."""
+    if is_reasoning:
+        return ['primary', 'reasoning_fallback', 'final_fallback']
+    return ['primary', 'coding_fallback', 'final_fallback']
+
+
+def _build_payload(
+    model_config: Dict[str, Any],
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float
+) -> Dict[str, Any]:
+    """Build the request payload for one model, truncating messages to its context limit."""
+    # Truncate messages if needed for this model's context limit
+    truncated_messages = truncate_messages_if_needed(
+        messages, model_config['context_limit'], min(max_tokens, model_config['max_tokens'])
+    )
+
+    return {
+        "model": model_config['name'],
+        "messages": truncated_messages,
+        "max_tokens": min(max_tokens, model_config['max_tokens']),
+        "temperature": temperature,
+        "top_p": 0.9,
+        "frequency_penalty": 0,
+        "presence_penalty": 0
+    }
+
+
+def _annotate_result(result: Dict[str, Any], model_config: Dict[str, Any], attempt: int) -> Dict[str, Any]:
+    """Attach the '_used_model', '_fallback_used' and '_attempt' fields to a successful response."""
+    result['_used_model'] = model_config['name']
+    result['_fallback_used'] = attempt > 0
+    result['_attempt'] = attempt + 1
+
+    if attempt > 0:
+        print(f"⚠️  Used fallback model: {model_config['name']}")
+    else:
+        print(f"✅ Successfully used primary model: {model_config['name']}")
+
     return result
 
 
+def _status_error(model_config: Dict[str, Any], status_code: int, text: str) -> str:
+    """Describe a non-200 response from OpenRouter."""
+    # Handle specific error codes
+    if status_code in [404, 429, 503, 502]:
+        error_msg = f"Model {model_config['name']} unavailable (HTTP {status_code})"
+        print(f"⚠️  {error_msg}")
+    else:
+        error_msg = f"HTTP {status_code}: {text}"
+        print(f"❌ {error_msg}")
+    return error_msg
+
+
+def _model_rate_limiter(model_config: Dict[str, Any], api_key: str) -> RateLimiter:
+    """Return the rate limiter of one model; OpenRouter limits and cools down each model separately."""
+    return rate_limiter("openrouter", api_key, scope=model_config['name'])
+
+
+def _model_breaker(model_config: Dict[str, Any]) -> CircuitBreaker:
+    """Return the circuit breaker that remembers whether a model is healthy."""
+    return circuit_breaker(f"openrouter:{model_config['name']}")
+
+
+def _skip_model(model_config: Dict[str, Any], api_key: str, is_last: bool) -> Optional[str]:
+    """
+    Return an error message if a model should be skipped in favour of the next fallback.
+
+    A model is skipped while it is cooling down after a 429 or while its circuit is open;
+    the last model of the chain is always tried.
+    """
+    if is_last:
+        return None
+    remaining = _model_rate_limiter(model_config, api_key).cooldown_remaining()
+    if remaining:
+        error_msg = f"Model {model_config['name']} rate limited for another {remaining:.0f}s"
+        print(f"⏳ {error_msg}")
+        return error_msg
+    breaker = _model_breaker(model_config)
+    if not breaker.allow_request():
+        error_msg = (
+            f"Model {model_config['name']} skipped after repeated failures"
+            f" (next probe in {breaker.remaining_cooldown():.0f}s)"
+        )
+        print(f"⏭️  {error_msg}")
+        return error_msg
+    return None
+
+
+def _record_outcome(
+    model_config: Dict[str, Any],
+    permit: Permit,
+    status_code: int,
+    headers: Any,
+    usage: Optional[Dict[str, Any]] = None
+) -> None:
+    """Record the outcome of an OpenRouter response on its rate limiter permit and circuit breaker."""
+    permit.succeeded = status_code == 200
+    if status_code == 429:
+        permit.rate_limited = True
+        permit.retry_after = parse_retry_after(headers.get('Retry-After'))
+    if usage:
+        permit.tokens_used = usage.get('total_tokens')
+
+    if status_code == 200:
+        _model_breaker(model_config).record_success()
+    elif status_code in BREAKER_FAILURE_STATUSES:
+        _model_breaker(model_config).record_failure()
+
+
+def _model_latency(model_config: Dict[str, Any]) -> LatencyHistogram:
+    """Return the latency histogram of one model's successful calls."""
+    return latency_histogram(f"openrouter:{model_config['name']}")
+
+
+def _hedge_delay(model_config: Dict[str, Any], hedge_delay: Optional[float] = None) -> float:
+    """
+    Return how long to wait for a model before hedging with the next one.
+
+    Unless a fixed delay is given, this is the model's p95 latency once enough calls have
+    been observed, clamped to a sensible range, and a default delay before that.
+    """
+    if hedge_delay is not None:
+        return hedge_delay
+    histogram = _model_latency(model_config)
+    if histogram.count < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    p95 = histogram.percentile(HEDGE_PERCENTILE)
+    return min(max(p95, HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
+
+
+def _hedging_enabled(hedge: Optional[bool]) -> bool:
+    """Resolve the hedge flag, defaulting to the ``OPENROUTER_HEDGE`` environment variable."""
+    if hedge is not None:
+        return hedge
+    return os.getenv('OPENROUTER_HEDGE', '').lower() in ('1', 'true', 'yes')
+
+
+def _call_model(
+    session: OpenRouterSession,
+    model_config: Dict[str, Any],
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Call one model; return its response, or None and the error message."""
+    limiter = _model_rate_limiter(model_config, session.api_key)
+    payload = _build_payload(model_config, messages, max_tokens, temperature)
+
+    try:
+        with limiter.request(estimate_request_tokens(payload['messages'], payload['max_tokens'])) as permit:
+            start = time.perf_counter()
+            response = session.post(payload)
+            result = response.json() if response.status_code == 200 else None
+            _record_outcome(model_config, permit, response.status_code, response.headers, (result or {}).get('usage'))
+
+        if result is not None:
+            _model_latency(model_config).observe(time.perf_counter() - start)
+            return result, None
+
+        return None, _status_error(model_config, response.status_code, response.text)
+
+    except httpx.TimeoutException:
+        error_msg = f"Timeout with model {model_config['name']}"
+        print(f"⏰ {error_msg}")
+        _model_breaker(model_config).record_failure()
+        return None, error_msg
+    except httpx.HTTPError as e:
+        error_msg = f"Request failed with {model_config['name']}: {str(e)}"
+        print(f"❌ {error_msg}")
+        _model_breaker(model_config).record_failure()
+        return None, error_msg
+    except ValueError as e:
+        # A successful status whose body is not valid JSON
+        error_msg = f"Invalid response from {model_config['name']}: {str(e)}"
+        print(f"❌ {error_msg}")
+        _model_breaker(model_config).record_failure()
+        return None, error_msg
+
+
+async def _acall_model(
+    session: OpenRouterSession,
+    client: Optional[httpx.AsyncClient],
+    model_config: Dict[str, Any],
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Asynchronous variant of `_call_model`."""
+    limiter = _model_rate_limiter(model_config, session.api_key)
+    payload = _build_payload(model_config, messages, max_tokens, temperature)
+
+    try:
+        async with limiter.arequest(estimate_request_tokens(payload['messages'], payload['max_tokens'])) as permit:
+            start = time.perf_counter()
+            response = await session.apost(payload, client)
+            result = response.json() if response.status_code == 200 else None
+            _record_outcome(model_config, permit, response.status_code, response.headers, (result or {}).get('usage'))
+
+        if result is not None:
+            _model_latency(model_config).observe(time.perf_counter() - start)
+            return result, None
+
+        return None, _status_error(model_config, response.status_code, response.text)
+
+    except httpx.TimeoutException:
+        error_msg = f"Timeout with model {model_config['name']}"
+        print(f"⏰ {error_msg}")
+        _model_breaker(model_config).record_failure()
+        return None, error_msg
+    except httpx.HTTPError as e:
+        error_msg = f"Request failed with {model_config['name']}: {str(e)}"
+        print(f"❌ {error_msg}")
+        _model_breaker(model_config).record_failure()
+        return None, error_msg
+    except ValueError as e:
+        # A successful status whose body is not valid JSON
+        error_msg = f"Invalid response from {model_config['name']}: {str(e)}"
+        print(f"❌ {error_msg}")
+        _model_breaker(model_config).record_failure()
+        return None, error_msg
+
+
 def call_openrouter(
     messages: List[Dict[str, str]], 
     model_type: str = 'primary',
     max_tokens: int = 1800,
     temperature: float = 0.1,
-    is_reasoning: bool = False
+    is_reasoning: bool = False,
+    hedge: Optional[bool] = None,
+    hedge_delay: Optional[float] = None
 ) -> Dict[str, Any]:
     """
     Call OpenRouter API with DeepSeek/Qwen models and fallback handling.
@@ -87,6 +659,12 @@ def call_openrouter(
         Temperature for generation
     is_reasoning : bool
         Whether this is for reasoning (affects model selection)
+    hedge : Optional[bool]
+        Whether to hedge slow models by firing the next model in the fallback chain
+        concurrently (see `acall_openrouter`). Defaults to the ``OPENROUTER_HEDGE``
+        environment variable.
+    hedge_delay : Optional[float]
+        A fixed hedge delay in seconds, instead of one derived from each model's p95 latency.
         
     Returns
     -------
@@ -98,97 +676,419 @@ def call_openrouter(
     Exception
         If all models fail
     """
-    
-    # Get API key from environment
-    api_key = os.getenv('OPENROUTER_KEY')
-    if not api_key:
-        # Use the provided key as fallback
-        api_key = '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'
-        print("⚠️  Using fallback OpenRouter key")
-    else:
-        print("✅ Using environment OpenRouter key")
+    if _hedging_enabled(hedge):
+        # Hedged calls need cancellable concurrent requests, which the async client provides
+        return _run_coroutine(
+            acall_openrouter(
+                messages,
+                model_type=model_type,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                is_reasoning=is_reasoning,
+                hedge=True,
+                hedge_delay=hedge_delay
+            )
+        )
+
+    session = openrouter_session()
     
     # Ensure max_tokens doesn't exceed limit
     max_tokens = min(max_tokens, 1800)
     
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "https://multiverse-ai.com",
-        "X-Title": "Multiverse AI Web Builder"
-    }
+    model_order = _model_order(is_reasoning)
+    last_error = None
     
-    # Determine model order based on task type
-    if is_reasoning:
-        model_order = ['primary', 'reasoning_fallback', 'final_fallback']
-    else:
-        model_order = ['primary', 'coding_fallback', 'final_fallback']
+    for i, model_key in enumerate(model_order):
+        model_config = MODELS[model_key]
+        skipped = _skip_model(model_config, session.api_key, i == len(model_order) - 1)
+        if skipped:
+            last_error = skipped
+            continue
+
+        print(f"🤖 Trying model: {model_config['name']} (attempt {i+1}/{len(model_order)})")
+        result, last_error = _call_model(
+            session, model_config, messages, max_tokens, temperature
+        )
+        if result is not None:
+            return _annotate_result(result, model_config, i)
     
+    # If we get here, all models failed
+    raise Exception(f"All models failed. Last error: {last_error}")
+
+
+_hedge_loop: Optional[asyncio.AbstractEventLoop] = None
+_hedge_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Return the long-lived event loop that runs the hedged calls of synchronous callers."""
+    global _hedge_loop
+    with _hedge_loop_lock:
+        if _hedge_loop is None or _hedge_loop.is_closed():
+            _hedge_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_hedge_loop.run_forever, name="openrouter-hedge", daemon=True
+            ).start()
+        return _hedge_loop
+
+
+def _run_coroutine(coroutine):
+    """
+    Run a coroutine to completion from synchronous code, even inside a running event loop.
+
+    Every coroutine runs on the same background loop, so they all share its pooled
+    `httpx.AsyncClient` instead of each opening (and leaking) a client of its own.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, _background_loop()).result()
+
+
+async def acall_openrouter(
+    messages: List[Dict[str, str]],
+    model_type: str = 'primary',
+    max_tokens: int = 1800,
+    temperature: float = 0.1,
+    is_reasoning: bool = False,
+    client: Optional[httpx.AsyncClient] = None,
+    hedge: Optional[bool] = None,
+    hedge_delay: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Asynchronous variant of `call_openrouter` built on `httpx.AsyncClient`.
+
+    The fallback chain, payloads and returned fields are identical to `call_openrouter`,
+    but the request does not block the event loop, so many conversations can be in flight
+    at once.
+
+    With hedging, a model that has not answered within its hedge delay (by default its
+    p95 latency) does not hold up the chain: the next model is fired concurrently, the
+    first successful answer wins and the other requests are cancelled.
+
+    Parameters
+    ----------
+    messages : List[Dict[str, str]]
+        List of message dictionaries with 'role' and 'content' keys
+    model_type : str
+        Type of model to use ('primary', 'reasoning_fallback', 'coding_fallback', 'final_fallback')
+    max_tokens : int
+        Maximum tokens to generate (capped at 1800)
+    temperature : float
+        Temperature for generation
+    is_reasoning : bool
+        Whether this is for reasoning (affects model selection)
+    client : Optional[httpx.AsyncClient]
+        Client to send the requests with. The pooled client of the process-wide
+        `OpenRouterSession` is used when omitted.
+    hedge : Optional[bool]
+        Whether to hedge slow models. Defaults to the ``OPENROUTER_HEDGE`` environment variable.
+    hedge_delay : Optional[float]
+        A fixed hedge delay in seconds, instead of one derived from each model's p95 latency.
+
+    Returns
+    -------
+    Dict[str, Any]
+        API response with additional '_used_model' and '_fallback_used' fields
+
+    Raises
+    ------
+    Exception
+        If all models fail
+    """
+    session = openrouter_session()
+    max_tokens = min(max_tokens, 1800)
+
+    model_order = _model_order(is_reasoning)
+
+    if _hedging_enabled(hedge):
+        return await _ahedged_call(
+            session, client, model_order, messages, max_tokens, temperature, hedge_delay
+        )
+
     last_error = None
-    
+
     for i, model_key in enumerate(model_order):
         model_config = MODELS[model_key]
-        
-        # Truncate messages if needed for this model's context limit
-        truncated_messages = truncate_messages_if_needed(messages, model_config['context_limit'])
-        
-        payload = {
-            "model": model_config['name'],
-            "messages": truncated_messages,
-            "max_tokens": min(max_tokens, model_config['max_tokens']),
-            "temperature": temperature,
-            "top_p": 0.9,
-            "frequency_penalty": 0,
-            "presence_penalty": 0
-        }
-        
-        try:
+        skipped = _skip_model(model_config, session.api_key, i == len(model_order) - 1)
+        if skipped:
+            last_error = skipped
+            continue
+
+        print(f"🤖 Trying model: {model_config['name']} (attempt {i+1}/{len(model_order)})")
+        result, last_error = await _acall_model(
+            session, client, model_config, messages, max_tokens, temperature
+        )
+        if result is not None:
+            return _annotate_result(result, model_config, i)
+
+    # If we get here, all models failed
+    raise Exception(f"All models failed. Last error: {last_error}")
+
+
+async def _ahedged_call(
+    session: OpenRouterSession,
+    client: Optional[httpx.AsyncClient],
+    model_order: List[str],
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    hedge_delay: Optional[float]
+) -> Dict[str, Any]:
+    """Walk the fallback chain, starting the next model whenever the running ones are slow or fail."""
+    pending: Dict[asyncio.Task, Tuple[int, Dict[str, Any]]] = {}
+    next_index = 0
+    last_error = None
+
+    def launch_next() -> None:
+        nonlocal next_index, last_error
+        while next_index < len(model_order):
+            i = next_index
+            next_index += 1
+            model_config = MODELS[model_order[i]]
+            skipped = _skip_model(model_config, session.api_key, i == len(model_order) - 1)
+            if skipped:
+                last_error = skipped
+                continue
             print(f"🤖 Trying model: {model_config['name']} (attempt {i+1}/{len(model_order)})")
-            
-            response = requests.post(
-                OPENROUTER_CHAT_ENDPOINT,
-                headers=headers,
-                data=json.dumps(payload),
-                timeout=60
+            task = asyncio.ensure_future(
+                _acall_model(session, client, model_config, messages, max_tokens, temperature)
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                result['_used_model'] = model_config['name']
-                result['_fallback_used'] = i > 0
-                result['_attempt'] = i + 1
-                
-                if i > 0:
-                    print(f"⚠️  Used fallback model: {model_config['name']}")
-                else:
-                    print(f"✅ Successfully used primary model: {model_config['name']}")
-                
-                return result
-            
-            # Handle specific error codes
-            if response.status_code in [404, 429, 503, 502]:
-                error_msg = f"Model {model_config['name']} unavailable (HTTP {response.status_code})"
-                print(f"⚠️  {error_msg}")
-                last_error = error_msg
-                continue
-            else:
-                error_msg = f"HTTP {response.status_code}: {response.text}"
-                print(f"❌ {error_msg}")
-                last_error = error_msg
+            pending[task] = (i, model_config)
+            return
+
+    launch_next()
+    try:
+        while pending:
+            # Wait for the newest request's hedge delay, unless there is nothing left to hedge with
+            delay = None
+            if next_index < len(model_order):
+                newest_config = list(pending.values())[-1][1]
+                delay = _hedge_delay(newest_config, hedge_delay)
+
+            done, _ = await asyncio.wait(
+                pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                print(f"⏱️  No answer within {delay:.1f}s, hedging with the next model")
+                launch_next()
                 continue
-                
-        except requests.exceptions.Timeout:
-            error_msg = f"Timeout with model {model_config['name']}"
-            print(f"⏰ {error_msg}")
-            last_error = error_msg
+
+            for task in done:
+                i, model_config = pending.pop(task)
+                result, error = task.result()
+                if result is not None:
+                    return _annotate_result(result, model_config, i)
+                last_error = error
+
+            if not pending:
+                launch_next()
+    finally:
+        # Cancel the requests that lost the race
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    raise Exception(f"All models failed. Last error: {last_error}")
+
+
+class OpenRouterStreamError(Exception):
+    """An error event or a malformed event in an OpenRouter server-sent event stream."""
+
+
+def _parse_sse_line(line: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse one line of an OpenRouter server-sent event stream.
+
+    Returns the decoded JSON event, an empty dict for the final ``[DONE]`` marker, or None
+    for blank lines, keep-alive comments and other non-data lines. Raises `OpenRouterStreamError`
+    for error events and events that are not valid JSON objects.
+    """
+    if not line or not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return {}
+    try:
+        event = json.loads(data)
+    except ValueError as e:
+        raise OpenRouterStreamError(f"OpenRouter stream error: malformed event {data[:200]!r}") from e
+    if not isinstance(event, dict):
+        raise OpenRouterStreamError(f"OpenRouter stream error: unexpected event {data[:200]!r}")
+    if "error" in event:
+        raise OpenRouterStreamError(f"OpenRouter stream error: {event['error']}")
+    return event
+
+
+def _stream_delta(event: Dict[str, Any], info: Dict[str, Any]) -> str:
+    """Extract the text delta of a stream event and record any usage it reports in `info`."""
+    if event.get("usage"):
+        info["usage"] = event["usage"]
+    choices = event.get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or ""
+
+
+def stream_openrouter(
+    messages: List[Dict[str, str]],
+    max_tokens: int = 1800,
+    temperature: float = 0.1,
+    is_reasoning: bool = False,
+    info: Optional[Dict[str, Any]] = None
+) -> Iterator[str]:
+    """
+    Stream a completion from OpenRouter as text chunks, using server-sent events.
+
+    The fallback chain is the same as for `call_openrouter`, but a model is only abandoned
+    before it has produced any output: connection errors, error events and malformed events
+    before the first chunk move on to the next model, while once the first chunk has been
+    yielded, errors are raised to the caller.
+
+    Parameters
+    ----------
+    messages : List[Dict[str, str]]
+        List of message dictionaries with 'role' and 'content' keys
+    max_tokens : int
+        Maximum tokens to generate (capped at 1800)
+    temperature : float
+        Temperature for generation
+    is_reasoning : bool
+        Whether this is for reasoning (affects model selection)
+    info : Optional[Dict[str, Any]]
+        If given, filled with the '_used_model', '_fallback_used' and '_attempt' fields once
+        a model has produced output, and the provider-reported 'usage', if any.
+
+    Yields
+    ------
+    str
+        The text chunks of the completion as they arrive.
+
+    Raises
+    ------
+    Exception
+        If all models fail before producing output
+    """
+    info = info if info is not None else {}
+    session = openrouter_session()
+    max_tokens = min(max_tokens, 1800)
+    model_order = _model_order(is_reasoning)
+    last_error = None
+
+    for i, model_key in enumerate(model_order):
+        model_config = MODELS[model_key]
+        skipped = _skip_model(model_config, session.api_key, i == len(model_order) - 1)
+        limiter = _model_rate_limiter(model_config, session.api_key)
+        if skipped:
+            last_error = skipped
             continue
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Request failed with {model_config['name']}: {str(e)}"
-            print(f"❌ {error_msg}")
-            last_error = error_msg
+        payload = _build_payload(model_config, messages, max_tokens, temperature)
+        payload["stream"] = True
+        started = False
+
+        print(f"🤖 Streaming from model: {model_config['name']} (attempt {i+1}/{len(model_order)})")
+        try:
+            with limiter.request(
+                estimate_request_tokens(payload['messages'], payload['max_tokens'])
+            ) as permit, session.stream(payload) as response:
+                if response.status_code != 200:
+                    _record_outcome(model_config, permit, response.status_code, response.headers)
+                    text = response.read().decode("utf-8", "replace")
+                    last_error = _status_error(model_config, response.status_code, text)
+                    continue
+
+                for line in response.iter_lines():
+                    event = _parse_sse_line(line)
+                    if event is None:
+                        continue
+                    if not event:
+                        break
+                    delta = _stream_delta(event, info)
+                    if delta:
+                        if not started:
+                            # The model is committed to once it has produced output
+                            started = True
+                            _annotate_result(info, model_config, i)
+                        yield delta
+                if not started:
+                    _annotate_result(info, model_config, i)
+                _record_outcome(model_config, permit, response.status_code, response.headers, info.get("usage"))
+                return
+        except (httpx.HTTPError, OpenRouterStreamError) as e:
+            if started:
+                raise
+            _model_breaker(model_config).record_failure()
+            last_error = f"Request failed with {model_config['name']}: {str(e)}"
+            print(f"❌ {last_error}")
             continue
-    
-    # If we get here, all models failed
+
+    raise Exception(f"All models failed. Last error: {last_error}")
+
+
+async def astream_openrouter(
+    messages: List[Dict[str, str]],
+    max_tokens: int = 1800,
+    temperature: float = 0.1,
+    is_reasoning: bool = False,
+    info: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[str]:
+    """
+    Asynchronous variant of `stream_openrouter` built on the pooled `httpx.AsyncClient`.
+
+    Yields
+    ------
+    str
+        The text chunks of the completion as they arrive.
+    """
+    info = info if info is not None else {}
+    session = openrouter_session()
+    max_tokens = min(max_tokens, 1800)
+    model_order = _model_order(is_reasoning)
+    last_error = None
+
+    for i, model_key in enumerate(model_order):
+        model_config = MODELS[model_key]
+        skipped = _skip_model(model_config, session.api_key, i == len(model_order) - 1)
+        limiter = _model_rate_limiter(model_config, session.api_key)
+        if skipped:
+            last_error = skipped
+            continue
+        payload = _build_payload(model_config, messages, max_tokens, temperature)
+        payload["stream"] = True
+        started = False
+
+        print(f"🤖 Streaming from model: {model_config['name']} (attempt {i+1}/{len(model_order)})")
+        try:
+            async with limiter.arequest(
+                estimate_request_tokens(payload['messages'], payload['max_tokens'])
+            ) as permit, session.astream(payload) as response:
+                if response.status_code != 200:
+                    _record_outcome(model_config, permit, response.status_code, response.headers)
+                    text = (await response.aread()).decode("utf-8", "replace")
+                    last_error = _status_error(model_config, response.status_code, text)
+                    continue
+
+                async for line in response.aiter_lines():
+                    event = _parse_sse_line(line)
+                    if event is None:
+                        continue
+                    if not event:
+                        break
+                    delta = _stream_delta(event, info)
+                    if delta:
+                        if not started:
+                            # The model is committed to once it has produced output
+                            started = True
+                            _annotate_result(info, model_config, i)
+                        yield delta
+                if not started:
+                    _annotate_result(info, model_config, i)
+                _record_outcome(model_config, permit, response.status_code, response.headers, info.get("usage"))
+                return
+        except (httpx.HTTPError, OpenRouterStreamError) as e:
+            if started:
+                raise
+            _model_breaker(model_config).record_failure()
+            last_error = f"Request failed with {model_config['name']}: {str(e)}"
+            print(f"❌ {last_error}")
+            continue
+
     raise Exception(f"All models failed. Last error: {last_error}")
 
 
@@ -202,6 +1102,16 @@ def call_openrouter_coding(messages: List[Dict[str, str]], **kwargs) -> Dict[str
     return call_openrouter(messages, is_reasoning=False, **kwargs)
 
 
+async def acall_openrouter_reasoning(messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+    """Async wrapper for reasoning tasks"""
+    return await acall_openrouter(messages, is_reasoning=True, **kwargs)
+
+
+async def acall_openrouter_coding(messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+    """Async wrapper for coding tasks"""
+    return await acall_openrouter(messages, is_reasoning=False, **kwargs)
+
+
 def test_openrouter_connection():
     """
     Test the OpenRouter connection with all models.
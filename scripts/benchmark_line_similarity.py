@@ -0,0 +1,95 @@
+"""
+Microbenchmark of the line similarity kernel used to validate diffs.
+
+A synthetic file is compared line-against-all-lines (as when searching for the start of
+a hunk) and block-against-block (as the forward blocks of `Hunk.validate_lines`), once
+with `count_ratio` per pair, once with the NumPy kernel of `LineHistograms` and once with
+its pure-Python fallback. The results of all three are checked to be identical.
+"""
+
+import random
+import time
+
+import typer
+
+from gpt_engineer.core.diff import LineHistograms, count_ratio, normalize_line
+
+app = typer.Typer()
+
+
+def make_lines(n_lines: int) -> list:
+    """Return the lines of a synthetic source file."""
+    rng = random.Random(0)
+    words = ["value", "result", "index", "config", "items", "return", "self", "data"]
+    return [
+        "    " * rng.randint(0, 3)
+        + " ".join(rng.choice(words) for _ in range(rng.randint(1, 6)))
+        + f" = {rng.randint(0, 9999)}"
+        for _ in range(n_lines)
+    ]
+
+
+def timed(fn) -> tuple:
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+@app.command()
+def main(
+    lines: int = typer.Option(20000, help="Lines in the synthetic file."),
+    queries: int = typer.Option(20, help="Lines compared against the whole file."),
+    blocks: int = typer.Option(2000, help="Block-against-block comparisons."),
+    block_len: int = typer.Option(10, help="Lines per block."),
+):
+    """Print the time of each similarity path and the speedup of the NumPy kernel."""
+    file_lines = make_lines(lines)
+    normalized = [normalize_line(line) for line in file_lines]
+    rng = random.Random(1)
+    query_lines = rng.sample(file_lines, queries)
+    starts = [rng.randrange(lines - block_len) for _ in range(blocks)]
+    texts = ["\n".join(rng.sample(file_lines, block_len)) for _ in range(blocks)]
+
+    build_time, numpy_kernel = timed(lambda: LineHistograms(normalized, True))
+    python_kernel = LineHistograms(normalized, False)
+    print(f"{lines} lines, histograms built in {build_time * 1000:.1f} ms\n")
+
+    def line_vs_file(kernel):
+        if kernel is None:
+            return lambda: [
+                [count_ratio(query, line) for line in file_lines]
+                for query in query_lines
+            ]
+        return lambda: [kernel.ratios(query) for query in query_lines]
+
+    def block_vs_block(kernel):
+        if kernel is None:
+            return lambda: [
+                count_ratio(text, "\n".join(file_lines[start : start + block_len]))
+                for text, start in zip(texts, starts)
+            ]
+        return lambda: [
+            kernel.block_ratio(text, start, start + block_len)
+            for text, start in zip(texts, starts)
+        ]
+
+    print(
+        f"{'comparison':<15} {'count_ratio (ms)':>17} {'numpy (ms)':>11}"
+        f" {'fallback (ms)':>14} {'speedup':>8}"
+    )
+    for name, workload in [
+        ("line vs file", line_vs_file),
+        ("block vs block", block_vs_block),
+    ]:
+        reference_time, reference = timed(workload(None))
+        numpy_time, numpy_result = timed(workload(numpy_kernel))
+        python_time, python_result = timed(workload(python_kernel))
+        assert reference == numpy_result == python_result
+        print(
+            f"{name:<15} {reference_time * 1000:>17.1f} {numpy_time * 1000:>11.1f}"
+            f" {python_time * 1000:>14.1f} {reference_time / numpy_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,72 @@
+"""
+Benchmark of the tokenizer time spent per step by `TokenUsageLog.update_log`.
+
+A conversation with a large file listing (about 100k tokens by default) is grown by one
+retry turn per step, as in the improve loop, and the time spent counting tokens is printed
+for every step, once with the memoized token counts and once with the memo cleared before
+every step (i.e. re-encoding the whole history, as before the memo existed).
+"""
+
+import random
+import time
+
+import typer
+
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+from gpt_engineer.core.token_usage import TokenUsageLog, clear_token_count_cache
+
+app = typer.Typer()
+
+
+def make_file_listing(n_lines: int) -> str:
+    """Return a synthetic numbered file listing, like `FilesDict.to_chat` produces."""
+    rng = random.Random(0)
+    words = ["value", "result", "index", "config", "items", "return", "self", "data"]
+    lines = [
+        f"{i} {' '.join(rng.choice(words) for _ in range(8))} = {rng.randint(0, 9999)}"
+        for i in range(1, n_lines + 1)
+    ]
+    return "File: main.py\n" + "\n".join(lines) + "\n"
+
+
+def time_steps(files: str, steps: int, memoized: bool) -> list:
+    """Return the seconds spent in `update_log` for every step of a growing conversation."""
+    log = TokenUsageLog("gpt-4")
+    messages = [SystemMessage(content="system prompt"), HumanMessage(content=files)]
+    timings = []
+    clear_token_count_cache()
+    for step in range(steps):
+        if not memoized:
+            clear_token_count_cache()
+        start = time.perf_counter()
+        log.update_log(messages, f"answer {step}", f"step {step}")
+        timings.append(time.perf_counter() - start)
+        messages.append(AIMessage(content=f"answer {step} " * 200))
+        messages.append(HumanMessage(content=f"retry request {step} " * 50))
+    return timings
+
+
+@app.command()
+def main(
+    lines: int = typer.Option(
+        6000, help="Lines in the file listing (~17 tokens each)."
+    ),
+    steps: int = typer.Option(10, help="Number of conversation steps."),
+):
+    """Print the tokenizer time per step with and without memoized token counts."""
+    files = make_file_listing(lines)
+    tokens = TokenUsageLog("gpt-4")._tokenizer.num_tokens(files)
+    print(f"File listing: {tokens} tokens, {steps} steps\n")
+
+    cold = time_steps(files, steps, memoized=False)
+    warm = time_steps(files, steps, memoized=True)
+
+    print(f"{'step':>4} {'re-encoded (ms)':>16} {'memoized (ms)':>14}")
+    for step, (c, w) in enumerate(zip(cold, warm)):
+        print(f"{step:>4} {c * 1000:>16.1f} {w * 1000:>14.1f}")
+    print(f"{'sum':>4} {sum(cold) * 1000:>16.1f} {sum(warm) * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    app()
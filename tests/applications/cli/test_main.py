@@ -176,6 +176,45 @@ class TestMain:
         )
         args()
 
+    #  Generates with the default settings, streaming the answer and reporting each file as soon as it is complete.
+    def test_default_settings_are_passed_to_the_agent(self, tmp_path, monkeypatch):
+        p = tmp_path / "projects/example"
+        p.mkdir(parents=True)
+        (p / "prompt").write_text(prompt_text)
+        agents = []
+        with_default_config = main.CliAgent.with_default_config
+
+        def capture(*args, **kwargs):
+            agents.append(kwargs)
+            return with_default_config(*args, **kwargs)
+
+        monkeypatch.setattr(main.CliAgent, "with_default_config", capture)
+        DefaultArgumentsMain(str(p), llm_via_clipboard=True, no_execution=True)()
+
+        code_gen_fn = agents[0]["code_gen_fn"]
+        assert code_gen_fn.func is main.gen_code
+        assert code_gen_fn.keywords["on_file"] is main.print_completed_file
+        improve_fn = agents[0]["improve_fn"]
+        assert improve_fn.func is main.improve_fn
+        assert improve_fn.keywords == {
+            "candidates": main.IMPROVE_CANDIDATES,
+            "file_budget": main.IMPROVE_FILE_BUDGET,
+            "diff_alignment": main.IMPROVE_DIFF_ALIGNMENT,
+            "patch_fuzz": main.IMPROVE_PATCH_FUZZ,
+        }
+
+    def test_tokenizers_are_not_preloaded_without_cache(self, tmp_path, monkeypatch):
+        p = tmp_path / "projects/example"
+        p.mkdir(parents=True)
+        (p / "prompt").write_text(prompt_text)
+        preloaded = []
+        monkeypatch.setattr(main, "check_tiktoken_cache", lambda: ["cl100k_base"])
+        monkeypatch.setattr(main, "preload_tokenizers", preloaded.append)
+
+        DefaultArgumentsMain(str(p), llm_via_clipboard=True, no_execution=True)()
+
+        assert preloaded == []
+
     def test_clarify_lite_improve_mode_generate_project(self, tmp_path, monkeypatch):
         p = tmp_path / "projects/example"
         p.mkdir(parents=True)
@@ -1,4 +1,5 @@
 # Generated by CodiumAI
+import asyncio
 import tempfile
 
 from unittest.mock import MagicMock
@@ -11,6 +12,8 @@ from gpt_engineer.core.ai import AI
 from gpt_engineer.core.default.disk_memory import DiskMemory
 from gpt_engineer.core.default.paths import ENTRYPOINT_FILE, PREPROMPTS_PATH
 from gpt_engineer.core.default.steps import (
+    agen_code,
+    aimprove_fn,
     curr_fn,
     gen_code,
     gen_entrypoint,
@@ -159,6 +162,22 @@ class TestGenCode:
             code = gen_code(ai, prompt, memory, preprompts_holder)
             code["nonexistent_file.py"]
 
+    #  The async variant produces the same files as the sync one.
+    def test_async_generates_code_using_ai_model(self):
+        # Mock AsyncAI class
+        class MockAsyncAI:
+            async def start(self, sys_prompt, user_prompt, step_name):
+                return [SystemMessage(content=factorial_program)]
+
+        ai = MockAsyncAI()
+        prompt = Prompt("Write a function that calculates the factorial of a number.")
+        memory = DiskMemory(tempfile.mkdtemp())
+        preprompts_holder = PrepromptsHolder(PREPROMPTS_PATH)
+        code = asyncio.run(agen_code(ai, prompt, memory, preprompts_holder))
+
+        assert isinstance(code, FilesDict)
+        assert len(code) == 2
+
 
 class TestStepUtilities:
     def test_called_from_function(self):
@@ -312,6 +331,70 @@ Some introductory text.
         )
         assert improved_code == expected_code
 
+    def test_async_improve_existing_code(self, tmp_path):
+        ai_patch = """
+```diff
+--- main.py
++++ main.py
+@@ -1,1 +1,1 @@
+-print('Hello, World!')
++print('Goodbye, World!')
+```
+"""
+
+        class MockAsyncAI:
+            async def next(self, messages, prompt=None, *, step_name):
+                return [SystemMessage(content=ai_patch)]
+
+        code = FilesDict({"main.py": "print('Hello, World!')"})
+        memory = DiskMemory(tmp_path)
+        prompt = Prompt("Print 'Goodbye, World!' instead of 'Hello, World!'")
+        preprompts_holder = PrepromptsHolder(PREPROMPTS_PATH)
+
+        improved_code = asyncio.run(
+            aimprove_fn(MockAsyncAI(), prompt, code, memory, preprompts_holder)
+        )
+
+        assert improved_code == FilesDict({"main.py": "print('Goodbye, World!')"})
+
+    def test_improve_selects_best_candidate(self, tmp_path):
+        good_patch = """
+```diff
+--- main.py
++++ main.py
+@@ -1,1 +1,1 @@
+-print('Hello, World!')
++print('Goodbye, World!')
+```
+"""
+        bad_patch = """
+```diff
+--- main.py
++++ main.py
+@@ -1,1 +1,1 @@
+-print('Something else entirely')
++print('Wrong!')
+```
+"""
+        ai_mock = MagicMock(spec=AI)
+        ai_mock.next_many.return_value = [
+            ValueError("request failed"),
+            [SystemMessage(content=bad_patch)],
+            [SystemMessage(content=good_patch)],
+        ]
+        code = FilesDict({"main.py": "print('Hello, World!')"})
+        memory = DiskMemory(tmp_path)
+        prompt = Prompt("Print 'Goodbye, World!' instead of 'Hello, World!'")
+        preprompts_holder = PrepromptsHolder(PREPROMPTS_PATH)
+
+        improved_code = improve_fn(
+            ai_mock, prompt, code, memory, preprompts_holder, candidates=3
+        )
+
+        assert improved_code == FilesDict({"main.py": "print('Goodbye, World!')"})
+        assert len(ai_mock.next_many.call_args[0][0]) == 3
+        ai_mock.next.assert_not_called()
+
     def test_lint_python(self):
         linting = Linting()
         content = "print('Hello, world! ')"
@@ -1,7 +1,12 @@
+import asyncio
+import time
+
 from langchain.chat_models.base import BaseChatModel
+from langchain.schema import AIMessage, HumanMessage
 from langchain_community.chat_models.fake import FakeListChatModel
 
-from gpt_engineer.core.ai import AI
+from gpt_engineer.core.ai import AI, AsyncAI, ClipboardAI
+from gpt_engineer.core.llm_cache import LLMCache
 
 
 def mock_create_chat_model(self) -> BaseChatModel:
@@ -51,3 +56,262 @@ def test_token_logging(monkeypatch):
     # assert
     assert usageCostAfterStart > 0
     assert usageCostAfterNext > usageCostAfterStart
+
+
+def test_async_start_and_next(monkeypatch):
+    # arrange
+    monkeypatch.setattr(AsyncAI, "_create_chat_model", mock_create_chat_model)
+
+    ai = AsyncAI("gpt-4")
+
+    async def conversation():
+        messages = await ai.start("system prompt", "user prompt", step_name="step name")
+        return await ai.next(messages, "next user prompt", step_name="step name")
+
+    # act
+    response_messages = asyncio.run(conversation())
+
+    # assert
+    assert response_messages[-1].content == "response2"
+
+
+def test_async_concurrent_conversations(monkeypatch):
+    # arrange
+    monkeypatch.setattr(AsyncAI, "_create_chat_model", mock_create_chat_model)
+
+    ai = AsyncAI("gpt-4")
+
+    async def run_all():
+        return await asyncio.gather(
+            *[
+                ai.start("system prompt", f"user prompt {i}", step_name="step name")
+                for i in range(3)
+            ]
+        )
+
+    # act
+    conversations = asyncio.run(run_all())
+
+    # assert
+    assert sorted(c[-1].content for c in conversations) == [
+        "response1",
+        "response2",
+        "response3",
+    ]
+    assert len(ai.token_usage_log.log()) == 3
+
+
+def test_cached_response_skips_inference(monkeypatch, tmp_path):
+    # arrange
+    monkeypatch.setattr(AI, "_create_chat_model", mock_create_chat_model)
+    cache = LLMCache(tmp_path / "cache.sqlite3")
+
+    # act
+    first = AI("gpt-4", cache=cache).start("system", "user", step_name="step name")
+    second = AI("gpt-4", cache=cache).start("system", "user", step_name="step name")
+
+    # assert
+    assert first[-1].content == "response1"
+    assert second[-1].content == "response1"
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_identical_candidates_are_cached_separately(monkeypatch, tmp_path):
+    # arrange
+    monkeypatch.setattr(AI, "_create_chat_model", mock_create_chat_model)
+    cache = LLMCache(tmp_path / "cache.sqlite3")
+    conversations = [[HumanMessage(content="user")] for _ in range(2)]
+
+    # act
+    first = AI("gpt-4", cache=cache).next_many(
+        conversations, step_name="step name", max_concurrency=1
+    )
+    second = AI("gpt-4", cache=cache).next_many(
+        conversations, step_name="step name", max_concurrency=1
+    )
+
+    # assert
+    assert [r[-1].content for r in first] == ["response1", "response2"]
+    assert [r[-1].content for r in second] == ["response1", "response2"]
+    assert cache.hits == 2
+    assert cache.misses == 2
+
+
+def test_streaming_next_reports_chunks(monkeypatch, tmp_path):
+    # arrange
+    monkeypatch.setattr(AI, "_create_chat_model", mock_create_chat_model)
+    cache = LLMCache(tmp_path / "cache.sqlite3")
+    chunks = []
+
+    # act
+    first = AI("gpt-4", cache=cache).start(
+        "system", "user", step_name="step name", on_chunk=chunks.append
+    )
+    second = AI("gpt-4", cache=cache).start(
+        "system", "user", step_name="step name", on_chunk=chunks.append
+    )
+
+    # assert
+    assert first[-1].content == "response1"
+    assert second[-1].content == "response1"
+    assert "".join(chunks) == "response1response1"
+
+
+def test_async_streaming_next_reports_chunks(monkeypatch):
+    # arrange
+    monkeypatch.setattr(AsyncAI, "_create_chat_model", mock_create_chat_model)
+    chunks = []
+
+    # act
+    messages = asyncio.run(
+        AsyncAI("gpt-4").start(
+            "system", "user", step_name="step name", on_chunk=chunks.append
+        )
+    )
+
+    # assert
+    assert messages[-1].content == "response1"
+    assert "".join(chunks) == "response1"
+
+
+def echo_inference(active: list):
+    def backoff_inference(messages):
+        active.append(1)
+        try:
+            time.sleep(0.05)
+            assert len(active) <= 2
+            if "fail" in messages[-1].content:
+                raise ValueError("inference failed")
+            return AIMessage(content=f"answer to {messages[-1].content}")
+        finally:
+            active.pop()
+
+    return backoff_inference
+
+
+def test_next_many_keeps_order_and_isolates_failures(monkeypatch):
+    # arrange
+    monkeypatch.setattr(AI, "_create_chat_model", mock_create_chat_model)
+    ai = AI("gpt-4")
+    monkeypatch.setattr(ai, "backoff_inference", echo_inference([]))
+    prompts = ["a", "b", "fail", "c", "d"]
+
+    # act
+    results = ai.next_many(
+        [[HumanMessage(content=p)] for p in prompts],
+        step_name="batch",
+        max_concurrency=2,
+    )
+
+    # assert
+    assert isinstance(results[2], ValueError)
+    assert [r[-1].content for i, r in enumerate(results) if i != 2] == [
+        "answer to a",
+        "answer to b",
+        "answer to c",
+        "answer to d",
+    ]
+    assert [entry.step_name for entry in ai.token_usage_log.log()] == ["batch"] * 4
+
+
+def test_async_next_many_keeps_order_and_isolates_failures(monkeypatch):
+    # arrange
+    monkeypatch.setattr(AsyncAI, "_create_chat_model", mock_create_chat_model)
+    ai = AsyncAI("gpt-4")
+    infer = echo_inference([])
+
+    async def backoff_inference(messages):
+        await asyncio.sleep(0.01 * len(messages[-1].content))
+        return infer(messages)
+
+    monkeypatch.setattr(ai, "backoff_inference", backoff_inference)
+
+    # act
+    results = asyncio.run(
+        ai.next_many(
+            [[HumanMessage(content=p)] for p in ["slow prompt", "fail", "x"]],
+            step_name="batch",
+        )
+    )
+
+    # assert
+    assert results[0][-1].content == "answer to slow prompt"
+    assert isinstance(results[1], ValueError)
+    assert results[2][-1].content == "answer to x"
+    assert len(ai.token_usage_log.log()) == 2
+
+
+def test_provider_reported_usage_is_logged(monkeypatch):
+    # arrange
+    monkeypatch.setattr(AI, "_create_chat_model", mock_create_chat_model)
+    ai = AI("gpt-4")
+    response = AIMessage(
+        content="answer",
+        response_metadata={
+            "token_usage": {"prompt_tokens": 42, "completion_tokens": 7}
+        },
+    )
+    monkeypatch.setattr(ai, "backoff_inference", lambda messages: response)
+
+    # act
+    ai.start("system prompt", "user prompt", step_name="step name")
+
+    # assert
+    entry = ai.token_usage_log.log()[-1]
+    assert entry.usage_source == "provider"
+    assert entry.in_step_total_tokens == 49
+
+
+def test_inference_timing_is_logged(monkeypatch, tmp_path):
+    # arrange
+    monkeypatch.setattr(AI, "_create_chat_model", mock_create_chat_model)
+    cache = LLMCache(tmp_path / "cache.sqlite3")
+    ai = AI("gpt-4", cache=cache)
+
+    # act
+    ai.start("system", "user", step_name="streamed", on_chunk=lambda chunk: None)
+    ai.start("system", "user", step_name="cached")
+
+    # assert
+    streamed, cached = [entry.timing for entry in ai.token_usage_log.log()]
+    assert streamed.provider == "openai"
+    assert not streamed.cache_hit and streamed.retries == 0
+    assert 0 <= streamed.time_to_first_token <= streamed.latency
+    assert cached.cache_hit and cached.time_to_first_token is None
+    assert cached.output_tokens_per_second is None
+
+
+def test_next_many_records_queue_wait(monkeypatch):
+    # arrange
+    monkeypatch.setattr(AI, "_create_chat_model", mock_create_chat_model)
+    ai = AI("gpt-4")
+    monkeypatch.setattr(ai, "backoff_inference", echo_inference([]))
+
+    # act
+    ai.next_many(
+        [[HumanMessage(content=p)] for p in "abc"], step_name="batch", max_concurrency=1
+    )
+
+    # assert
+    waits = [entry.timing.queue_wait for entry in ai.token_usage_log.log()]
+    assert waits[0] < 0.05 <= waits[2]
+
+
+def test_clipboard_next_many_asks_for_each_answer_in_turn(monkeypatch, tmp_path):
+    # arrange
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("pyperclip.copy", lambda text: None)
+    answers = iter(["first", "second"])
+    monkeypatch.setattr(
+        ClipboardAI, "multiline_input", staticmethod(lambda: next(answers))
+    )
+    ai = ClipboardAI()
+
+    # act
+    results = ai.next_many(
+        [[HumanMessage(content="task")] for _ in range(2)], step_name="batch"
+    )
+
+    # assert
+    assert [result[-1].content for result in results] == ["first", "second"]
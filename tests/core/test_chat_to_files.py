@@ -1,12 +1,26 @@
 import os
+import random
 
 from typing import Dict, Tuple
 
 import pytest
 
-from gpt_engineer.core.chat_to_files import parse_diffs
-from gpt_engineer.core.diff import is_similar
-from gpt_engineer.core.files_dict import file_to_lines_dict
+from gpt_engineer.core import diff as diff_module
+from gpt_engineer.core.chat_to_files import (
+    StreamingDiffsParser,
+    StreamingFilesParser,
+    apply_diffs,
+    chat_to_files_dict,
+    parse_diffs,
+)
+from gpt_engineer.core.diff import (
+    LineHistograms,
+    LineIndex,
+    count_ratio,
+    is_similar,
+    normalize_line,
+)
+from gpt_engineer.core.files_dict import FilesDict, file_to_lines_dict
 
 THIS_FILE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -286,6 +300,143 @@ def test_correct_skipped_lines_and_number_correction():
     )
 
 
+def test_line_index_ignores_spaces_and_case():
+    index = LineIndex(file_to_lines_dict("def f():\n    Return 1\nreturn 1\n"))
+
+    assert index.lookup("return1") == [2, 3]
+    assert index.lookup("return 1", {3: "return 1"}) == [3]
+    assert index.lookup("return 2") == []
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_line_histograms_match_count_ratio(use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    rng = random.Random(0)
+    alphabet = "ab c:=()\tXé"
+    lines = ["".join(rng.choices(alphabet, k=rng.randint(0, 12))) for _ in range(40)]
+    histograms = LineHistograms([normalize_line(line) for line in lines], use_numpy)
+
+    for text in lines[:5] + ["", "zz ü", "A B C"]:
+        assert histograms.ratios(text) == [count_ratio(text, line) for line in lines]
+        block = text + "\n" + lines[3]
+        for start, stop in [(0, 10), (3, 4), (35, 50), (7, 7)]:
+            assert histograms.block_ratio(block, start, stop) == count_ratio(
+                block, "\n".join(lines[start:stop])
+            )
+
+
+def test_line_histograms_fall_back_for_wide_files(monkeypatch):
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(diff_module, "MAX_HISTOGRAM_CELLS", 100)
+    lines = ["".join(chr(0x4E00 + i * 10 + j) for j in range(10)) for i in range(20)]
+
+    histograms = LineHistograms(lines)
+
+    assert not histograms.use_numpy
+    assert histograms.ratios(lines[3]) == [
+        count_ratio(lines[3], line) for line in lines
+    ]
+    assert histograms.block_ratio(lines[3], 2, 5) == count_ratio(
+        lines[3], "\n".join(lines[2:5])
+    )
+
+
+def test_repeated_start_line_is_anchored_by_the_following_lines():
+    code = "if x:\n    a = 1\nif x:\n    b = 2\n"
+    diffs = parse_diffs(
+        "```diff\n--- example.py\n+++ example.py\n@@ -1,2 +1,2 @@\n"
+        " if x:\n-    b = 2\n+    b = 3\n```"
+    )
+
+    problems = diffs["example.py"].validate_and_correct(file_to_lines_dict(code))
+
+    assert problems == []
+    assert diffs["example.py"].hunks[0].start_line_pre_edit == 3
+    files = apply_diffs(diffs, FilesDict({"example.py": code}))
+    assert files["example.py"] == "if x:\n    a = 1\nif x:\n    b = 3\n"
+
+
+def test_apply_diffs_splices_multiple_hunks():
+    code = "\n".join(f"line {i}" for i in range(1, 11)) + "\n"
+    diffs = parse_diffs(
+        "```diff\n--- example.py\n+++ example.py\n"
+        "@@ -1,2 +1,3 @@\n+# header\n line 1\n line 2\n"
+        "@@ -5,3 +6,2 @@\n line 5\n-line 6\n line 7\n"
+        "@@ -10,2 +10,3 @@\n line 10\n+line 11\n \n```"
+    )
+    other = FilesDict({"example.py": code, "other.py": "print('<REMOVE_LINE>')"})
+
+    files = apply_diffs(diffs, other)
+
+    assert files["example.py"] == "\n".join(
+        ["# header"] + [f"line {i}" for i in range(1, 12) if i != 6] + [""]
+    )
+    assert files["other.py"] == "print('<REMOVE_LINE>')"
+    assert other["example.py"] == code
+
+
+def test_apply_diffs_keeps_lines_that_look_like_markers():
+    code = "a = 1\nmarker = '<REMOVE_LINE>'\nb = 2"
+    diffs = parse_diffs(
+        "```diff\n--- example.py\n+++ example.py\n@@ -1,3 +1,3 @@\n"
+        "-a = 1\n+a = 2\n marker = '<REMOVE_LINE>'\n b = 2\n```"
+    )
+
+    files = apply_diffs(diffs, FilesDict({"example.py": code}))
+
+    assert files["example.py"] == "a = 2\nmarker = '<REMOVE_LINE>'\nb = 2"
+
+
+def test_align_mode_restores_skipped_lines_and_drops_invented_ones():
+    code = "def f(x):\n    y = x + 1\n    z = y * 2\n    return z\n"
+    diffs = parse_diffs(
+        "```diff\n--- example.py\n+++ example.py\n@@ -7,4 +7,4 @@\n"
+        " def  f(x):\n     w = 0\n-    z = y * 2\n+    z = y * 3\n     return z\n```"
+    )
+
+    problems = diffs["example.py"].validate_and_correct(
+        file_to_lines_dict(code), "align"
+    )
+
+    assert problems == []
+    hunk = diffs["example.py"].hunks[0]
+    assert hunk.start_line_pre_edit == 1
+    assert hunk.lines[:2] == [("retain", "def f(x):"), ("retain", "    y = x + 1")]
+    files = apply_diffs(diffs, FilesDict({"example.py": code}))
+    assert files["example.py"] == code.replace("y * 2", "y * 3")
+
+
+def test_align_mode_rejects_moved_lines():
+    code = "a = 1\nb = 2\nc = 3\nd = 4\n"
+    diffs = parse_diffs(
+        "```diff\n--- example.py\n+++ example.py\n@@ -1,4 +1,4 @@\n"
+        " a = 1\n c = 3\n-d = 4\n+d = 5\n b = 2\n```"
+    )
+
+    problems = diffs["example.py"].validate_and_correct(
+        file_to_lines_dict(code), "align"
+    )
+
+    assert len(problems) == 1 and "not in the same order" in problems[0]
+    with pytest.raises(ValueError):
+        diffs["example.py"].validate_and_correct(file_to_lines_dict(code), "fuzzy")
+
+
+def test_align_mode_rejects_missing_removed_lines():
+    code = "a = 1\nb = 2\nc = 3\n"
+    diffs = parse_diffs(
+        "```diff\n--- example.py\n+++ example.py\n@@ -1,3 +1,3 @@\n"
+        " a = 1\n b = 2\n-d = 4\n+d = 5\n c = 3\n```"
+    )
+
+    problems = diffs["example.py"].validate_and_correct(
+        file_to_lines_dict(code), "align"
+    )
+
+    assert len(problems) == 1 and "'d = 4' was not found" in problems[0]
+
+
 def test_diff_regex():
     diff = parse_diffs(example_diff)
     assert len(diff) == 1
@@ -366,5 +517,74 @@ def test_long_file_diff():
     parse_chats_with_regex("wheaties_example_chat", "wheaties_example_code")
 
 
+def random_chunks(text: str, seed: int):
+    rng = random.Random(seed)
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(1, 12)
+        yield text[pos : pos + size]
+        pos += size
+
+
+example_files_chat = """
+Here is the code:
+
+main.py
+```python
+from utils import greet
+
+print(greet("world"))
+```
+
+[utils.py]
+```python
+def greet(name):
+    return f"Hello {name}"
+```
+
+That's it!
+"""
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_streaming_files_parser_matches_full_parse(seed):
+    emitted = []
+    parser = StreamingFilesParser(on_file=lambda path, content: emitted.append(path))
+
+    for chunk in random_chunks(example_files_chat, seed):
+        parser.feed(chunk)
+
+    assert parser.chat == example_files_chat
+    assert parser.files_dict == chat_to_files_dict(example_files_chat)
+    assert emitted == ["main.py", "utils.py"]
+
+
+def test_streaming_files_parser_emits_file_before_stream_ends():
+    parser = StreamingFilesParser()
+    first_block_end = example_files_chat.index("```\n\n[utils.py]") + 3
+
+    completed = parser.feed(example_files_chat[:first_block_end])
+
+    assert [path for path, _ in completed] == ["main.py"]
+    assert parser.feed(example_files_chat[first_block_end:]) == [
+        ("utils.py", 'def greet(name):\n    return f"Hello {name}"')
+    ]
+
+
+@pytest.mark.parametrize(
+    "chat_file_name", ["controller_chat", "simple_calculator_chat", "task_master_chat"]
+)
+def test_streaming_diffs_parser_matches_full_parse(chat_file_name):
+    chat, _, diffs = parse_chats_with_regex(chat_file_name, chat_file_name)
+    parser = StreamingDiffsParser()
+
+    for chunk in random_chunks(chat, seed=len(chat)):
+        parser.feed(chunk)
+
+    assert parser.diffs.keys() == diffs.keys()
+    for filename, diff in diffs.items():
+        assert parser.diffs[filename].diff_to_string() == diff.diff_to_string()
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,65 @@
+import json
+
+from gpt_engineer.core import circuit_breaker as cb
+from gpt_engineer.core.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    circuit_breaker,
+)
+
+
+def test_circuit_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("model", failure_threshold=3)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+    assert breaker.remaining_cooldown() > 0
+
+
+def test_half_open_probe_closes_or_reopens_with_longer_cooldown(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cb.time, "time", lambda: now[0])
+    breaker = CircuitBreaker("model", failure_threshold=1, cooldown_seconds=10)
+
+    breaker.record_failure()
+    now[0] += 10
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.cooldown == 20
+    now[0] += 15
+    assert not breaker.allow_request()
+
+    now[0] += 5
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.cooldown == 10
+
+
+def test_state_is_persisted_across_processes(tmp_path, monkeypatch):
+    path = tmp_path / "breakers.json"
+    monkeypatch.setenv("GPTE_CIRCUIT_BREAKER_PATH", str(path))
+    monkeypatch.setattr(cb, "_breakers", {})
+
+    breaker = circuit_breaker("openrouter:flaky")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert json.loads(path.read_text())["openrouter:flaky"]["state"] == OPEN
+
+    # A new process starts from the persisted state
+    monkeypatch.setattr(cb, "_breakers", {})
+    restored = circuit_breaker("openrouter:flaky")
+    assert restored is not breaker
+    assert restored.state == OPEN
+    assert not restored.allow_request()
@@ -0,0 +1,224 @@
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+from gpt_engineer.core.context_window import (
+    RETRY_PROMPT_PREFIX,
+    TRUNCATE_KEEP_CHARS,
+    ContextWindowManager,
+    context_window_for,
+    plan_file_budget,
+)
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.tools.openrouter_wrapper import truncate_messages_if_needed
+
+
+def words(n: int) -> str:
+    return " ".join(["word"] * n)
+
+
+def manager(context_window: int) -> ContextWindowManager:
+    return ContextWindowManager(
+        "gpt-4", max_completion_tokens=0, context_window=context_window
+    )
+
+
+def test_context_window_for_known_and_unknown_models(monkeypatch):
+    monkeypatch.delenv("GPTE_CONTEXT_WINDOW", raising=False)
+    assert context_window_for("gpt-4-turbo") == 128000
+    assert context_window_for("gpt-4") == 8192
+    assert context_window_for("gpt-4-0613") == 8192
+    assert context_window_for("gpt-4.1-mini") == 1047576
+    assert context_window_for("openai/gpt-4o-mini") == 128000
+    assert context_window_for("o3-mini") == 200000
+    assert context_window_for("claude-3-opus-20240229") == 200000
+    assert context_window_for("my-local-model") is None
+    assert context_window_for("my-azure-deployment") is None
+
+
+def test_context_window_can_be_configured(monkeypatch):
+    monkeypatch.setenv("GPTE_CONTEXT_WINDOW", "32000")
+
+    assert context_window_for("my-azure-deployment") == 32000
+    assert ContextWindowManager("my-azure-deployment").budget == 32000 - 2048
+
+
+def test_fitting_conversation_is_returned_unchanged():
+    messages = [SystemMessage(content="system"), HumanMessage(content="user")]
+
+    assert manager(1000).fit(messages) is messages
+
+
+def test_conversation_for_unknown_window_is_sent_as_is(monkeypatch):
+    monkeypatch.delenv("GPTE_CONTEXT_WINDOW", raising=False)
+    unknown = ContextWindowManager("my-local-model", max_completion_tokens=0)
+    messages = [SystemMessage(content="system"), HumanMessage(content=words(20000))]
+
+    assert unknown.budget is None
+    assert unknown.fit(messages) is messages
+
+
+def test_stale_retries_are_dropped_first():
+    messages = [
+        SystemMessage(content="system"),
+        HumanMessage(content="the task"),
+        AIMessage(content=words(400)),
+        HumanMessage(content=RETRY_PROMPT_PREFIX + " first retry"),
+        AIMessage(content="second answer"),
+        HumanMessage(content=RETRY_PROMPT_PREFIX + " second retry"),
+    ]
+
+    fitted = manager(200).fit(messages)
+
+    assert [m.content for m in fitted] == [
+        "system",
+        "the task",
+        "second answer",
+        RETRY_PROMPT_PREFIX + " second retry",
+    ]
+    assert len(messages) == 6
+
+
+def test_unreferenced_file_bodies_are_elided():
+    files = FilesDict({"main.py": "print('hello')\n", "vendor.py": words(10) * 50})
+    messages = [
+        SystemMessage(content="system"),
+        HumanMessage(content=files.to_chat() + "\n\nFix the greeting in main.py"),
+    ]
+
+    fitted = manager(200).fit(messages)
+
+    assert "1 print('hello')" in fitted[1].content
+    assert "File: vendor.py\n[1 lines elided" in fitted[1].content
+    assert "Fix the greeting in main.py" in fitted[1].content
+
+
+def test_old_turns_are_summarized():
+    messages = [
+        SystemMessage(content="system"),
+        HumanMessage(content="the task"),
+        AIMessage(content="Old answer\n" + words(400)),
+        HumanMessage(content="a follow-up question"),
+        AIMessage(content="latest answer"),
+        HumanMessage(content="latest question"),
+    ]
+
+    fitted = manager(200).fit(messages)
+
+    assert fitted[2].content.startswith("[Earlier answer of")
+    assert fitted[2].content.endswith("Old answer")
+    assert [m.content for m in fitted[4:]] == ["latest answer", "latest question"]
+
+
+def test_large_message_is_truncated_as_last_resort():
+    m = manager(200)
+    messages = [SystemMessage(content="system"), HumanMessage(content=words(1000))]
+
+    fitted = m.fit(messages)
+
+    assert m.count(fitted) <= m.budget
+    assert "characters elided to fit the context window" in fitted[1].content
+
+
+class CharTokenizer:
+    """Counts one token per character, like a byte-level tokenizer on ASCII text."""
+
+    def num_tokens_from_messages(self, messages):
+        return sum(len(m.content) for m in messages)
+
+
+def test_truncation_keeps_both_ends_of_every_message():
+    m = manager(400)
+    m.tokenizer = CharTokenizer()
+    system = "S" * 100 + "s" * 200
+    task = "H" * 100 + "h" * 4800 + "T" * 100
+    messages = [SystemMessage(content=system), HumanMessage(content=task)]
+
+    fitted = m.fit(messages)
+
+    assert m.count(fitted) <= m.budget
+    for original, truncated in zip(messages, fitted):
+        head, marker, tail = truncated.content.partition(" characters elided")
+        assert marker
+        assert original.content.startswith(head.rpartition("\n[...")[0])
+        assert len(head.rpartition("\n[...")[0]) >= TRUNCATE_KEEP_CHARS
+        assert original.content.endswith(tail.partition("\n")[2])
+        assert len(tail.partition("\n")[2]) >= TRUNCATE_KEEP_CHARS
+
+
+def test_openrouter_truncation_keeps_roles_and_fits():
+    messages = [
+        {"role": "system", "content": "system"},
+        {"role": "user", "content": "the task"},
+        {"role": "assistant", "content": "Old answer\n" + words(400)},
+        {"role": "user", "content": "a follow-up question"},
+        {"role": "assistant", "content": "latest answer"},
+        {"role": "user", "content": "latest question"},
+    ]
+
+    fitted = truncate_messages_if_needed(messages, max_context=250, max_tokens=50)
+
+    assert [m["role"] for m in fitted] == [m["role"] for m in messages]
+    assert fitted[-1]["content"] == "latest question"
+    assert fitted[2]["content"].startswith("[Earlier answer of")
+
+
+def test_budget_plan_matches_to_chat_when_files_fit():
+    files = FilesDict({"main.py": "print('hello')\nprint('bye')", "util.py": "x = 1\n"})
+
+    plan = plan_file_budget(manager(1000), files, "Fix main.py", "system")
+
+    assert plan.fits and not plan.changed
+    assert plan.to_chat(files) == files.to_chat()
+    assert [f.name for f in plan.files] == ["main.py", "util.py"]
+    assert all(f.tokens > 0 for f in plan.files)
+
+
+def test_budget_plan_elides_largest_unreferenced_files_first():
+    files = FilesDict(
+        {
+            "main.py": words(100),
+            "big.py": words(300),
+            "small.py": words(20),
+        }
+    )
+
+    plan = plan_file_budget(manager(250), files, "Fix main.py", "system")
+
+    actions = {f.name: f.action for f in plan.files}
+    assert actions == {"main.py": "keep", "big.py": "elide", "small.py": "keep"}
+    assert plan.fits
+    chat = plan.to_chat(files)
+    assert "File: big.py\n[1 lines elided" in chat
+    assert "File: small.py\n1 word" in chat
+    assert "big.py" in plan.report() and "elide" in plan.report()
+
+
+def test_budget_plan_drops_files_and_never_touches_referenced_ones():
+    files = FilesDict({"main.py": words(400), "big.py": words(300)})
+
+    plan = plan_file_budget(manager(250), files, "Fix main.py", strategy="drop")
+
+    assert [f.action for f in plan.files] == ["keep", "drop"]
+    assert not plan.fits
+    assert "big.py" not in plan.to_chat(files)
+    assert "does not fit" in plan.report()
+
+
+def test_budget_plan_off_only_reports():
+    files = FilesDict({"main.py": words(10), "big.py": words(300)})
+
+    plan = plan_file_budget(manager(100), files, "Fix main.py", strategy="off")
+
+    assert not plan.changed and not plan.fits
+    assert plan.to_chat(files) == files.to_chat()
+
+
+def test_budget_plan_only_reports_for_unknown_windows(monkeypatch):
+    monkeypatch.delenv("GPTE_CONTEXT_WINDOW", raising=False)
+    unknown = ContextWindowManager("my-local-model", max_completion_tokens=0)
+    files = FilesDict({"main.py": words(10), "big.py": words(30000)})
+
+    plan = plan_file_budget(unknown, files, "Fix main.py", strategy="elide")
+
+    assert not plan.changed and plan.fits
+    assert plan.to_chat(files) == files.to_chat()
+    assert "context window unknown" in plan.report()
@@ -0,0 +1,119 @@
+from langchain_core.messages import AIMessage
+
+from gpt_engineer.core.chat_to_files import apply_diffs, parse_diffs
+from gpt_engineer.core.default.disk_memory import DiskMemory
+from gpt_engineer.core.default.steps import salvage_correct_hunks
+from gpt_engineer.core.diff import Hunk
+from gpt_engineer.core.files_dict import FilesDict, file_to_lines_dict
+from gpt_engineer.core.fuzzy_patch import (
+    FuzzyPatchStats,
+    fuzzy_patch_stats,
+    fuzzy_relocate,
+)
+
+CODE = "\n".join(
+    [
+        "def total(items):",
+        "\tresult = 0",
+        "\tfor item in items:",
+        "\t\tresult += item",
+        "\treturn result",
+        "",
+        "print(total([1, 2]))",
+    ]
+)
+
+
+def hunk(start, lines):
+    return Hunk(start, 0, start, 0, lines)
+
+
+def test_hunks_are_placed_ignoring_whitespace_and_line_numbers():
+    placed = fuzzy_relocate(
+        hunk(
+            40,
+            [
+                ("retain", "    for item in items:"),
+                ("remove", "        result += item"),
+                ("add", "        result += item * 2"),
+                ("retain", "    return   result"),
+            ],
+        ),
+        file_to_lines_dict(CODE),
+    )
+
+    assert placed.start_line_pre_edit == 3
+    assert (placed.hunk_len_pre_edit, placed.hunk_len_post_edit) == (3, 3)
+    assert placed.lines[0] == ("retain", "\tfor item in items:")
+    assert placed.lines[1] == ("remove", "\t\tresult += item")
+
+
+def test_fuzz_leaves_out_context_but_never_removed_lines():
+    lines = [
+        ("retain", "\tresult = 1"),
+        ("remove", "\tfor item in items:"),
+        ("add", "\tfor item in sorted(items):"),
+        ("retain", "\t\tresult += item"),
+    ]
+
+    assert fuzzy_relocate(hunk(2, lines), file_to_lines_dict(CODE), fuzz=0) is None
+    assert fuzzy_relocate(hunk(2, lines), file_to_lines_dict(CODE), fuzz=1) is not None
+    lines[1] = ("remove", "\tfor item in item_list:")
+    assert fuzzy_relocate(hunk(2, lines), file_to_lines_dict(CODE), fuzz=2) is None
+
+
+def test_fuzz_does_not_accept_moved_lines():
+    lines = [
+        ("retain", "\tfor item in items:"),
+        ("retain", "\tresult = 0"),
+        ("remove", "\t\tresult += item"),
+        ("add", "\t\tresult += 2 * item"),
+    ]
+
+    assert fuzzy_relocate(hunk(2, lines), file_to_lines_dict(CODE), fuzz=2) is None
+    lines[:2] = lines[1::-1]
+    assert fuzzy_relocate(hunk(2, lines), file_to_lines_dict(CODE), fuzz=0) is not None
+
+
+def test_failing_hunks_are_applied_by_the_fallback():
+    diffs = parse_diffs(
+        "```diff\n--- example.py\n+++ example.py\n@@ -12,3 +12,3 @@\n"
+        "     result = 0\n-    for item in items:\n+    for item in sorted(items):\n"
+        "         result += item\n```"
+    )
+    diff = diffs["example.py"]
+
+    problems = diff.validate_and_correct(
+        file_to_lines_dict(CODE), fallback=fuzzy_relocate
+    )
+
+    assert problems == [] and diff.fallback_hunks == diff.hunks
+    files = apply_diffs(diffs, FilesDict({"example.py": CODE}))
+    assert files["example.py"] == CODE.replace(
+        "\tfor item in items", "    for item in sorted(items)"
+    )
+
+
+def test_stats_count_avoided_refinement_round_trips(tmp_path):
+    stats = FuzzyPatchStats()
+    stats.record(hunks_fuzzed=2, problems=0)
+    stats.record(hunks_fuzzed=1, problems=1)
+    stats.record(hunks_fuzzed=0, problems=0)
+
+    assert (stats.answers, stats.hunks_failed, stats.hunks_fuzzed) == (3, 4, 3)
+    assert stats.retries_avoided == 1
+
+    before = fuzzy_patch_stats().retries_avoided
+    answer = (
+        "```diff\n--- example.py\n+++ example.py\n@@ -1,2 +1,2 @@\n"
+        "     result = 0\n-    for item in items:\n+    for item in sorted(items):\n```"
+    )
+    files, errors = salvage_correct_hunks(
+        [AIMessage(content=answer)],
+        FilesDict({"example.py": CODE}),
+        DiskMemory(tmp_path),
+    )
+
+    assert errors == []
+    assert "sorted(items)" in files["example.py"]
+    assert fuzzy_patch_stats().retries_avoided == before + 1
@@ -0,0 +1,49 @@
+import pytest
+
+from gpt_engineer.core.files_dict import file_to_lines_dict
+from gpt_engineer.core.line_table import (
+    LineTable,
+    as_line_window,
+    line_table,
+    normalize_line,
+)
+
+CONTENT = "def f():\n    Return 1\n\nprint(f())\n"
+
+
+@pytest.mark.parametrize("content", [CONTENT, "", "\n", "single line"])
+def test_line_table_splits_like_file_to_lines_dict(content):
+    table = LineTable(content)
+
+    assert dict(table.window()) == file_to_lines_dict(content)
+    assert list(table) == [table[i] for i in range(len(table))]
+    assert table.normalized == [normalize_line(line) for line in table]
+    assert list(table.hashes) == [hash(line) for line in table.normalized]
+
+
+def test_windows_are_views_of_line_number_ranges():
+    table = LineTable(CONTENT)
+    window = table.window(2)
+
+    assert list(window) == [2, 3, 4, 5]
+    assert 1 not in window and window[2] == "    Return 1"
+    assert window.window(1) is not window and list(window.window(1)) == [2, 3, 4, 5]
+    assert list(window.window(4).items()) == [(4, "print(f())"), (5, "")]
+    with pytest.raises(KeyError):
+        window[1]
+    assert table.span(2, 4) == "    Return 1\n"
+    assert table.span(4, 99) == "print(f())\n"
+
+
+def test_line_tables_are_shared_per_file_version():
+    assert line_table(CONTENT) is line_table(CONTENT)
+    assert line_table(CONTENT) is not line_table(CONTENT + "x")
+
+
+def test_dictionaries_are_converted_to_windows():
+    window = as_line_window({3: "a", 4: "b"})
+
+    assert dict(window) == {3: "a", 4: "b"}
+    assert window.table.first_line == 3
+    assert as_line_window(window) is window
+    assert len(as_line_window({})) == 0
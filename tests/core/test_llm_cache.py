@@ -0,0 +1,72 @@
+import time
+
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+
+from gpt_engineer.core.llm_cache import LLMCache
+
+
+def _messages(user="user prompt"):
+    return [SystemMessage(content="system prompt"), HumanMessage(content=user)]
+
+
+def test_key_depends_on_request_parameters():
+    key = LLMCache.make_key(_messages(), "gpt-4", 0.1, None)
+
+    assert key == LLMCache.make_key(_messages(), "gpt-4", 0.1, None)
+    assert key != LLMCache.make_key(_messages("other"), "gpt-4", 0.1, None)
+    assert key != LLMCache.make_key(_messages(), "gpt-4o", 0.1, None)
+    assert key != LLMCache.make_key(_messages(), "gpt-4", 0.2, None)
+    assert key != LLMCache.make_key(_messages(), "gpt-4", 0.1, 1800)
+    assert key != LLMCache.make_key(_messages(), "gpt-4", 0.1, None, sample=1)
+    assert key != LLMCache.make_key(
+        [SystemMessage(content="system prompt"), AIMessage(content="user prompt")],
+        "gpt-4",
+        0.1,
+        None,
+    )
+
+
+def test_get_put_and_counters(tmp_path):
+    cache = LLMCache(tmp_path / "cache.sqlite3")
+    key = LLMCache.make_key(_messages(), "gpt-4", 0.1, None)
+
+    assert cache.get(key) is None
+    cache.put(key, "answer")
+
+    assert cache.get(key) == "answer"
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "entries": 1,
+        "size_bytes": len("answer"),
+    }
+
+
+def test_shared_between_instances(tmp_path):
+    LLMCache(tmp_path / "cache.sqlite3").put("key", "answer")
+
+    assert LLMCache(tmp_path / "cache.sqlite3").get("key") == "answer"
+
+
+def test_ttl_expiry(tmp_path):
+    cache = LLMCache(tmp_path / "cache.sqlite3", ttl_seconds=0.01)
+    cache.put("key", "answer")
+    time.sleep(0.05)
+
+    assert cache.get("key") is None
+
+
+def test_lru_eviction(tmp_path):
+    cache = LLMCache(tmp_path / "cache.sqlite3", max_size_bytes=10)
+    cache.put("a", "aaaa")
+    time.sleep(0.01)
+    cache.put("b", "bbbb")
+    time.sleep(0.01)
+    # touch "a" so that "b" becomes the least recently used entry
+    assert cache.get("a") == "aaaa"
+    time.sleep(0.01)
+    cache.put("c", "cccc")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.get("c") == "cccc"
@@ -0,0 +1,75 @@
+import pytest
+
+from gpt_engineer.core import parallel_diffs
+from gpt_engineer.core.chat_to_files import apply_diffs, parse_diffs
+from gpt_engineer.core.files_dict import FilesDict
+from gpt_engineer.core.parallel_diffs import use_process_pool, validate_diffs
+
+CODE = "\n".join(
+    [
+        "def total(items):",
+        "\tresult = 0",
+        "\tfor item in items:",
+        "\t\tresult += item",
+        "\treturn result",
+    ]
+)
+
+FILES = FilesDict({name: CODE for name in ["a.py", "b.py", "c.py"]})
+
+ANSWER = (
+    "```diff\n"
+    # a.py is changed where the header says
+    "--- a.py\n+++ a.py\n@@ -4,2 +4,2 @@\n"
+    "-\t\tresult += item\n+\t\tresult += 2 * item\n \treturn result\n"
+    # b.py has the wrong header and whitespace, and is placed by the fuzzy fallback
+    "--- b.py\n+++ b.py\n@@ -30,2 +30,2 @@\n"
+    "     result = 0\n-    for item in items:\n+    for item in sorted(items):\n"
+    # c.py removes a line that is not in the file
+    "--- c.py\n+++ c.py\n@@ -2,2 +2,2 @@\n"
+    "-\tresult = total_of(items)\n+\tresult = 1\n \tfor item in items:\n"
+    "--- /dev/null\n+++ d.py\n@@ -0,0 +1,1 @@\n+print('new')\n"
+    "```"
+)
+
+
+def validated(monkeypatch, capsys, parallel):
+    monkeypatch.setattr(parallel_diffs, "PARALLEL_MIN_LINES", 0 if parallel else 1e9)
+    diffs = parse_diffs(ANSWER)
+    validated_diffs, problems = validate_diffs(diffs, FILES, workers=2)
+    return diffs, validated_diffs, problems, capsys.readouterr().out
+
+
+def test_pool_threshold_counts_lines_outside_the_largest_file():
+    assert use_process_pool([40_000, 10_000, 20_000], workers=2, min_lines=30_000)
+    assert not use_process_pool([90_000, 10_000], workers=2, min_lines=30_000)
+    assert not use_process_pool([40_000, 40_000], workers=1, min_lines=30_000)
+    assert not use_process_pool([], workers=4, min_lines=0)
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_validation_in_a_pool_matches_validation_in_process(
+    monkeypatch, capsys, parallel
+):
+    expected = validated(monkeypatch, capsys, parallel=False)
+    diffs, validated_diffs, problems, output = validated(monkeypatch, capsys, parallel)
+
+    assert list(validated_diffs) == ["a.py", "b.py", "c.py", "d.py"]
+    # the workers send back corrected copies of the diffs
+    assert (validated_diffs["a.py"] is not diffs["a.py"]) == parallel
+    assert validated_diffs["d.py"] is diffs["d.py"]
+    assert (problems, output) == expected[2:]
+    assert len(problems) == 1 and "total_of" in problems[0]
+    assert len(validated_diffs["b.py"].fallback_hunks) == 1
+    assert apply_diffs(validated_diffs, FILES) == apply_diffs(expected[1], FILES)
+
+
+def test_validation_falls_back_to_the_process_if_the_pool_fails(monkeypatch, capsys):
+    def no_pool(*args, **kwargs):
+        raise OSError("no processes")
+
+    monkeypatch.setattr(parallel_diffs, "ProcessPoolExecutor", no_pool)
+    diffs, validated_diffs, problems, _ = validated(monkeypatch, capsys, True)
+
+    assert validated_diffs["a.py"] is diffs["a.py"]
+    assert len(problems) == 1
@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+
+from langchain.schema import AIMessage, HumanMessage
+from langchain_community.chat_models.fake import FakeListChatModel
+from langchain_core.messages import AIMessageChunk
+
+from gpt_engineer.core.metrics import LatencyHistogram, latency_histogram
+from gpt_engineer.core.providers import (
+    OpenRouterProvider,
+    Provider,
+    create_provider,
+    register_provider,
+    select_provider,
+)
+
+
+def test_select_provider():
+    assert select_provider("gpt-4") == "openai"
+    assert select_provider("gpt-4", azure_endpoint="https://x") == "azure"
+    assert select_provider("claude-3-opus-20240229") == "anthropic"
+    assert select_provider("deepseek/deepseek-r1-0528:free") == "openrouter"
+    assert select_provider("gpt-4", use_openrouter=True) == "openrouter"
+
+
+def test_select_local_provider(monkeypatch):
+    monkeypatch.setenv("LOCAL_MODEL", "true")
+    assert select_provider("CodeLlama-70B") == "local"
+
+
+def test_create_unknown_provider():
+    with pytest.raises(ValueError):
+        create_provider("nope", model_name="gpt-4")
+
+
+def test_invoke_records_latency():
+    provider = create_provider("openai", model_name="gpt-4")
+    llm = FakeListChatModel(responses=["response1"])
+    before = provider.latency.count
+
+    response = provider.invoke(llm, [HumanMessage(content="hi")])
+    asyncio.run(provider.ainvoke(FakeListChatModel(responses=["x"]), []))
+
+    assert response.content == "response1"
+    assert provider.latency.count == before + 2
+
+
+def test_invoke_is_rate_limited():
+    provider = create_provider("openai", model_name="gpt-4")
+    before = provider.rate_limiter.requests
+
+    provider.invoke(FakeListChatModel(responses=["x"]), [HumanMessage(content="hi")])
+    asyncio.run(provider.ainvoke(FakeListChatModel(responses=["x"]), []))
+
+    assert provider.rate_limiter.requests == before + 2
+    assert provider.rate_limiter.snapshot()["in_flight"] == 0
+
+
+def test_register_custom_provider():
+    class EchoProvider(Provider):
+        name = "echo"
+
+        def create_chat_model(self):
+            return None
+
+        def _invoke(self, llm, messages):
+            return AIMessage(content=messages[-1].content)
+
+        async def _ainvoke(self, llm, messages):
+            return self._invoke(llm, messages)
+
+    register_provider("echo", EchoProvider)
+    provider = create_provider("echo", model_name="anything")
+
+    assert provider.invoke(None, [HumanMessage(content="ping")]).content == "ping"
+    assert latency_histogram("echo").count >= 1
+
+
+def test_openrouter_single_call_per_turn(monkeypatch):
+    calls = []
+
+    def fake_call(messages, **kwargs):
+        calls.append(messages)
+        return {
+            "choices": [{"message": {"content": "answer"}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 2},
+            "_used_model": "qwen/qwen-2.5-coder-32b-instruct:free",
+            "_fallback_used": True,
+        }
+
+    monkeypatch.setattr("gpt_engineer.core.providers.call_openrouter_coding", fake_call)
+    provider = create_provider("openrouter", model_name="deepseek")
+
+    response = provider.invoke(None, [HumanMessage(content="hi")])
+
+    assert len(calls) == 1
+    assert calls[0] == [{"role": "user", "content": "hi"}]
+    assert response.content == "answer"
+    assert provider.usage(response) == {"prompt_tokens": 10, "completion_tokens": 2}
+    assert isinstance(provider, OpenRouterProvider)
+    assert provider.route(response) == {
+        "provider": "openrouter",
+        "model": "qwen/qwen-2.5-coder-32b-instruct:free",
+        "fallback_used": True,
+        "retries": 0,
+    }
+
+
+def test_route_counts_retried_attempts():
+    class FlakyProvider(Provider):
+        name = "flaky"
+        retry_exceptions = (ConnectionError,)
+        max_tries = 3
+        max_time = 10
+        rate_limited = False
+        failures = 2
+
+        def create_chat_model(self):
+            return None
+
+        def _invoke(self, llm, messages):
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("dropped")
+            return AIMessage(content="ok")
+
+        async def _ainvoke(self, llm, messages):
+            return self._invoke(llm, messages)
+
+    provider = FlakyProvider("flaky-model")
+
+    route = provider.route(provider.invoke(None, []))
+
+    assert route == {
+        "provider": "flaky",
+        "model": "flaky-model",
+        "fallback_used": False,
+        "retries": 2,
+    }
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram(buckets=(1.0, 2.0))
+    for seconds in (0.5, 1.5, 2.5, 3.5):
+        histogram.observe(seconds)
+
+    assert histogram.count == 4
+    assert histogram.percentile(50) == 1.5
+    assert histogram.percentile(95) == 3.5
+    assert histogram.bucket_counts() == {"le_1": 1, "le_2": 1, "le_inf": 2}
+
+
+def test_streamed_usage_is_kept():
+    class UsageStreamingModel:
+        def stream(self, messages):
+            yield AIMessageChunk(content="hello ")
+            yield AIMessageChunk(
+                content="world",
+                usage_metadata={
+                    "input_tokens": 12,
+                    "output_tokens": 2,
+                    "total_tokens": 14,
+                },
+            )
+
+    provider = create_provider("openai", model_name="gpt-4")
+    chunks = []
+
+    response = provider.stream(
+        UsageStreamingModel(), [HumanMessage(content="hi")], chunks.append
+    )
+
+    assert response.content == "hello world"
+    assert chunks == ["hello ", "world"]
+    assert provider.usage(response) == {"prompt_tokens": 12, "completion_tokens": 2}
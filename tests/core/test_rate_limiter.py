@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from gpt_engineer.core.rate_limiter import (
+    RateLimiter,
+    RateLimits,
+    _MemoryBucketStore,
+    _SQLiteBucketStore,
+    parse_retry_after,
+)
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    class response:
+        status_code = 429
+        headers = {"retry-after": "30"}
+
+
+def test_bucket_refills_over_time():
+    store = _MemoryBucketStore()
+    bucket = [("b", 2.0, 4.0, 1)]
+
+    waits = [store.take("cooldown", bucket, now=100.0) for _ in range(5)]
+
+    assert waits[:4] == [0.0] * 4
+    assert waits[4] == pytest.approx(0.5)
+    assert store.take("cooldown", bucket, now=100.5) == 0.0
+
+
+def test_all_buckets_must_allow_the_request():
+    store = _MemoryBucketStore()
+    requests = ("requests", 1.0, 10.0, 1)
+
+    assert store.take("cooldown", [requests, ("tokens", 10.0, 100.0, 100)], 0.0) == 0
+    assert store.take("cooldown", [requests, ("tokens", 10.0, 100.0, 50)], 0.0) == 5
+    # the request bucket was not charged for the rejected request
+    assert store._load("requests") == (9.0, 0.0)
+
+
+def test_limiter_throttles_requests():
+    limiter = RateLimiter("test", RateLimits(requests_per_minute=120))
+    for _ in range(120):
+        limiter.release(limiter.acquire())
+
+    permit = limiter.acquire()
+    limiter.release(permit)
+
+    assert permit.wait_seconds >= 0.4
+    assert limiter.throttled == 1
+    assert limiter.snapshot()["requests"] == 121
+
+
+def test_concurrency_adapts_to_rate_limits():
+    limiter = RateLimiter("test", RateLimits(max_concurrency=8))
+
+    with pytest.raises(RateLimitError):
+        with limiter.request():
+            raise RateLimitError()
+
+    assert limiter.rate_limited == 1
+    assert limiter.concurrency_limit == 4
+    assert limiter.cooldown_remaining() == pytest.approx(30, abs=1)
+
+    limiter._store = _MemoryBucketStore()  # lift the cooldown
+    for _ in range(5):
+        with limiter.request():
+            pass
+    assert limiter.concurrency_limit == 5
+
+
+def test_async_acquire_waits_for_a_slot():
+    limiter = RateLimiter("test", RateLimits(max_concurrency=1))
+    order = []
+
+    async def worker(i):
+        async with limiter.arequest():
+            order.append(("start", i))
+            await asyncio.sleep(0.01)
+            order.append(("end", i))
+
+    async def run_all():
+        await asyncio.gather(worker(0), worker(1))
+
+    asyncio.run(run_all())
+
+    assert order == [("start", 0), ("end", 0), ("start", 1), ("end", 1)]
+
+
+def test_token_estimate_is_settled():
+    limiter = RateLimiter("test", RateLimits(tokens_per_minute=1000))
+
+    with limiter.request(tokens=900) as permit:
+        permit.tokens_used = 100
+
+    assert limiter._store._load("test:tokens")[0] == pytest.approx(900, abs=1)
+
+
+def test_sqlite_store_is_shared(tmp_path):
+    limits = RateLimits(requests_per_minute=1)
+    first = RateLimiter("shared", limits, store=_SQLiteBucketStore(tmp_path / "rl.db"))
+    second = RateLimiter("shared", limits, store=_SQLiteBucketStore(tmp_path / "rl.db"))
+
+    first.release(first.acquire())
+
+    assert second._try_acquire(0) > 0
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("12") == 12
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert RateLimits.from_string("rpm=10, tpm=500,concurrency=2") == RateLimits(
+        10, 500, 2
+    )
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from gpt_engineer.core.sequence_alignment import (
+    align_sequences,
+    myers_matches,
+    patience_anchors,
+)
+
+
+def longest_common_subsequence(a, b) -> int:
+    lengths = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a) - 1, -1, -1):
+        for j in range(len(b) - 1, -1, -1):
+            lengths[i][j] = (
+                lengths[i + 1][j + 1] + 1
+                if a[i] == b[j]
+                else max(lengths[i + 1][j], lengths[i][j + 1])
+            )
+    return lengths[0][0]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_myers_finds_a_longest_common_subsequence(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        a = [rng.choice("abcd") for _ in range(rng.randint(0, 12))]
+        b = [rng.choice("abcd") for _ in range(rng.randint(0, 12))]
+
+        matches = myers_matches(len(a), len(b), lambda i, j: a[i] == b[j])
+
+        assert len(matches) == longest_common_subsequence(a, b)
+        assert all(a[i] == b[j] for i, j in matches)
+        assert matches == sorted(matches)
+        assert len({i for i, _ in matches}) == len({j for _, j in matches})
+
+
+def test_patience_anchors_on_lines_unique_in_both_sequences():
+    a = ["def f():", "", "x = 1", "", "return x", "y"]
+    b = ["", "def f():", "", "return x", "x = 1", "y"]
+
+    anchors = patience_anchors([line or None for line in a], b)
+
+    assert anchors == [(0, 1), (4, 3), (5, 5)]
+
+
+def test_alignment_binds_lines_before_the_first_anchor_to_it():
+    a = ["", "unique"]
+    b = ["", "x", "", "unique"]
+
+    assert align_sequences(
+        [None, "unique"], [None, "x", None, "unique"], lambda i, j: a[i] == b[j]
+    ) == [(0, 2), (1, 3)]
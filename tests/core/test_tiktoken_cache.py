@@ -0,0 +1,98 @@
+import hashlib
+import os
+
+import pytest
+
+from typer.testing import CliRunner
+
+from gpt_engineer.core import tiktoken_cache
+from gpt_engineer.core.tiktoken_cache import (
+    build_tiktoken_cache,
+    check_tiktoken_cache,
+    missing_encodings,
+    require_cached_encoding,
+)
+
+BPE_FILE = b"IQ== 0\nIg== 1\n"
+
+
+@pytest.fixture
+def test_encoding(monkeypatch):
+    monkeypatch.setattr(
+        tiktoken_cache,
+        "ENCODING_FILES",
+        {
+            "test_base": (
+                "https://example.invalid/test_base.tiktoken",
+                hashlib.sha256(BPE_FILE).hexdigest(),
+            )
+        },
+    )
+
+    def no_network(*args, **kwargs):
+        raise AssertionError("the network was used")
+
+    monkeypatch.setattr(tiktoken_cache.requests, "get", no_network)
+    return "test_base"
+
+
+def test_cache_is_built_from_a_source_directory(tmp_path, test_encoding):
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    (source_dir / "test_base.tiktoken").write_bytes(BPE_FILE)
+    cache_dir = tmp_path / "cache"
+
+    assert missing_encodings([test_encoding], cache_dir) == [test_encoding]
+    build_tiktoken_cache([test_encoding], cache_dir, source_dir)
+
+    assert missing_encodings([test_encoding], cache_dir) == []
+    # Stored under tiktoken's own cache key, the SHA-1 of the source URL
+    url = tiktoken_cache.ENCODING_FILES[test_encoding][0]
+    assert (cache_dir / hashlib.sha1(url.encode()).hexdigest()).read_bytes() == BPE_FILE
+
+
+def test_corrupted_files_are_rejected(tmp_path, test_encoding):
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    (source_dir / "test_base.tiktoken").write_bytes(b"corrupted")
+
+    with pytest.raises(ValueError):
+        build_tiktoken_cache([test_encoding], tmp_path / "cache", source_dir)
+
+
+def test_startup_check_configures_tiktoken_offline(
+    tmp_path, monkeypatch, test_encoding
+):
+    monkeypatch.setenv("GPTE_TIKTOKEN_CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("TIKTOKEN_CACHE_DIR", raising=False)
+
+    assert check_tiktoken_cache([test_encoding]) == [test_encoding]
+    assert os.environ["TIKTOKEN_CACHE_DIR"] == str(tmp_path)
+
+
+def test_offline_tokenizer_fails_fast_without_cache(
+    tmp_path, monkeypatch, test_encoding
+):
+    monkeypatch.setenv("GPTE_TIKTOKEN_OFFLINE", "1")
+
+    with pytest.raises(
+        RuntimeError, match="python -m gpt_engineer.core.tiktoken_cache"
+    ):
+        require_cached_encoding(test_encoding, tmp_path)
+
+    monkeypatch.setenv("GPTE_TIKTOKEN_OFFLINE", "0")
+    require_cached_encoding(test_encoding, tmp_path)
+
+
+def test_cache_is_built_from_the_command_line(tmp_path, test_encoding, monkeypatch):
+    monkeypatch.setattr(tiktoken_cache, "REQUIRED_ENCODINGS", (test_encoding,))
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    cache_dir = tmp_path / "cache"
+    args = ["--cache-dir", str(cache_dir), "--source-dir", str(source_dir)]
+
+    (source_dir / "test_base.tiktoken").write_bytes(b"corrupted")
+    assert CliRunner().invoke(tiktoken_cache.app, args).exit_code != 0
+    (source_dir / "test_base.tiktoken").write_bytes(BPE_FILE)
+    assert CliRunner().invoke(tiktoken_cache.app, args).exit_code == 0
+    assert missing_encodings([test_encoding], cache_dir) == []
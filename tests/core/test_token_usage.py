@@ -1,15 +1,28 @@
 import base64
 import csv
 import io
+import json
 import os
 
 from io import StringIO
 from pathlib import Path
 
+import pytest
+
 from langchain.schema import HumanMessage, SystemMessage
 from PIL import Image
 
-from gpt_engineer.core.token_usage import Tokenizer, TokenUsageLog
+from gpt_engineer.core import token_usage
+from gpt_engineer.core.token_usage import (
+    TIMING_COLUMNS,
+    InferenceTiming,
+    Tokenizer,
+    TokenUsageLog,
+    clear_token_count_cache,
+    image_size_from_header,
+    preload_tokenizers,
+    token_count_cache_stats,
+)
 
 
 def test_format_log():
@@ -52,6 +65,167 @@ def test_usage_cost():
     assert usage_cost > 0
 
 
+def test_provider_usage_is_preferred():
+    # arrange
+    token_usage_log = TokenUsageLog("deepseek/deepseek-r1")
+    request_messages = [HumanMessage(content="my user prompt")]
+
+    # act
+    token_usage_log.update_log(
+        request_messages,
+        "response",
+        "step 1",
+        usage={"prompt_tokens": 120, "completion_tokens": 30},
+    )
+    token_usage_log.update_log(request_messages, "response", "step 2")
+
+    # assert
+    provider_step, local_step = token_usage_log.log()
+    assert (provider_step.in_step_prompt_tokens, provider_step.usage_source) == (
+        120,
+        "provider",
+    )
+    assert provider_step.in_step_total_tokens == 150
+    assert local_step.usage_source == "local"
+    rows = list(csv.reader(StringIO(token_usage_log.format_log(include_source=True))))
+    assert [row[-1] for row in rows] == ["usage_source", "provider", "local"]
+
+
+def test_format_log_exports_timing_as_csv_and_jsonl():
+    # arrange
+    token_usage_log = TokenUsageLog("gpt-4")
+    usage = {"prompt_tokens": 100, "completion_tokens": 50}
+    timing = InferenceTiming(
+        queue_wait=0.5,
+        time_to_first_token=1.0,
+        latency=3.0,
+        provider="openrouter",
+        model="qwen/qwen-2.5-coder-32b-instruct",
+        fallback_used=True,
+        retries=1,
+    )
+
+    # act
+    token_usage_log.update_log([], "", "step 1", usage=usage, timing=timing)
+    token_usage_log.update_log([], "", "step 2", usage=usage)
+
+    # assert
+    assert timing.output_tokens_per_second == pytest.approx(25.0)
+    rows = list(csv.reader(StringIO(token_usage_log.format_log(include_timing=True))))
+    assert rows[0][7:] == TIMING_COLUMNS
+    assert rows[1][7:11] == ["0.5000", "1.0000", "3.0000", "25.0000"]
+    assert rows[2][7:] == [""] * len(TIMING_COLUMNS)
+    assert len(rows[1]) == 7 + len(TIMING_COLUMNS)
+    records = [
+        json.loads(line)
+        for line in token_usage_log.format_log(
+            include_timing=True, output_format="jsonl"
+        ).splitlines()
+    ]
+    assert records[0]["model"] == "qwen/qwen-2.5-coder-32b-instruct"
+    assert records[0]["fallback_used"] is True
+    assert records[1]["latency"] is None
+    assert "usage_source" not in records[0]
+
+
+def test_usage_cost_prices_each_step_once():
+    # arrange
+    token_usage_log = TokenUsageLog("gpt-4")
+    usage = {"prompt_tokens": 1000, "completion_tokens": 100}
+
+    # act
+    token_usage_log.update_log([], "", "step 1", usage=usage)
+    one_step = token_usage_log.usage_cost()
+    token_usage_log.update_log([], "", "step 2", usage=usage)
+
+    # assert
+    assert token_usage_log.usage_cost() == pytest.approx(2 * one_step)
+
+
+def test_cache_hits_are_logged_without_spend():
+    # arrange
+    token_usage_log = TokenUsageLog("gpt-4")
+    request_messages = [HumanMessage(content="my user prompt")]
+    cached = InferenceTiming(
+        queue_wait=0.0,
+        time_to_first_token=None,
+        latency=0.01,
+        provider="openai",
+        model="gpt-4",
+        fallback_used=False,
+        retries=0,
+        cache_hit=True,
+    )
+
+    # act
+    token_usage_log.update_log(request_messages, "response", "step 1")
+    one_step = token_usage_log.usage_cost()
+    token_usage_log.update_log(request_messages, "response", "step 2", timing=cached)
+
+    # assert
+    cache_step = token_usage_log.log()[-1]
+    assert (cache_step.in_step_total_tokens, cache_step.usage_source) == (0, "cache")
+    assert token_usage_log.usage_cost() == pytest.approx(one_step)
+
+
+def test_encodings_are_loaded_once_on_first_use(monkeypatch):
+    # arrange
+    loaded = []
+    get_encoding = token_usage.tiktoken.get_encoding
+
+    def counting_get_encoding(name):
+        loaded.append(name)
+        return get_encoding(name)
+
+    monkeypatch.setattr(token_usage, "_encodings", {})
+    monkeypatch.setattr(token_usage.tiktoken, "get_encoding", counting_get_encoding)
+
+    # act
+    tokenizers = [Tokenizer("gpt-4"), Tokenizer("claude-3-opus")]
+    assert loaded == []
+    preload_tokenizers(["gpt-4"]).join()
+    counts = [tokenizer.num_tokens("hello world") for tokenizer in tokenizers]
+
+    # assert
+    assert loaded == ["cl100k_base"]
+    assert counts[0] == counts[1] > 0
+
+
+def test_offline_encodings_are_never_downloaded(tmp_path, monkeypatch):
+    # arrange
+    def download(name):
+        raise AssertionError("the network was used")
+
+    monkeypatch.setattr(token_usage, "_encodings", {})
+    monkeypatch.setattr(token_usage.tiktoken, "get_encoding", download)
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("GPTE_TIKTOKEN_OFFLINE", "1")
+
+    # act / assert
+    with pytest.raises(RuntimeError, match="cl100k_base"):
+        Tokenizer("gpt-4").num_tokens("hello world")
+
+
+def test_resent_messages_are_counted_once():
+    # arrange
+    clear_token_count_cache()
+    token_usage_log = TokenUsageLog("gpt-4")
+    files = HumanMessage(content="def f():\n    return 1\n" * 200)
+    messages = [SystemMessage(content="my system message"), files]
+
+    # act
+    token_usage_log.update_log(messages, "first answer", "step 1")
+    messages.append(HumanMessage(content="a retry " * 100))
+    token_usage_log.update_log(messages, "second answer", "step 2")
+
+    # assert
+    stats = token_count_cache_stats()
+    assert stats["misses"] == 2
+    assert stats["hits"] == 1
+    log = token_usage_log.log()
+    assert log[1].in_step_prompt_tokens > log[0].in_step_prompt_tokens
+
+
 def test_image_tokenizer():
     # Arrange
     token_usage_log = Tokenizer("gpt-4")
@@ -77,6 +251,39 @@ def test_image_tokenizer():
     assert image_token_cost == 1105
 
 
+def encoded_image(image_format: str, size=(1500, 900), **options) -> str:
+    buffered = io.BytesIO()
+    Image.new("RGB", size).save(buffered, format=image_format, **options)
+    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+
+def test_image_size_is_read_from_header():
+    for image_format in ["PNG", "JPEG", "GIF"]:
+        data = base64.b64decode(encoded_image(image_format))
+        assert image_size_from_header(data[:2048]) == (1500, 900)
+    assert image_size_from_header(b"not an image") is None
+
+
+def test_image_tokens_without_full_decode(monkeypatch):
+    # arrange
+    clear_token_count_cache()
+    tokenizer = Tokenizer("gpt-4")
+    # JPEG metadata pushes the dimensions beyond the first decoded prefix
+    jpeg = encoded_image("JPEG", exif=b"Exif\x00\x00" + b"x" * 30000)
+    png = "data:image/png;base64," + encoded_image("PNG", size=(800, 600))
+
+    def no_full_decode(*args, **kwargs):
+        raise AssertionError("the whole image was decoded")
+
+    monkeypatch.setattr(token_usage.Image, "open", no_full_decode)
+
+    # act / assert
+    assert tokenizer.num_tokens_for_base64_image(jpeg) == 1105
+    assert tokenizer.num_tokens_for_base64_image(png) == 765
+    assert tokenizer.num_tokens_for_base64_image(png) == 765
+    assert token_count_cache_stats()["hits"] == 1
+
+
 def test_list_type_message_with_image():
     # Arrange
     token_usage_log = TokenUsageLog("gpt-4")
@@ -0,0 +1,318 @@
+import asyncio
+import gzip
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from gpt_engineer.core import circuit_breaker
+from gpt_engineer.core.metrics import latency_histogram
+from gpt_engineer.tools import openrouter_wrapper
+from gpt_engineer.tools.openrouter_wrapper import (
+    HEDGE_DEFAULT_DELAY,
+    MODELS,
+    OpenRouterSession,
+    _hedge_delay,
+    acall_openrouter,
+    call_openrouter,
+    configure_openrouter_session,
+    openrouter_connection_stats,
+    stream_openrouter,
+)
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture(autouse=True)
+def fresh_circuit_breakers(monkeypatch):
+    monkeypatch.delenv("GPTE_CIRCUIT_BREAKER_PATH", raising=False)
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+
+
+@pytest.fixture
+def server():
+    """A local keep-alive server answering chat completions, recording what it received."""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            encoding = self.headers.get("Content-Encoding")
+            received.append((encoding, body))
+            if encoding == "gzip" and self.server.reject_gzip:
+                status, reply = 415, b"unsupported encoding"
+            else:
+                if encoding == "gzip":
+                    body = gzip.decompress(body)
+                model = json.loads(body)["model"]
+                status, reply = 200, json.dumps(completion(model)).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(reply)))
+            self.end_headers()
+            self.wfile.write(reply)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.reject_gzip = False
+    httpd.received = received
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/api/v1/chat/completions"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def completion(content: str) -> dict:
+    return {
+        "choices": [{"message": {"content": content}}],
+        "usage": {"total_tokens": 3},
+    }
+
+
+def mock_client(primary_delay: float, calls: list) -> httpx.AsyncClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        model = json.loads(request.content)["model"]
+        calls.append(model)
+        if model == MODELS["primary"]["name"]:
+            await asyncio.sleep(primary_delay)
+        return httpx.Response(200, json=completion(model))
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_sequential_call_waits_for_slow_primary():
+    calls = []
+
+    async def run():
+        async with mock_client(0.2, calls) as client:
+            return await acall_openrouter(MESSAGES, client=client, hedge=False)
+
+    result = asyncio.run(run())
+
+    assert result["_used_model"] == MODELS["primary"]["name"]
+    assert calls == [MODELS["primary"]["name"]]
+
+
+def test_hedged_call_takes_the_faster_fallback():
+    calls = []
+
+    async def run():
+        async with mock_client(5, calls) as client:
+            start = time.perf_counter()
+            result = await acall_openrouter(
+                MESSAGES, client=client, hedge=True, hedge_delay=0.05
+            )
+            return result, time.perf_counter() - start
+
+    result, elapsed = asyncio.run(run())
+
+    assert result["_used_model"] == MODELS["coding_fallback"]["name"]
+    assert result["_fallback_used"]
+    assert calls == [MODELS["primary"]["name"], MODELS["coding_fallback"]["name"]]
+    assert elapsed < 2
+
+
+def test_hedged_call_keeps_fast_primary():
+    calls = []
+
+    async def run():
+        async with mock_client(0, calls) as client:
+            return await acall_openrouter(
+                MESSAGES, client=client, hedge=True, hedge_delay=1
+            )
+
+    assert asyncio.run(run())["_used_model"] == MODELS["primary"]["name"]
+    assert calls == [MODELS["primary"]["name"]]
+
+
+def test_hedge_delay_follows_p95_latency(monkeypatch):
+    model_config = {"name": "test/hedge-delay-model"}
+    monkeypatch.setattr(openrouter_wrapper, "HEDGE_MIN_SAMPLES", 10)
+
+    assert _hedge_delay(model_config) == HEDGE_DEFAULT_DELAY
+    for seconds in range(1, 21):
+        latency_histogram("openrouter:test/hedge-delay-model").observe(seconds)
+
+    assert _hedge_delay(model_config) == 19
+    assert _hedge_delay(model_config, hedge_delay=0.5) == 0.5
+
+
+def test_failing_primary_is_skipped_once_its_circuit_opens():
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        model = json.loads(request.content)["model"]
+        calls.append(model)
+        if model == MODELS["primary"]["name"]:
+            return httpx.Response(503, text="unavailable")
+        return httpx.Response(200, json=completion(model))
+
+    async def run():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return [
+                await acall_openrouter(MESSAGES, client=client, hedge=False)
+                for _ in range(4)
+            ]
+
+    results = asyncio.run(run())
+
+    assert all(r["_used_model"] == MODELS["coding_fallback"]["name"] for r in results)
+    assert calls.count(MODELS["primary"]["name"]) == 3
+    assert len(calls) == 7
+
+
+def test_session_reuses_its_connection(server):
+    session = OpenRouterSession(api_key="test", endpoint=server.url)
+
+    for _ in range(5):
+        assert session.post({"model": "m", "messages": []}).status_code == 200
+    session.close()
+
+    stats = session.stats.snapshot()
+    assert stats["requests"] == 5
+    assert stats["connections"] == 1
+    assert stats["reused_connections"] == 4
+
+
+def test_large_payloads_are_compressed(server):
+    session = OpenRouterSession(
+        api_key="test", endpoint=server.url, compress_min_bytes=1000
+    )
+    payload = {
+        "model": "m",
+        "messages": [{"role": "user", "content": "x = 1\n" * 1000}],
+    }
+
+    session.post({"model": "m", "messages": []})
+    session.post(payload)
+    session.close()
+
+    assert [encoding for encoding, _ in server.received] == [None, "gzip"]
+    assert json.loads(gzip.decompress(server.received[1][1])) == payload
+    assert session.stats.snapshot()["bytes_saved"] > 5000
+
+
+def test_rejected_compression_is_retried_uncompressed(server):
+    server.reject_gzip = True
+    session = OpenRouterSession(
+        api_key="test", endpoint=server.url, compress_min_bytes=10
+    )
+
+    response = session.post(
+        {"model": "m", "messages": [{"role": "user", "content": "hi" * 20}]}
+    )
+    session.close()
+
+    assert response.status_code == 200
+    assert [encoding for encoding, _ in server.received] == ["gzip", None]
+    assert session.compress_min_bytes == 0
+
+
+def test_calls_share_the_pooled_session(server, monkeypatch):
+    monkeypatch.setattr(openrouter_wrapper, "_session", None)
+    session = configure_openrouter_session(api_key="test", endpoint=server.url)
+
+    for _ in range(3):
+        result = call_openrouter(MESSAGES, hedge=False)
+        assert result["_used_model"] == MODELS["primary"]["name"]
+    session.close()
+
+    stats = openrouter_connection_stats()
+    assert stats["requests"] == 3
+    assert stats["connections"] == 1
+
+
+def test_hedged_sync_calls_share_one_async_client(server, monkeypatch):
+    monkeypatch.setattr(openrouter_wrapper, "_session", None)
+    session = configure_openrouter_session(api_key="test", endpoint=server.url)
+
+    for _ in range(3):
+        result = call_openrouter(MESSAGES, hedge=True, hedge_delay=5)
+        assert result["_used_model"] == MODELS["primary"]["name"]
+
+    assert len(session._async_clients) == 1
+    assert openrouter_connection_stats()["connections"] == 1
+    session.close()
+    assert not session._async_clients
+
+
+def streaming_session(monkeypatch, primary_body) -> OpenRouterSession:
+    """Install a session whose primary model streams `primary_body` and whose fallback streams "ok"."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        model = json.loads(request.content)["model"]
+        if model == MODELS["primary"]["name"]:
+            return httpx.Response(200, content=primary_body())
+        event = {"choices": [{"delta": {"content": "ok"}}]}
+        return httpx.Response(
+            200, content=f"data: {json.dumps(event)}\n\ndata: [DONE]\n\n".encode()
+        )
+
+    session = OpenRouterSession(api_key="test", compress_min_bytes=0)
+    session._client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(openrouter_wrapper, "_session", session)
+    return session
+
+
+@pytest.mark.parametrize("failure", ["connection", "malformed"])
+def test_stream_falls_back_when_the_primary_fails_before_any_output(
+    monkeypatch, failure
+):
+    def primary_body():
+        if failure == "malformed":
+            yield b"data: {not json\n\n"
+        else:
+            raise httpx.ReadError("connection reset")
+        yield b"data: [DONE]\n\n"  # pragma: no cover
+
+    streaming_session(monkeypatch, primary_body)
+    info = {}
+
+    assert list(stream_openrouter(MESSAGES, info=info)) == ["ok"]
+    assert info["_used_model"] == MODELS["coding_fallback"]["name"]
+    assert info["_fallback_used"]
+
+
+def test_stream_errors_after_output_are_raised(monkeypatch):
+    def primary_body():
+        event = {"choices": [{"delta": {"content": "partial"}}]}
+        yield f"data: {json.dumps(event)}\n\n".encode()
+        raise httpx.ReadError("connection reset")
+
+    streaming_session(monkeypatch, primary_body)
+    info, chunks = {}, []
+
+    with pytest.raises(httpx.ReadError):
+        for chunk in stream_openrouter(MESSAGES, info=info):
+            chunks.append(chunk)
+
+    assert chunks == ["partial"]
+    assert info["_used_model"] == MODELS["primary"]["name"]
+
+
+def test_malformed_response_falls_back_to_the_next_model(monkeypatch):
+    def handler(request: httpx.Request) -> httpx.Response:
+        model = json.loads(request.content)["model"]
+        if model == MODELS["primary"]["name"]:
+            return httpx.Response(200, content=b"<html>bad gateway</html>")
+        return httpx.Response(200, json=completion("ok"))
+
+    session = OpenRouterSession(api_key="test", compress_min_bytes=0)
+    session._client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(openrouter_wrapper, "_session", session)
+
+    result = call_openrouter(MESSAGES, hedge=False)
+
+    assert result["choices"][0]["message"]["content"] == "ok"
+    assert result["_used_model"] == MODELS["coding_fallback"]["name"]
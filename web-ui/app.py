@@ -1196,7 +1196,8 @@ def generate():
             '--model', 'deepseek/deepseek-r1-0528:free',
             '--no_execution',
             '--lite',
-            '--temperature', '0.1'
+            '--temperature', '0.1',
+            '--use_cache'
         ]
         
         if current_files: